@@ -0,0 +1,186 @@
+from urllib.parse import quote
+import sqlite3
+import threading
+import shutil
+import queue
+import time
+import csv
+import os
+
+ARCHIVE_PATH = os.path.join('received', 'archive.db')
+
+# inserts are buffered and committed together, whichever limit is hit first
+ARCHIVE_BATCH_SIZE = 32
+ARCHIVE_FLUSH_INTERVAL = 2
+
+ARCHIVE_COLUMNS = (
+    'received_at',
+    'session',
+    'path',
+    'sha256',
+    'size',
+    'width',
+    'height',
+    'frequency',
+    'spreading_factor',
+    'bandwidth',
+    'duration_s',
+    'retransmissions',
+    'latitude',
+    'longitude',
+    'parent',
+)
+
+ARCHIVE_SCHEMA = '''\
+CREATE TABLE IF NOT EXISTS receptions (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    received_at REAL NOT NULL,
+    session TEXT NOT NULL,
+    path TEXT NOT NULL,
+    sha256 TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    width INTEGER,
+    height INTEGER,
+    frequency INTEGER,
+    spreading_factor INTEGER,
+    bandwidth INTEGER,
+    duration_s REAL,
+    retransmissions INTEGER,
+    latitude REAL,
+    longitude REAL,
+    parent TEXT
+);
+CREATE INDEX IF NOT EXISTS receptions_received_at ON receptions (received_at);
+CREATE INDEX IF NOT EXISTS receptions_session ON receptions (session, received_at);
+'''
+
+
+def connect(path=ARCHIVE_PATH) -> sqlite3.Connection:
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+
+    db = sqlite3.connect(path)
+    db.row_factory = sqlite3.Row
+    # WAL lets the CLI read while the ground server keeps writing
+    db.execute('PRAGMA journal_mode=WAL')
+    db.executescript(ARCHIVE_SCHEMA)
+
+    # archives created before region of interest crops existed lack the parent column
+    if 'parent' not in {row['name'] for row in db.execute('PRAGMA table_info(receptions)')}:
+        db.execute('ALTER TABLE receptions ADD COLUMN parent TEXT')
+
+    return db
+
+
+# for the CLI, which must not leave an empty archive behind a mistyped path
+def connect_readonly(path=ARCHIVE_PATH) -> sqlite3.Connection:
+    if not os.path.isfile(path):
+        raise ValueError(f'no archive at "{path}"')
+
+    db = sqlite3.connect(f'file:{quote(os.path.abspath(path))}?mode=ro', uri=True)
+    db.row_factory = sqlite3.Row
+
+    return db
+
+
+# SQLite-indexed archive of received images, written from a single background thread
+class Archive:
+    def __init__(self, path=ARCHIVE_PATH, batch_size=ARCHIVE_BATCH_SIZE, flush_interval=ARCHIVE_FLUSH_INTERVAL):
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.pending = queue.Queue()
+        self.thread = None
+
+    def start(self):
+        self.thread = threading.Thread(target=self.writer, daemon=True)
+        self.thread.start()
+
+        return self
+
+    # never blocks, the record is committed with the next batch
+    def add(self, record: dict):
+        self.pending.put(tuple(record.get(column) for column in ARCHIVE_COLUMNS))
+
+    def close(self):
+        if self.thread:
+            self.pending.put(None)
+            self.thread.join()
+            self.thread = None
+
+    def writer(self):
+        db = connect(self.path)
+        insert = f'INSERT INTO receptions ({", ".join(ARCHIVE_COLUMNS)}) VALUES ({", ".join("?" * len(ARCHIVE_COLUMNS))})'
+
+        batch = []
+        deadline = None
+        running = True
+        while running:
+            timeout = None if deadline is None else max(0, deadline - time.monotonic())
+
+            try:
+                row = self.pending.get(timeout=timeout)
+            except queue.Empty:
+                row = ...
+
+            if row is None:
+                running = False
+            elif row is not ...:
+                batch.append(row)
+                deadline = deadline or time.monotonic() + self.flush_interval
+
+            if batch and (not running or len(batch) >= self.batch_size or time.monotonic() >= deadline):
+                with db:
+                    db.executemany(insert, batch)
+                batch = []
+                deadline = None
+
+        db.close()
+
+
+def query(path=ARCHIVE_PATH, session=None, since=None, until=None, limit=None) -> list:
+    conditions, params = [], []
+
+    if session:
+        conditions.append('session = ?')
+        params.append(session)
+    if since is not None:
+        conditions.append('received_at >= ?')
+        params.append(since)
+    if until is not None:
+        conditions.append('received_at < ?')
+        params.append(until)
+
+    sql = 'SELECT * FROM receptions'
+    if conditions:
+        sql += ' WHERE ' + ' AND '.join(conditions)
+    sql += ' ORDER BY received_at DESC'
+    if limit:
+        sql += ' LIMIT ?'
+        params.append(limit)
+
+    db = connect_readonly(path)
+    try:
+        return db.execute(sql, params).fetchall()
+    except sqlite3.DatabaseError as e:
+        raise ValueError(f'"{path}" is not an image archive: {e}')
+    finally:
+        db.close()
+
+
+def export(rows, out_dir) -> str:
+    os.makedirs(out_dir, exist_ok=True)
+
+    index_path = os.path.join(out_dir, 'index.csv')
+    with open(index_path, 'w', newline='') as f:
+        index = csv.writer(f)
+        index.writerow(('id', *ARCHIVE_COLUMNS))
+
+        for row in rows:
+            values = dict(row)
+            if os.path.exists(row['path']):
+                shutil.copy2(row['path'], out_dir)
+                values['path'] = os.path.basename(row['path'])
+            # archives from before crops lack the parent column
+            index.writerow(values.get(column) for column in ('id', *ARCHIVE_COLUMNS))
+
+    return index_path
@@ -0,0 +1,478 @@
+#!/usr/bin/env python3
+from contextlib import redirect_stdout, contextmanager
+from urllib.parse import quote
+from datetime import datetime
+import statistics
+import subprocess
+import threading
+import argparse
+import platform
+import binascii
+import random
+import timeit
+import queue
+import json
+import glob
+import time
+import sys
+import io
+import os
+
+from channel import parse_channel
+import simulator
+import sources
+import modem
+import lora
+
+BASELINE_PATH = 'benchmark_baseline.json'
+
+# relative change past which a metric counts as a regression
+REGRESSION_THRESHOLD = 0.20
+
+# (spreading factor, bandwidth, channel model) settings for end-to-end transfers,
+# see channel.py for the model specs
+E2E_SETTINGS = [
+    (7, 250, 'none'),
+    (7, 250, 'bernoulli:0.1'),
+    (7, 250, 'gilbert:0.05,0.3'),
+    (6, 500, 'none'),
+    (9, 250, 'bernoulli:0.1'),
+]
+
+# the larger samples take minutes of simulated airtime, opt in with --images
+E2E_IMAGES = [
+    'sample_images/dunes_10x7.jpg',
+    'sample_images/dunes_43x32.png',
+    'sample_images/dunes_133x100.jpg',
+]
+
+# simulated airtime and protocol timeouts are scaled by this factor, results are
+# reported in simulated (unscaled) seconds
+TIME_SCALE = 0.05
+
+# modules imported in fresh interpreters to time cold start, lora alone is what the
+# server and the headless client load
+STARTUP_MODULES = ['lora', 'gui']
+
+# top-level packages lora must not load at import time, they are pulled in lazily
+HEADLESS_EXCLUDED = ('tkinter', 'PIL', 'http')
+
+# metric name -> True when higher is better
+COMPARED_METRICS = {
+    'ns_per_op': False,
+    'import_us': False,
+    'goodput_bytes_per_s': True,
+    'duration_s': False,
+    'retransmission_rounds': False,
+}
+
+
+def bench(fn, *args, repeat=5) -> dict:
+    timer = timeit.Timer(lambda: fn(*args))
+    number, _ = timer.autorange()
+    best = min(timer.repeat(repeat, number)) / number
+
+    return {'ns_per_op': best * 10**9}
+
+
+def run_micro() -> dict:
+    payload = random.Random(0).randbytes(lora.CHUNK_SIZE)
+    chunk = lora.pack_chunk(7, payload)
+    rx_line = f'+TEST: RX "{chunk.hex().upper()}"\r\n'.encode()
+    hex_chunk = chunk.hex().encode()
+    missing = list(range(0, 200, 4))
+    miss = lora.pack_miss(missing)
+    telemetry = lora.pack_telemetry(25.348766, 55.405403, 120, 271.5, 87)
+
+    # a 300KB image arriving out of order
+    chunks = {seq: payload for seq in range(1500)}
+    shuffled = dict(sorted(chunks.items(), key=lambda _: random.random()))
+
+    image = random.Random(0).randbytes(300000)
+    source = sources.BufferSource(image, lora.CHUNK_SIZE)
+    with open('sample_images/dunes_133x100.jpg', 'rb') as f:
+        jpeg = f.read()
+
+    # reconfiguring a simulated modem that already is configured, one pipelined query
+    name = f'bench-{os.getpid()}-configure'
+    modem_port = f'{simulator.SIM_PREFIX}{name}'
+    commands = lora.get_config_commands().split('\n')
+    serial = lora.open_serial(modem_port)
+    modem.configure(serial, commands, modem_port)
+
+    results = {
+        'parse_rx': bench(lora.parse_rx, rx_line),
+        'hex_decode': bench(binascii.unhexlify, hex_chunk),
+        'hex_encode': bench(bytes.hex, chunk),
+        'tx_command': bench(lora.tx_command, chunk),
+        'pack_header': bench(lora.pack_header, 300000, 1440, 1080),
+        'pack_chunk': bench(lora.pack_chunk, 7, payload),
+        'pack_miss': bench(lora.pack_miss, missing),
+        'unpack_miss': bench(lora.unpack_miss, miss),
+        'pack_telemetry': bench(lora.pack_telemetry, 25.348766, 55.405403, 120, 271.5, 87),
+        'unpack_telemetry': bench(lora.unpack_telemetry, telemetry),
+        'assemble': bench(lora.assemble, shuffled, repeat=3),
+        'chunk_slice': bench(source.chunk, 750),
+        'image_size': bench(sources.image_size, jpeg),
+        'configure_unchanged': bench(modem.configure, serial, commands, modem_port),
+    }
+
+    serial.close()
+    simulator.close_link(name)
+
+    for name, size in (('parse_rx', len(chunk)), ('hex_decode', len(chunk)), ('hex_encode', len(chunk)),
+                       ('tx_command', len(chunk)), ('assemble', len(payload) * len(chunks))):
+        results[name]['bytes_per_s'] = size / results[name]['ns_per_op'] * 10**9
+
+    return results
+
+
+# {module: cumulative microseconds} from python -X importtime output
+def parse_importtime(output) -> dict:
+    imported = {}
+
+    for line in output.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+
+        _, cumulative, name = line.split('|')
+        imported[name.strip()] = int(cumulative)
+
+    return imported
+
+
+# HEADLESS_EXCLUDED package -> the module that imported it first. importtime prints a
+# module after everything it imports, one level of indentation less deep
+def excluded_importers(output) -> dict:
+    lines = [line.split('|')[2] for line in output.splitlines() if line.startswith('import time:') and 'cumulative' not in line]
+    modules = [(len(line) - len(line.lstrip()), line.strip()) for line in lines]
+
+    importers = {}
+    for i, (depth, name) in enumerate(modules):
+        package = name.split('.')[0]
+        if package not in HEADLESS_EXCLUDED or package in importers:
+            continue
+
+        # up the chain to the first module outside the excluded packages, PIL.Image
+        # imports PIL itself first
+        importer = '-c'
+        for other_depth, other in modules[i + 1:]:
+            if other_depth < depth:
+                depth = other_depth
+                if other.split('.')[0] not in HEADLESS_EXCLUDED:
+                    importer = other
+                    break
+        importers[package] = importer
+
+    return importers
+
+
+def run_startup(repeat=5) -> dict:
+    results = {}
+    root = os.path.dirname(os.path.abspath(__file__))
+
+    for module in STARTUP_MODULES:
+        times = []
+        for _ in range(repeat):
+            process = subprocess.run([sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+                                     cwd=root, capture_output=True, text=True)
+            if process.returncode:
+                break
+
+            imported = parse_importtime(process.stderr)
+            times.append(imported[module])
+
+        # the GUI needs Tk, which headless machines may not have
+        if not times:
+            print(f'[-] Cannot import {module}, skipped')
+            continue
+
+        results[module] = {'import_us': min(times), 'modules': len(imported)}
+        if module == 'lora':
+            results[module]['excluded'] = sorted(name for name in imported if name.split('.')[0] in HEADLESS_EXCLUDED)
+            results[module]['excluded_by'] = excluded_importers(process.stderr)
+
+    return results
+
+
+# seconds a transfer may take before it counts as failed
+TRANSFER_TIMEOUT = 300
+
+# seconds given to a real ground modem to open and configure before the drone sends
+GROUND_SETUP_TIME = 1
+
+
+# protocol timeouts shrink together with the simulated airtime, the RF settings, chunk
+# size and timeouts are restored on the way out
+@contextmanager
+def scaled_protocol(time_scale):
+    defaults = (
+        dict(lora.RF_CONFIG),
+        lora.CHUNK_SIZE,
+        lora.RETRANSMISSION_TIMEOUT,
+        lora.RX_SWITCH_DELAY,
+        lora.CONFIRMATION_INTERVAL,
+    )
+
+    lora.RETRANSMISSION_TIMEOUT *= time_scale
+    lora.RX_SWITCH_DELAY *= time_scale
+    lora.CONFIRMATION_INTERVAL *= time_scale
+
+    try:
+        yield
+    finally:
+        lora.RF_CONFIG.update(defaults[0])
+        lora.CHUNK_SIZE, lora.RETRANSMISSION_TIMEOUT, lora.RX_SWITCH_DELAY, lora.CONFIRMATION_INTERVAL = defaults[1:]
+
+
+# port of a fresh simulated link shared by the drone and the ground
+def simulated_port(name, channel, seed, time_scale) -> str:
+    port = f'{simulator.SIM_PREFIX}{name}?channel={quote(channel, safe="")}&scale={time_scale}'
+    if seed is not None:
+        port += f'&seed={seed}'
+
+    return port
+
+
+def wait_for_ground(ports):
+    if not ports[0].startswith(simulator.SIM_PREFIX):
+        time.sleep(GROUND_SETUP_TIME)
+        return
+
+    link = simulator.open_link(ports[0])
+    while sum(modem.receiving for modem in link.modems) < len(ports):
+        time.sleep(0.01)
+
+
+# one transfer of path from the drone to the ground ports, None if it failed or timed out
+def run_transfer(path, drone_ports, ground_ports, timeout=TRANSFER_TIMEOUT) -> dict:
+    done = threading.Event()
+    ground = threading.Thread(target=lora.launch_server, args=(ground_ports, True), kwargs={'stop': done.is_set}, daemon=True)
+    ground.start()
+    wait_for_ground(ground_ports)
+
+    drone = lora.Drone(drone_ports, configure=True)
+    stats = {}
+
+    def send():
+        try:
+            with sources.FileSource(path, lora.CHUNK_SIZE) as source:
+                stats.update(drone.transmit_image(source))
+        except Exception as e:
+            # the ports are closed under a transfer that timed out
+            stats['error'] = e
+
+    sender = threading.Thread(target=send, daemon=True)
+    sender.start()
+
+    try:
+        buffer, _, _, reception = lora.image_queue.get(timeout=timeout)
+        sender.join(timeout)
+    except queue.Empty:
+        buffer = None
+    finally:
+        done.set()
+        for radio in drone.radios:
+            if radio.serial:
+                radio.serial.close()
+        ground.join()
+
+    if buffer is None or 'duration_s' not in stats:
+        return None
+
+    with open(path, 'rb') as f:
+        if buffer != f.read():
+            return None
+
+    return {
+        'bytes': len(buffer),
+        'duration_s': stats['duration_s'],
+        'first_pass_s': stats['first_pass_s'],
+        'ground_duration_s': reception['duration_s'],
+        'goodput_bytes_per_s': len(buffer) / stats['duration_s'],
+        'retransmission_rounds': stats['retransmission_rounds'],
+        'retransmitted_chunks': stats['retransmitted_chunks'],
+    }
+
+
+# one transfer over a fresh simulated link, in simulated seconds
+def run_simulated(path, spreading_factor, bandwidth, channel, seed, time_scale, radios=1) -> dict:
+    lora.RF_CONFIG['spreading_factor'] = spreading_factor
+    lora.RF_CONFIG['bandwidth'] = bandwidth
+
+    name = f'bench-{os.getpid()}-{time.monotonic_ns()}'
+    # every radio of the drone and the ground shares the link, each pair on its own frequency
+    ports = [simulated_port(name, channel, seed, time_scale)] * radios
+
+    try:
+        run = run_transfer(path, ports, ports, TRANSFER_TIMEOUT * time_scale)
+    finally:
+        simulator.close_link(name)
+
+    if run is None:
+        raise RuntimeError(f'{path} was not reassembled correctly')
+
+    for key in ('duration_s', 'first_pass_s', 'ground_duration_s'):
+        run[key] /= time_scale
+    run['goodput_bytes_per_s'] *= time_scale
+
+    return run
+
+
+def run_e2e(images, settings, repeat, time_scale, seed, radios=1) -> dict:
+    results = {}
+    with scaled_protocol(time_scale):
+        for path in images:
+            for spreading_factor, bandwidth, channel in settings:
+                key = f'{os.path.basename(path)}@SF{spreading_factor}/BW{bandwidth}/{channel}'
+                if radios > 1:
+                    key += f'/x{radios}'
+                runs = []
+
+                for i in range(repeat):
+                    with redirect_stdout(io.StringIO()):
+                        runs.append(run_simulated(path, spreading_factor, bandwidth, channel, seed + i, time_scale, radios))
+
+                durations = sorted(run['duration_s'] for run in runs)
+                results[key] = {
+                    'bytes': runs[0]['bytes'],
+                    'duration_s': statistics.median(durations),
+                    'duration_p90_s': durations[min(len(durations) - 1, round(0.9 * (len(durations) - 1)))],
+                    'first_pass_s': statistics.median(run['first_pass_s'] for run in runs),
+                    'goodput_bytes_per_s': statistics.median(run['goodput_bytes_per_s'] for run in runs),
+                    'retransmission_rounds': statistics.median(run['retransmission_rounds'] for run in runs),
+                    'retransmitted_chunks': statistics.median(run['retransmitted_chunks'] for run in runs),
+                }
+                print_e2e(key, results[key])
+
+    return results
+
+
+def print_micro(results):
+    for name, result in results.items():
+        throughput = f"{result['bytes_per_s'] / 10**6:>9.1f} MB/s" if 'bytes_per_s' in result else ''
+        print(f"{name:20} {result['ns_per_op']:>14,.0f} ns/op {throughput}")
+
+
+def print_startup(results):
+    for name, result in results.items():
+        print(f"{name:20} {result['import_us'] / 1000:>11.1f} ms {result['modules']:>6} modules")
+
+
+def print_e2e(key, result):
+    print(
+        f"{key:45} {result['duration_s']:>8.1f}s {result['goodput_bytes_per_s']:>8,.0f} B/s "
+        f"{result['retransmission_rounds']:>4g} rounds {result['retransmitted_chunks']:>5g} resent"
+    )
+
+
+# (section, name, metric, baseline, current, change) for every metric that got worse
+def compare(results, baseline, threshold) -> list:
+    regressions = []
+
+    for section in ('micro', 'startup', 'e2e'):
+        for name, metrics in results.get(section, {}).items():
+            before = baseline.get(section, {}).get(name)
+            if not before:
+                continue
+
+            for metric, higher_is_better in COMPARED_METRICS.items():
+                if metric not in metrics or not before.get(metric):
+                    continue
+
+                change = (metrics[metric] - before[metric]) / before[metric]
+                if (-change if higher_is_better else change) > threshold:
+                    regressions.append((section, name, metric, before[metric], metrics[metric], change))
+
+    return regressions
+
+
+def get_args():
+    parser = argparse.ArgumentParser(description='benchmark protocol hot paths and simulated end-to-end transfers')
+
+    parser.add_argument('--micro', action=argparse.BooleanOptionalAction, help='run micro-benchmarks', default=True)
+    parser.add_argument('--startup', action=argparse.BooleanOptionalAction, help='time cold imports of the entry points', default=True)
+    parser.add_argument('--e2e', action=argparse.BooleanOptionalAction, help='run end-to-end transfers', default=True)
+    parser.add_argument('--images', nargs='+', help='images to transfer (default: small samples, "all" for every sample)', default=E2E_IMAGES)
+    parser.add_argument('--settings', nargs='+', type=setting_type, metavar='SF:BW:CHANNEL', help='end-to-end settings, e.g. 7:250:gilbert:0.05,0.3', default=E2E_SETTINGS)
+    parser.add_argument('--radios', type=int, help='stripe end-to-end transfers over this many radio pairs', default=1)
+    parser.add_argument('--repeat', type=int, help='end-to-end runs per image and setting', default=3)
+    parser.add_argument('--seed', type=int, help='first seed for the channel models', default=1)
+    parser.add_argument('--time-scale', type=float, help='speed up simulated airtime and timeouts', default=TIME_SCALE)
+    parser.add_argument('--output', '-o', help='write results as JSON')
+    parser.add_argument('--baseline', help='compare against this saved baseline', default=BASELINE_PATH)
+    parser.add_argument('--save-baseline', action='store_true', help='store these results as the new baseline')
+    parser.add_argument('--threshold', type=float, help='relative change that counts as a regression', default=REGRESSION_THRESHOLD)
+
+    return parser.parse_args()
+
+
+def setting_type(arg):
+    try:
+        sf, bw, channel = arg.split(':', 2)
+        parse_channel(channel)
+        return int(sf), int(bw), channel
+    except ValueError:
+        raise argparse.ArgumentTypeError("invalid setting, must match SF:BW:CHANNEL")
+
+
+if __name__ == '__main__':
+    args = get_args()
+    lora.VERBOSE = False
+
+    images = sorted(glob.glob('sample_images/*')) if args.images == ['all'] else args.images
+
+    results = {
+        'meta': {
+            'time': datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'machine': platform.machine(),
+            'time_scale': args.time_scale,
+        },
+    }
+
+    if args.micro:
+        print('[*] Micro-benchmarks')
+        results['micro'] = run_micro()
+        print_micro(results['micro'])
+
+    regressions = []
+    if args.startup:
+        print('[*] Startup (python -X importtime)')
+        results['startup'] = run_startup()
+        print_startup(results['startup'])
+
+        # headless entry points loading Tk or PIL up front fail regardless of timing
+        excluded = results['startup'].get('lora', {}).get('excluded')
+        if excluded:
+            regressions.append(('startup', 'lora', 'excluded', 0, len(excluded), 1))
+
+    if args.e2e:
+        print('[*] End-to-end transfers (simulated seconds)')
+        results['e2e'] = run_e2e(images, args.settings, args.repeat, args.time_scale, args.seed, args.radios)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f'[+] Results written to "{args.output}"')
+
+    if args.save_baseline:
+        with open(args.baseline, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f'[+] Baseline saved to "{args.baseline}"')
+    elif os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            regressions += compare(results, json.load(f), args.threshold)
+
+        if not regressions:
+            print(f'[+] No regressions against "{args.baseline}"')
+
+    # also when saving a baseline, which fails on excluded imports all the same
+    for section, name, metric, before, after, change in regressions:
+        if metric == 'excluded':
+            importers = results['startup']['lora']['excluded_by']
+            print(f"[!] Regression in startup lora: imports {', '.join(f'{package} (from {module})' for package, module in importers.items())} at startup")
+        else:
+            print(f'[!] Regression in {section} {name} {metric}: {before:,.3f} -> {after:,.3f} ({change:+.1%})')
+
+    exit(1 if regressions else 0)
@@ -0,0 +1,241 @@
+from http.server import ThreadingHTTPServer, SimpleHTTPRequestHandler
+from functools import partial
+import threading
+import queue
+import json
+import os
+
+import wire
+
+BRIDGE_PORT = 8765
+
+# per-viewer backlog, a viewer that falls this far behind loses its oldest events
+# rather than letting its queue grow without bound
+VIEWER_QUEUE_SIZE = 256
+
+# seconds between SSE comments that keep idle connections open through proxies
+KEEPALIVE_INTERVAL = 15
+
+# largest request body a viewer may POST
+MAX_REQUEST_SIZE = 4096
+
+DASHBOARD_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'dashboard')
+
+
+def encode_event(event, data) -> bytes:
+    return f'event: {event}\ndata: {wire.dumps(data)}\n\n'.encode()
+
+
+# region of interest request POSTed by a viewer as
+# {"digest": "<8 hex digits>", "rect": [x0, y0, x1, y1], "budget": bytes, "quality": 1-100}
+# with the corners as fractions of the image size, raises ValueError when malformed
+def parse_roi_request(body: bytes) -> dict:
+    try:
+        request = json.loads(body)
+        digest = bytes.fromhex(request['digest'])
+        x0, y0, x1, y1 = (float(v) for v in request['rect'])
+        budget = int(request.get('budget') or 0)
+        quality = int(request.get('quality') or 0)
+    except (KeyError, TypeError, AttributeError) as e:
+        raise ValueError(f'invalid request: {e}')
+
+    if len(digest) != 4:
+        raise ValueError('digest must be 4 bytes')
+    if not (0 <= x0 < x1 <= 1 and 0 <= y0 < y1 <= 1):
+        raise ValueError('rect must be fractions with x0 < x1 and y0 < y1')
+    if not (0 <= budget < 2**32 and 0 <= quality <= 100):
+        raise ValueError('budget or quality out of range')
+
+    return {'digest': digest, 'rect': (x0, y0, x1, y1), 'budget': budget, 'quality': quality}
+
+
+# queue an event for a viewer, making room by dropping its oldest one when it is behind
+def offer(viewer: queue.Queue, message):
+    while True:
+        try:
+            return viewer.put_nowait(message)
+        except queue.Full:
+            try:
+                viewer.get_nowait()
+            except queue.Empty:
+                pass
+
+
+# Server-Sent Events bridge between the ground server and any number of dashboard viewers
+class Bridge:
+    def __init__(self, host='localhost', port=BRIDGE_PORT, origins=()):
+        self.host = host
+        self.port = port
+        # pages besides the bridge's own that may send requests to the drone
+        self.origins = set(origins)
+        # host:port names the bridge answers to, filled in once bound
+        self.hosts = set()
+
+        # the radio loop only ever appends to this queue, encoding and fan out to
+        # viewers happen on the broadcaster thread
+        self.events = queue.SimpleQueue()
+        self.viewers = set()
+        self.viewers_lock = threading.Lock()
+
+        # replayed to late viewers so they can pick up the transfer in progress
+        self.history = []
+
+        # requests from viewers for the drone, sent by the radio loop while it is idle
+        self.requests = queue.SimpleQueue()
+
+        self.server = None
+
+    def start(self):
+        handler = partial(BridgeRequestHandler, self, directory=DASHBOARD_DIR)
+        self.server = ThreadingHTTPServer((self.host, self.port), handler)
+        self.server.daemon_threads = True
+
+        # a page rebinding its own domain to this address sends that domain as Host, so
+        # only the names of the bound address are served
+        port = self.server.server_port
+        self.hosts = {f'{host}:{port}' for host in ('localhost', '127.0.0.1', self.host)}
+        self.origins |= {f'http://{host}' for host in self.hosts}
+
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        threading.Thread(target=self.broadcast, daemon=True).start()
+
+        print(f'[+] Bridge serving dashboard and events on http://{self.host}:{self.port}')
+
+        return self
+
+    def publish(self, event, **data):
+        self.events.put((event, data))
+
+    def broadcast(self):
+        while True:
+            event, data = self.events.get()
+            message = encode_event(event, data)
+
+            with self.viewers_lock:
+                # a new session makes everything before it irrelevant to late viewers
+                if event == 'session':
+                    self.history = []
+                # telemetry is only useful while fresh, keep the last position only
+                if event == 'telemetry':
+                    self.history = [(e, m) for e, m in self.history if e != 'telemetry']
+                self.history.append((event, message))
+
+                for viewer in self.viewers:
+                    offer(viewer, message)
+
+    def subscribe(self) -> queue.Queue:
+        viewer = queue.Queue(VIEWER_QUEUE_SIZE)
+
+        with self.viewers_lock:
+            # the history starts at the newest session, a transfer too long to replay whole
+            # is replayed from its session event and its latest events
+            replay = self.history
+            if len(replay) > VIEWER_QUEUE_SIZE:
+                replay = replay[:1] + replay[1 - VIEWER_QUEUE_SIZE:]
+
+            for _, message in replay:
+                viewer.put_nowait(message)
+            self.viewers.add(viewer)
+
+        return viewer
+
+    def unsubscribe(self, viewer):
+        with self.viewers_lock:
+            self.viewers.discard(viewer)
+
+
+class BridgeRequestHandler(SimpleHTTPRequestHandler):
+    def __init__(self, bridge, *args, **kwargs):
+        self.bridge = bridge
+        super().__init__(*args, **kwargs)
+
+    def end_headers(self):
+        # anyone may watch, viewers load the dashboard from disk or another host, but a
+        # request makes the ground transmit, only allowed origins get to read the answer
+        if self.command in ('GET', 'HEAD'):
+            self.send_header('Access-Control-Allow-Origin', '*')
+        elif self.headers.get('Origin') and self.origin_allowed():
+            self.send_header('Access-Control-Allow-Origin', self.headers['Origin'])
+            self.send_header('Vary', 'Origin')
+        super().end_headers()
+
+    # browsers send Origin with every POST, clients without one are not a web page
+    def origin_allowed(self) -> bool:
+        origin = self.headers.get('Origin')
+
+        return not origin or origin in self.bridge.origins
+
+    def parse_request(self) -> bool:
+        if not super().parse_request():
+            return False
+
+        if self.headers.get('Host') not in self.bridge.hosts:
+            self.send_error(403, 'Unknown host')
+            return False
+
+        return True
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_json(self, status, data):
+        body = json.dumps(data).encode()
+
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    # CORS preflight for the JSON POSTs
+    def do_OPTIONS(self):
+        if not self.origin_allowed():
+            return self.send_json(403, {'error': 'origin not allowed'})
+
+        self.send_response(204)
+        self.send_header('Access-Control-Allow-Methods', 'POST, OPTIONS')
+        self.send_header('Access-Control-Allow-Headers', 'Content-Type')
+        self.end_headers()
+
+    def do_POST(self):
+        if self.path.split('?')[0] != '/roi':
+            return self.send_json(404, {'error': 'not found'})
+        # a form on any page can POST without a preflight
+        if not self.origin_allowed():
+            return self.send_json(403, {'error': 'origin not allowed'})
+
+        length = int(self.headers.get('Content-Length') or 0)
+        if length > MAX_REQUEST_SIZE:
+            return self.send_json(413, {'error': 'request too large'})
+
+        try:
+            request = parse_roi_request(self.rfile.read(length))
+        except ValueError as e:
+            return self.send_json(400, {'error': str(e)})
+
+        self.bridge.requests.put(request)
+        self.send_json(202, {'queued': True})
+
+    def do_GET(self):
+        if self.path.split('?')[0] != '/events':
+            return super().do_GET()
+
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Cache-Control', 'no-cache')
+        self.end_headers()
+
+        viewer = self.bridge.subscribe()
+        try:
+            while True:
+                try:
+                    message = viewer.get(timeout=KEEPALIVE_INTERVAL)
+                except queue.Empty:
+                    message = b': keepalive\n\n'
+
+                self.wfile.write(message)
+                self.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+        finally:
+            self.bridge.unsubscribe(viewer)
@@ -0,0 +1,176 @@
+import random
+import copy
+
+# Channel impairment models, seeded so a failing run can be replayed exactly.
+#
+# Every model maps one frame to the list of (delay_s, frame) deliveries it turns
+# into: none when lost, several when duplicated, altered when corrupted.
+#
+# Specs are model[:args][+impairment:args...], for example
+#   none
+#   bernoulli:0.3                   30% independent loss
+#   gilbert:0.05,0.3                bursts, good->bad 5%, bad->good 30%, lose all in bad
+#   gilbert:0.05,0.3,0.01,0.8       same with 1% loss while good and 80% while bad
+#   pattern:1101                    deliver, deliver, drop, deliver, repeating
+#   bernoulli:0.1+delay:0.2,0.1+dup:0.01+corrupt:0.001
+
+
+class Channel:
+    def __init__(self, rng: random.Random = None):
+        self.random = rng or random.Random()
+        # seed of the generator, set by parse_channel()
+        self.seed = None
+
+    def lost(self) -> bool:
+        return False
+
+    def apply(self, frame: bytes) -> list:
+        return [] if self.lost() else [(0, frame)]
+
+    # an independent copy for one of several radios sending at once. The models keep
+    # state between frames, each radio gets its own seeded with seed + index so a seeded
+    # run does not depend on how the radio threads interleave
+    def fork(self, index) -> 'Channel':
+        channel = copy.deepcopy(self)
+        channel.seed = None if self.seed is None else self.seed + index
+        channel.random.seed(channel.seed)
+
+        return channel
+
+    def __str__(self):
+        return 'none'
+
+
+class Bernoulli(Channel):
+    def __init__(self, loss, rng=None):
+        super().__init__(rng)
+        self.loss = loss
+
+    def lost(self) -> bool:
+        return self.random.random() < self.loss
+
+    def __str__(self):
+        return f'bernoulli:{self.loss:g}'
+
+
+# two state Markov chain, loss probability depends on the current state
+class GilbertElliott(Channel):
+    def __init__(self, p_good_bad, p_bad_good, loss_good=0.0, loss_bad=1.0, rng=None):
+        super().__init__(rng)
+        self.p_good_bad = p_good_bad
+        self.p_bad_good = p_bad_good
+        self.loss_good = loss_good
+        self.loss_bad = loss_bad
+        self.bad = False
+
+    def lost(self) -> bool:
+        if self.bad:
+            self.bad = self.random.random() >= self.p_bad_good
+        else:
+            self.bad = self.random.random() < self.p_good_bad
+
+        return self.random.random() < (self.loss_bad if self.bad else self.loss_good)
+
+    def __str__(self):
+        return f'gilbert:{self.p_good_bad:g},{self.p_bad_good:g},{self.loss_good:g},{self.loss_bad:g}'
+
+
+# deterministic, '1' delivers and '0' drops the frame, repeating
+class Pattern(Channel):
+    def __init__(self, pattern, rng=None):
+        super().__init__(rng)
+        self.pattern = pattern
+        self.index = 0
+
+    def lost(self) -> bool:
+        delivered = self.pattern[self.index % len(self.pattern)] == '1'
+        self.index += 1
+
+        return not delivered
+
+    def __str__(self):
+        return f'pattern:{self.pattern}'
+
+
+# delay, duplication and corruption applied on top of another model
+class Impaired(Channel):
+    def __init__(self, channel: Channel, delay=0.0, jitter=0.0, duplicate=0.0, corrupt=0.0, rng=None):
+        super().__init__(rng)
+        self.channel = channel
+        self.delay = delay
+        self.jitter = jitter
+        self.duplicate = duplicate
+        self.corrupt = corrupt
+
+    def apply(self, frame: bytes) -> list:
+        deliveries = []
+
+        for delay, frame in self.channel.apply(frame):
+            copies = 2 if self.random.random() < self.duplicate else 1
+
+            for _ in range(copies):
+                copy = self.flip_bit(frame) if self.random.random() < self.corrupt else frame
+                deliveries.append((delay + self.delay + self.random.uniform(0, self.jitter), copy))
+
+        return deliveries
+
+    def flip_bit(self, frame: bytes) -> bytes:
+        corrupted = bytearray(frame)
+        bit = self.random.randrange(len(frame) * 8)
+        corrupted[bit // 8] ^= 1 << (bit % 8)
+
+        return bytes(corrupted)
+
+    def __str__(self):
+        impairments = [str(self.channel)]
+        if self.delay or self.jitter:
+            impairments.append(f'delay:{self.delay:g},{self.jitter:g}')
+        if self.duplicate:
+            impairments.append(f'dup:{self.duplicate:g}')
+        if self.corrupt:
+            impairments.append(f'corrupt:{self.corrupt:g}')
+
+        return '+'.join(impairments)
+
+
+def parse_channel(spec, seed=None) -> Channel:
+    # a single generator shared by all parts keeps the whole channel reproducible
+    rng = random.Random(seed)
+
+    model, *impairments = spec.split('+')
+    name, _, args = model.partition(':')
+    values = [float(x) for x in args.split(',')] if args and name != 'pattern' else []
+
+    if name == 'none':
+        channel = Channel(rng)
+    elif name == 'bernoulli' and len(values) == 1:
+        channel = Bernoulli(*values, rng=rng)
+    elif name == 'gilbert' and len(values) in (2, 4):
+        channel = GilbertElliott(*values, rng=rng)
+    elif name == 'pattern' and args and set(args) <= {'0', '1'}:
+        channel = Pattern(args, rng=rng)
+    else:
+        raise ValueError(f'invalid channel model "{model}"')
+
+    if not impairments:
+        channel.seed = seed
+        return channel
+
+    options = {}
+    for impairment in impairments:
+        name, _, args = impairment.partition(':')
+        values = [float(x) for x in args.split(',')] if args else []
+
+        if name == 'delay' and len(values) in (1, 2):
+            options['delay'], options['jitter'] = (*values, 0)[:2]
+        elif name == 'dup' and len(values) == 1:
+            options['duplicate'] = values[0]
+        elif name == 'corrupt' and len(values) == 1:
+            options['corrupt'] = values[0]
+        else:
+            raise ValueError(f'invalid channel impairment "{impairment}"')
+
+    channel = Impaired(channel, rng=rng, **options)
+    channel.seed = seed
+
+    return channel
@@ -1,4 +1,283 @@
 // LoRa Ground Station using Browser Web Serial API
+
+// Feeds serial reads to the RxParser (rx-parser.js), in a Web Worker when the page
+// may start one (not over file://), otherwise inline on the main thread
+class RxParserClient {
+  constructor() {
+    this.pending = [];
+    this.parser = null;
+
+    try {
+      this.worker = new Worker("rx-parser.js");
+      this.worker.onmessage = (e) =>
+        this.pending.shift()(e.data.map((buffer) => new Uint8Array(buffer)));
+    } catch (error) {
+      console.log(`[-] Parsing on the main thread, could not start worker: ${error.message}`);
+      this.worker = null;
+      this.parser = new RxParser();
+    }
+  }
+
+  // resolves to the RX packets completed by these bytes, in arrival order
+  push(bytes) {
+    if (!this.worker) {
+      return Promise.resolve(this.parser.push(bytes));
+    }
+
+    // only transfer a buffer the view covers entirely
+    if (bytes.byteOffset !== 0 || bytes.byteLength !== bytes.buffer.byteLength) {
+      bytes = bytes.slice();
+    }
+
+    return new Promise((resolve) => {
+      this.pending.push(resolve);
+      this.worker.postMessage(bytes.buffer, [bytes.buffer]);
+    });
+  }
+}
+
+// Renders the received part of an image while its chunks are still arriving.
+// Chunks are placed into one preallocated buffer as they come in, and the
+// contiguous prefix is re-decoded at most every PARTIAL_RENDER_INTERVAL ms
+// with createImageBitmap, which decodes off the main thread.
+class PartialImageRenderer {
+  constructor(canvas, chunkMapCanvas) {
+    this.canvas = canvas;
+    this.chunkMapCanvas = chunkMapCanvas;
+    this.PARTIAL_RENDER_INTERVAL = 250;
+    this.renderTimer = null;
+    this.active = false;
+  }
+
+  start(totalBytes, numChunks, payloadSize, width, height) {
+    this.finish();
+
+    // one extra slot for the end-of-image marker appended before decoding
+    this.buffer = new Uint8Array(totalBytes + 2);
+    this.received = new Uint8Array(numChunks);
+    this.numChunks = numChunks;
+    this.payloadSize = payloadSize;
+    this.totalBytes = totalBytes;
+    this.contiguous = 0;
+    this.renderedBytes = 0;
+    this.lastRenderTime = 0;
+    this.active = true;
+
+    if (!this.canvas) return;
+
+    this.canvas.width = width || 1;
+    this.canvas.height = height || 1;
+    this.drawPlaceholder(0);
+    this.canvas.style.display = "block";
+    if (this.chunkMapCanvas) this.chunkMapCanvas.style.display = "block";
+
+    this.imgElement = document.getElementById("receivedImage");
+    if (this.imgElement) this.imgElement.style.display = "none";
+  }
+
+  addChunk(seq, payload) {
+    if (!this.active || seq >= this.numChunks || this.received[seq]) return;
+
+    const offset = seq * this.payloadSize;
+    this.buffer.set(payload.subarray(0, this.totalBytes - offset), offset);
+    this.received[seq] = 1;
+
+    while (this.contiguous < this.numChunks && this.received[this.contiguous]) {
+      this.contiguous++;
+    }
+
+    this.scheduleRender();
+  }
+
+  scheduleRender() {
+    if (this.renderTimer) return;
+
+    const wait = Math.max(
+      0,
+      this.lastRenderTime + this.PARTIAL_RENDER_INTERVAL - performance.now()
+    );
+    this.renderTimer = setTimeout(() => {
+      this.renderTimer = null;
+      this.render();
+    }, wait);
+  }
+
+  async render() {
+    if (!this.active) return;
+    this.lastRenderTime = performance.now();
+    this.drawChunkMap();
+
+    const prefixBytes = Math.min(this.contiguous * this.payloadSize, this.totalBytes);
+    if (prefixBytes === this.renderedBytes) return;
+    this.renderedBytes = prefixBytes;
+
+    const prefix = imagePrefix(this.buffer, prefixBytes);
+    if (!prefix) return;
+
+    let bitmap;
+    try {
+      bitmap = await createImageBitmap(new Blob([prefix], { type: "image/jpeg" }));
+    } catch (error) {
+      // not enough of the image yet to decode anything
+      return;
+    }
+
+    if (!this.active) {
+      bitmap.close();
+      return;
+    }
+
+    // progressive JPEGs refine the whole frame, baseline ones fill in from the top
+    const rows = isProgressiveJpeg(prefix)
+      ? this.canvas.height
+      : Math.ceil((this.canvas.height * prefixBytes) / this.totalBytes);
+
+    this.drawPlaceholder(rows);
+    this.canvas
+      .getContext("2d")
+      .drawImage(bitmap, 0, 0, this.canvas.width, rows * (bitmap.height / this.canvas.height), 0, 0, this.canvas.width, rows);
+    bitmap.close();
+  }
+
+  // hatched placeholder for the rows that have not been received yet
+  drawPlaceholder(fromRow) {
+    const ctx = this.canvas.getContext("2d");
+    const { width, height } = this.canvas;
+
+    ctx.fillStyle = "#1f2937";
+    ctx.fillRect(0, fromRow, width, height - fromRow);
+
+    ctx.save();
+    ctx.beginPath();
+    ctx.rect(0, fromRow, width, height - fromRow);
+    ctx.clip();
+    ctx.strokeStyle = "#374151";
+    ctx.lineWidth = Math.max(1, width / 200);
+    const step = Math.max(8, width / 20);
+    for (let x = -height; x < width; x += step) {
+      ctx.moveTo(x, fromRow);
+      ctx.lineTo(x + height, fromRow + height);
+    }
+    ctx.stroke();
+    ctx.restore();
+  }
+
+  // one cell per chunk, received or still missing
+  drawChunkMap() {
+    if (!this.chunkMapCanvas) return;
+
+    const ctx = this.chunkMapCanvas.getContext("2d");
+    const width = (this.chunkMapCanvas.width = this.chunkMapCanvas.clientWidth || 300);
+    const height = this.chunkMapCanvas.height;
+    const cell = width / this.numChunks;
+
+    ctx.fillStyle = "#374151";
+    ctx.fillRect(0, 0, width, height);
+    ctx.fillStyle = "#60a5fa";
+    for (let seq = 0; seq < this.numChunks; seq++) {
+      if (this.received[seq]) ctx.fillRect(seq * cell, 0, Math.ceil(cell), height);
+    }
+  }
+
+  finish() {
+    clearTimeout(this.renderTimer);
+    this.renderTimer = null;
+    this.active = false;
+
+    if (this.canvas) this.canvas.style.display = "none";
+    if (this.chunkMapCanvas) this.chunkMapCanvas.style.display = "none";
+  }
+}
+
+// Lets the operator drag a rectangle over the displayed image. The rectangle is kept as
+// fractions of the image size so it maps onto the drone's full resolution original.
+class RoiSelector {
+  constructor(container, image, onChange) {
+    this.container = container;
+    this.image = image;
+    this.onChange = onChange;
+    this.rect = null;
+    this.pending = null;
+    this.start = null;
+
+    if (!container || !image) return;
+
+    this.box = document.createElement("div");
+    this.box.className = "roi-selection";
+    this.box.style.display = "none";
+    container.append(this.box);
+
+    image.draggable = false;
+    image.addEventListener("mousedown", (e) => this.begin(e));
+    window.addEventListener("mousemove", (e) => this.update(e));
+    window.addEventListener("mouseup", (e) => this.end(e));
+  }
+
+  fraction(e) {
+    const bounds = this.image.getBoundingClientRect();
+    return [
+      Math.min(1, Math.max(0, (e.clientX - bounds.left) / bounds.width)),
+      Math.min(1, Math.max(0, (e.clientY - bounds.top) / bounds.height)),
+    ];
+  }
+
+  begin(e) {
+    e.preventDefault();
+    this.start = this.fraction(e);
+    this.update(e);
+  }
+
+  update(e) {
+    if (!this.start) return;
+
+    const [x, y] = this.fraction(e);
+    this.draw([
+      Math.min(this.start[0], x),
+      Math.min(this.start[1], y),
+      Math.max(this.start[0], x),
+      Math.max(this.start[1], y),
+    ]);
+  }
+
+  end(e) {
+    if (!this.start) return;
+
+    this.update(e);
+    this.start = null;
+
+    // a click without dragging clears the selection
+    const [x0, y0, x1, y1] = this.pending;
+    if (x1 - x0 < 0.01 || y1 - y0 < 0.01) {
+      this.clear();
+      return;
+    }
+
+    this.rect = this.pending;
+    this.onChange(this.rect);
+  }
+
+  draw(rect) {
+    this.pending = rect;
+
+    const bounds = this.image.getBoundingClientRect();
+    const parent = this.container.getBoundingClientRect();
+    Object.assign(this.box.style, {
+      display: "block",
+      left: `${bounds.left - parent.left + rect[0] * bounds.width}px`,
+      top: `${bounds.top - parent.top + rect[1] * bounds.height}px`,
+      width: `${(rect[2] - rect[0]) * bounds.width}px`,
+      height: `${(rect[3] - rect[1]) * bounds.height}px`,
+    });
+  }
+
+  clear() {
+    this.rect = null;
+    this.pending = null;
+    if (this.box) this.box.style.display = "none";
+    this.onChange(null);
+  }
+}
+
 class GroundStation {
   constructor() {
     // Serial port handling
@@ -20,6 +299,22 @@ class GroundStation {
     this.configureCheckbox = document.getElementById("configureDevice");
     this.startButton = document.getElementById('startReception')
     this.stopButton = document.getElementById('stopReception')
+    this.watchButton = document.getElementById('watchBridge')
+    this.bridgeUrlEl = document.getElementById('bridgeUrl')
+    this.eventSource = null;
+    this.bridgeUrl = null;
+
+    // region of interest requests, see requestRegion()
+    this.currentDigest = null; // digest of the displayed image as reported by the bridge
+    this.roiButton = document.getElementById("requestRoi");
+    this.roiBudgetEl = document.getElementById("roiBudget");
+    this.roiSelector = new RoiSelector(
+      document.getElementById("imageView"),
+      this.imgElement,
+      (rect) => {
+        if (this.roiButton) this.roiButton.disabled = !rect || !this.currentDigest;
+      }
+    );
     
     // Constants matching lora.py
     this.PROTOCOL_HEADER_SIZE = 16;
@@ -32,11 +327,22 @@ class GroundStation {
       powerDbm: 14,
     };
     this.AT_RXLRPKT = "AT+TEST=RXLRPKT\n";
+    this.CONFIG_QUERIES = ["AT+MODE", "AT+UART=BR", "AT+TEST=?"];
+    this.CONFIG_RESPONSE_TIMEOUT = 1000; // for all responses of one write
     this.RETRANSMISSION_TIMEOUT = 10000; // Increased to 10 seconds
     this.RX_SWITCH_DELAY = 500;
     this.VERBOSE = false;
     this.lastChunkTime = 0;
     this.lastSeqNumber = -1; // Track last sequence number
+    this.rxParser = new RxParserClient();
+    this.rxPackets = []; // parsed packets not handled yet
+    this.textDecoder = new TextDecoder();
+    this.responseBuffer = ""; // modem output read past the last configuration response
+    this.logLevels = new WeakMap(); // port -> AT+LOG level applied, see configureModem()
+    this.partialImage = new PartialImageRenderer(
+      document.getElementById("partialImage"),
+      document.getElementById("chunkMap")
+    );
     this.outOfOrderChunks = new Map(); // Store out-of-order chunks
 
     // Reception state
@@ -160,9 +466,14 @@ class GroundStation {
 
   hexToUint8Array(hexString) {
     if (!hexString || hexString.length % 2 !== 0) return new Uint8Array();
-    return new Uint8Array(
-      hexString.match(/.{1,2}/g).map((byte) => parseInt(byte, 16))
-    );
+
+    const bytes = new Uint8Array(hexString.length / 2);
+    for (let i = 0; i < bytes.length; i++) {
+      bytes[i] =
+        (HEX_VALUES[hexString.charCodeAt(2 * i)] << 4) |
+        HEX_VALUES[hexString.charCodeAt(2 * i + 1)];
+    }
+    return bytes;
   }
 
   extractHexData(dataString) {
@@ -260,7 +571,7 @@ class GroundStation {
         this.RETRANSMISSION_TIMEOUT
       );
 
-      const chunk = new TextDecoder().decode(value);
+      const chunk = this.textDecoder.decode(value, { stream: true });
       buffer += chunk;
 
       // Only process complete packets terminated by \r\n
@@ -351,13 +662,8 @@ class GroundStation {
       // Configure if needed
       if (this.configureCheckbox && this.configureCheckbox.checked) {
         this.log("Sending configuration", "info");
-        const configCommands = this.getConfigCommands();
-
-        for (const cmd of configCommands.split("\n")) {
-          await this.sendCommand(`${cmd}\n`);
-          await this.sleep(500);
-        }
-        this.log("Server configured", "success");
+        const sent = await this.configureModem();
+        this.log(sent ? "Server configured" : "Server already configured", "success");
       }
 
       // Start listening
@@ -369,11 +675,8 @@ class GroundStation {
         this.incomingBytes === 0 ||
         this.bytesReceived < this.incomingBytes
       ) {
-        let buffer = "";
-        let hexData = "";
-        let isCollectingHex = false;
-
-        while (true) {
+        // one serial read can complete several packets, drain those first
+        while (!this.rxPackets.length) {
           const { value, done } = await this.readWithTimeout(
             this.RETRANSMISSION_TIMEOUT
           );
@@ -382,39 +685,15 @@ class GroundStation {
           }
 
           this.startTime = performance.now();
-          const chunk = new TextDecoder().decode(value);
-          buffer += chunk;
 
           // Refresh timeout since we received a valid chunk
-          if (chunk) {
+          if (value && value.length) {
             this.lastChunkTime = performance.now();
-          }
-
-          // Look for RX " pattern
-          if (!isCollectingHex && buffer.includes('RX "')) {
-            isCollectingHex = true;
-            const startIndex = buffer.indexOf('RX "') + 4;
-            buffer = buffer.slice(startIndex);
-          }
-
-          // If we're collecting hex data, look for the closing quote
-          if (isCollectingHex && buffer.includes('"')) {
-            const endIndex = buffer.indexOf('"');
-            hexData += buffer.slice(0, endIndex);
-            buffer = buffer.slice(endIndex + 1);
-            isCollectingHex = false;
-            break;
-          } else if (isCollectingHex) {
-            hexData += buffer;
-            buffer = "";
+            this.rxPackets.push(...(await this.rxParser.push(value)));
           }
         }
 
-        if (!hexData) continue;
-
-        let chunkBytes = new Uint8Array(
-          hexData.match(/.{1,2}/g).map((byte) => parseInt(byte, 16))
-        );
+        let chunkBytes = this.rxPackets.shift();
 
         // Handle header packet
         if (
@@ -422,7 +701,7 @@ class GroundStation {
           chunkBytes.length >= this.PROTOCOL_HEADER_SIZE
         ) {
           const headerData = chunkBytes.slice(0, this.PROTOCOL_HEADER_SIZE);
-          const preamble = new TextDecoder().decode(headerData.slice(0, 4));
+          const preamble = preambleOf(headerData);
           const dataView = new DataView(headerData.buffer);
 
           if (preamble === 'LORA') {
@@ -441,7 +720,17 @@ class GroundStation {
             this.log(`Receiving ${this.incomingBytes} bytes`, "info");
 
             this.updateProgress(0, this.incomingBytes);
+            this.partialImage.start(
+              this.incomingBytes - 2 * this.numExpectedChunks,
+              this.numExpectedChunks,
+              this.CHUNK_SIZE - 2,
+              this.width,
+              this.height
+            );
             chunkBytes = chunkBytes.slice(this.PROTOCOL_HEADER_SIZE);
+          } else if (preamble === 'TELM') {
+            this.handleTelemetry(handleTelemetry(chunkBytes))
+            continue
           } else if (preamble === 'CORD') {
             const [lat, lng] = handleCoordinates(chunkBytes.slice(4))
             this.log(`Received CORD: ${lat}, ${lng} coordinates`, 'info')
@@ -455,8 +744,14 @@ class GroundStation {
 
         // Handle data chunk
         if (chunkBytes.length > 2) {
+          // telemetry is interleaved with image chunks
+          if (chunkBytes.length > 4 && preambleOf(chunkBytes) === 'TELM') {
+            this.handleTelemetry(handleTelemetry(chunkBytes))
+            continue
+          }
+
           // check if CORD
-          if (chunkBytes.length > 4 && new TextDecoder().decode(chunkBytes.slice(0, 4)) === 'CORD') {
+          if (chunkBytes.length > 4 && preambleOf(chunkBytes) === 'CORD') {
             const [lat, lng] = handleCoordinates(chunkBytes.slice(4))
             this.log(`Received CORD: ${lat}, ${lng} coordinates`, 'info')
             continue
@@ -489,6 +784,7 @@ class GroundStation {
           this.lastSeqNumber = Math.max(this.lastSeqNumber, seqNumber);
           console.log(`Received chunk ${seqNumber} (${payload.length} bytes)`);
           this.updateProgress(this.bytesReceived, this.incomingBytes);
+          this.partialImage.addChunk(seqNumber, payload);
 
           // Process any out-of-order chunks that can now be processed
           this.processOutOfOrderChunks();
@@ -525,6 +821,7 @@ class GroundStation {
         "info"
       );
 
+      this.partialImage.finish();
       this.displayImage(imageBuffer);
       this.saveImageToFile(imageBuffer, "image.jpeg");
       this.log(`Saved ${this.incomingBytes} bytes to "bytes.bin"`, "success");
@@ -533,9 +830,7 @@ class GroundStation {
       await this.sleep(this.RX_SWITCH_DELAY);
       for (let i = 0; i < 3; i++) {
         const missMessageBytes = this.createMissMessage([]);
-        const missMessage = [...missMessageBytes]
-          .map((b) => b.toString(16).padStart(2, "0"))
-          .join("");
+        const missMessage = bytesToHex(missMessageBytes);
         window.m = missMessageBytes;
         window.k = missMessage;
         await this.sendCommand(`AT+TEST=TXLRPKT, "${missMessage}"\n`);
@@ -603,9 +898,7 @@ class GroundStation {
 
     for (const group of chunkGroups) {
       const missMessage = this.createMissMessage(group);
-      const hexMissMessage = Array.from(missMessage)
-        .map((b) => b.toString(16).padStart(2, "0"))
-        .join("");
+      const hexMissMessage = bytesToHex(missMessage);
       await this.sendCommand(`AT+TEST=TXLRPKT, "${hexMissMessage}"\n`);
       await this.sleep(100);
     }
@@ -622,58 +915,203 @@ class GroundStation {
       const imageUrl = "data:image/jpeg;base64," + text;
       console.log(`text: ${text}`);
 
-      if (this.imgElement) {
-        this.imgElement.src = imageUrl;
-        this.imgElement.style.display = "block";
+      this.showImage(imageUrl);
+      this.saveImageToFile(buffer, "received_image.jpg");
+    } catch (error) {
+      this.log(`Error displaying image: ${error.message}`, "error");
+    }
+  }
+
+  showImage(imageUrl, digest = null) {
+    this.currentDigest = digest;
+    this.roiSelector.clear();
 
-        // Apply default image display class if not already set
-        if (
-          !this.imgElement.classList.contains("image-original") &&
-          !this.imgElement.classList.contains("image-fill")
-        ) {
-          this.imgElement.classList.add("image-original");
-        }
+    if (this.imgElement) {
+      this.imgElement.src = imageUrl;
+      this.imgElement.style.display = "block";
+
+      // Apply default image display class if not already set
+      if (
+        !this.imgElement.classList.contains("image-original") &&
+        !this.imgElement.classList.contains("image-fill")
+      ) {
+        this.imgElement.classList.add("image-original");
       }
+    }
 
-      console.log("[*] Adding image to queue...");
-      const thumbImgContainer = document.createElement('div')
-      const thumbImg = new Image()
+    console.log("[*] Adding image to queue...");
+    const thumbImgContainer = document.createElement('div')
+    const thumbImg = new Image()
 
-      thumbImgContainer.className = 'queued-image'
-      thumbImgContainer.append(thumbImg)
-      thumbImg.src = imageUrl
-      // on click change the main displayed img to our img
-      thumbImg.addEventListener('click', (e) => {
-        this.imgElement.src = e.target.src
-      })
+    thumbImgContainer.className = 'queued-image'
+    thumbImgContainer.append(thumbImg)
+    thumbImg.src = imageUrl
+    // on click change the main displayed img to our img
+    thumbImg.addEventListener('click', (e) => {
+      this.imgElement.src = e.target.src
+      this.currentDigest = digest
+      this.roiSelector.clear()
+    })
 
-      this.imgQueueEl.append(thumbImgContainer)
+    this.imgQueueEl.append(thumbImgContainer)
 
-      this.log("Image displayed successfully", "success");
-      this.saveImageToFile(buffer, "received_image.jpg");
+    this.log("Image displayed successfully", "success");
+  }
+
+  showFrame(imageUrl) {
+    if (!this.imgElement) return;
+
+    // stream frames cannot be cropped, the drone does not keep their originals
+    this.currentDigest = null;
+    this.roiSelector.clear();
+
+    this.imgElement.src = imageUrl;
+    this.imgElement.style.display = "block";
+    if (!this.imgElement.classList.contains("image-fill")) {
+      this.imgElement.classList.add("image-original");
+    }
+  }
+
+  // Thin viewer mode: the Python ground server (lora.py server --bridge) owns the
+  // radio and pushes decoded events here, so no Web Serial access is needed
+  watchBridge(url) {
+    if (this.eventSource) this.eventSource.close();
+
+    url = url.replace(/\/+$/, "");
+    this.bridgeUrl = url;
+    this.log(`Watching ground server at ${url}`, "info");
+    this.eventSource = new EventSource(`${url}/events`);
+
+    this.eventSource.onopen = () => this.updateConnectionStatus(true);
+    this.eventSource.onerror = () => {
+      // EventSource reconnects on its own, just reflect the state
+      this.updateConnectionStatus(false);
+    };
+
+    const on = (event, handler) =>
+      this.eventSource.addEventListener(event, (e) => handler(JSON.parse(e.data)));
+
+    on("session", (session) => {
+      this.incomingBytes = session.bytes;
+      this.width = session.width;
+      this.height = session.height;
+      this.numExpectedChunks = session.chunks;
+      this.chunksReceived = {};
+      this.bytesReceived = 0;
+
+      this.log(`Session ${session.session}: incoming ${session.width}x${session.height} image`, "success");
+      this.log(`Receiving ${session.bytes} bytes`, "info");
+      this.updateProgress(0, session.bytes);
+
+      // stream frames only make sense once decoded against the previous one, and
+      // crops carry a header in front of the JPEG
+      if (session.stream || session.crop) {
+        this.partialImage.finish();
+        return;
+      }
+
+      this.partialImage.start(
+        session.bytes - 2 * session.chunks,
+        session.chunks,
+        session.chunk_size,
+        session.width,
+        session.height
+      );
+    });
+
+    on("chunk", (chunk) => {
+      this.chunksReceived[chunk.seq] = base64ToUint8Array(chunk.data);
+      this.bytesReceived = chunk.received;
+      this.updateProgress(chunk.received, chunk.total);
+      this.partialImage.addChunk(chunk.seq, this.chunksReceived[chunk.seq]);
+    });
+
+    on("missing", (missing) => {
+      this.log(`Ground requested retransmission of ${missing.seqs.length} chunks`, "info");
+    });
+
+    on("image", (image) => {
+      this.log(
+        `Received ${image.width}x${image.height} ${image.parent ? `region of ${image.parent}` : "image"} in ${image.duration_s.toFixed(3)}s (${image.retransmissions} retransmission rounds)`,
+        "success"
+      );
+      this.updateProgress(this.incomingBytes, this.incomingBytes);
+      this.partialImage.finish();
+      this.showImage(`data:image/jpeg;base64,${image.data}`, image.digest);
+      this.saveImageToFile(base64ToUint8Array(image.data), `${image.session}.jpg`);
+    });
+
+    // live stream mode, only the latest frame is kept on screen
+    on("frame", (frame) => {
+      this.updateProgress(this.incomingBytes, this.incomingBytes);
+      this.showFrame(`data:image/jpeg;base64,${frame.data}`);
+      this.log(
+        `Frame ${frame.number} (${frame.kind}): latency ${frame.latency_s.toFixed(1)}s, ${frame.fps.toFixed(2)} fps`,
+        "success"
+      );
+    });
+
+    on("telemetry", (telemetry) => {
+      updateDronePosition(telemetry.latitude, telemetry.longitude);
+      this.handleTelemetry(telemetry);
+    });
+  }
+
+  // asks the drone, through the ground server, for the selected region of the displayed
+  // image at full resolution
+  async requestRegion() {
+    const rect = this.roiSelector.rect;
+    if (!rect || !this.currentDigest) return;
+
+    if (!this.bridgeUrl) {
+      this.log("Region requests go through the ground server, watch it first", "error");
+      return;
+    }
+
+    try {
+      const response = await fetch(`${this.bridgeUrl}/roi`, {
+        method: "POST",
+        headers: { "Content-Type": "application/json" },
+        body: JSON.stringify({
+          digest: this.currentDigest,
+          rect,
+          budget: parseInt(this.roiBudgetEl ? this.roiBudgetEl.value : 0) || 0,
+        }),
+      });
+      const result = await response.json();
+      if (!response.ok) throw new Error(result.error);
+
+      this.log(
+        `Requested region ${rect.map((v) => v.toFixed(2)).join(", ")} of image ${this.currentDigest}`,
+        "success"
+      );
+      this.roiSelector.clear();
     } catch (error) {
-      this.log(`Error displaying image: ${error.message}`, "error");
+      this.log(`Region request failed: ${error.message}`, "error");
     }
   }
 
-  updateDronePosition(lat, lng) {
-    // Simulate random movement within ~0.01 degrees of default position
-    // In a real application, you would extract GPS data from the transmission
-    const randomLat = DEFAULT_LAT + (Math.random() - 0.5) * 0.02;
-    const randomLng = DEFAULT_LNG + (Math.random() - 0.5) * 0.02;
+  handleTelemetry(telemetry) {
+    if (!telemetry) return;
 
-    // Update the map marker
-    if (typeof updateDronePosition === "function") {
-      updateDronePosition(randomLat, randomLng);
+    this.telemetry = telemetry;
+    if (this.VERBOSE) {
       this.log(
-        `Updated drone position: ${randomLat.toFixed(6)}, ${randomLng.toFixed(
-          6
-        )}`,
+        `Drone at ${telemetry.latitude.toFixed(6)}, ${telemetry.longitude.toFixed(6)}, ${telemetry.altitude}m` +
+          (telemetry.battery === null ? "" : `, battery ${telemetry.battery}%`),
         "info"
       );
     }
   }
 
+  updateDronePosition(lat, lng) {
+    // Update the map marker
+    if (typeof updateDronePosition === "function") {
+      updateDronePosition(lat, lng);
+      this.log(`Updated drone position: ${lat.toFixed(6)}, ${lng.toFixed(6)}`, "info");
+    }
+  }
+
   saveImageToFile(buffer, filename) {
     const blob = new Blob([buffer], { type: "image/jpeg" });
     const url = URL.createObjectURL(blob);
@@ -754,14 +1192,9 @@ class GroundStation {
       }
 
       this.log("Starting device configuration...", "info");
-      const configCommands = this.getConfigCommands();
-
-      for (const cmd of configCommands.split("\n")) {
-        await this.sendCommand(`${cmd}\n`);
-        await this.sleep(500);
-      }
+      const sent = await this.configureModem();
 
-      this.log("Device configuration completed successfully", "success");
+      this.log(`Device configuration completed successfully (${sent} command(s) sent)`, "success");
       return true;
     } catch (error) {
       this.log(`Configuration failed: ${error.message}`, "error");
@@ -769,6 +1202,139 @@ class GroundStation {
     }
   }
 
+  // Brings the modem to the state getConfigCommands() describes, same as modem.py.
+  // The current mode, UART and RF settings are queried first and only the commands
+  // that change something are sent, all in one write. AT+LOG cannot be queried, the
+  // level applied is remembered until the modem shows up outside TEST mode (a reset).
+  // Resolves to the number of commands sent
+  async configureModem() {
+    this.responseBuffer = "";
+
+    const state = {};
+    for (const line of await this.pipelineCommands(this.CONFIG_QUERIES)) {
+      const setting = this.responseSetting(line);
+      if (setting) state[setting[0]] = setting[1];
+    }
+
+    if (state.mode !== "TEST") {
+      this.logLevels.delete(this.port);
+    } else if (this.logLevels.has(this.port)) {
+      state.log = this.logLevels.get(this.port);
+    }
+
+    const commands = this.getConfigCommands()
+      .split("\n")
+      .map((command) => command.trim())
+      .filter(Boolean);
+    const changes = commands.filter((command) => {
+      const [key, value] = this.commandSetting(command);
+      return value === null || state[key] !== value;
+    });
+
+    const responses = await this.pipelineCommands(changes);
+    changes.forEach((command, i) => {
+      this.log(`${command} -> ${responses[i]}`, "rx");
+      if (responses[i].includes("ERROR")) {
+        throw new Error(`Command failed: ${command}: ${responses[i]}`);
+      }
+
+      const [key, value] = this.commandSetting(command);
+      if (key === "log") this.logLevels.set(this.port, value);
+    });
+
+    return changes.length;
+  }
+
+  // Writes all commands at once, then reads one response per command. Responses come
+  // back in command order and are matched by their +NAME: prefix, other lines are skipped
+  async pipelineCommands(commands) {
+    if (!commands.length) return [];
+
+    await this.writer.write(
+      new TextEncoder().encode(commands.map((command) => `${command}\n`).join(""))
+    );
+    this.log(`Sent commands: ${commands.join(", ")}`, "tx");
+
+    const responses = [];
+    const deadline = performance.now() + this.CONFIG_RESPONSE_TIMEOUT;
+    while (responses.length < commands.length) {
+      const command = commands[responses.length];
+      const line = await this.readResponseLine(deadline - performance.now());
+      if (line === null) {
+        throw new Error(`No response to ${command}`);
+      }
+
+      const prefix = `+${command.slice(3).split("=")[0].replace(/\?$/, "")}:`;
+      if (line.startsWith(prefix)) responses.push(line);
+    }
+
+    return responses;
+  }
+
+  // next line of modem output or null after ms without one. Bytes past the line are
+  // kept, pipelined responses usually arrive together in one read
+  async readResponseLine(ms) {
+    while (!this.responseBuffer.includes("\r\n")) {
+      if (ms <= 0) return null;
+
+      if (this.readerCanceled) {
+        this.reader = this.port.readable.getReader();
+        this.readerCanceled = false;
+      }
+
+      let timer;
+      const timeout = new Promise((resolve) => (timer = setTimeout(() => resolve("timeout"), ms)));
+      const started = performance.now();
+      const result = await Promise.race([this.reader.read(), timeout]);
+      clearTimeout(timer);
+
+      if (result === "timeout") {
+        await this.reader.cancel();
+        this.readerCanceled = true;
+        return null;
+      }
+      if (result.done) {
+        throw new Error("Reader stream closed");
+      }
+
+      this.responseBuffer += this.textDecoder.decode(result.value, { stream: true });
+      ms -= performance.now() - started;
+    }
+
+    const end = this.responseBuffer.indexOf("\r\n");
+    const line = this.responseBuffer.slice(0, end).trim();
+    this.responseBuffer = this.responseBuffer.slice(end + 2);
+
+    return line;
+  }
+
+  // [setting, value] a configuration command sets, value null for untracked commands
+  commandSetting(command) {
+    let m;
+    if ((m = command.match(/^AT\+LOG=(\w+)$/))) return ["log", m[1]];
+    if ((m = command.match(/^AT\+UART=BR,\s*(\d+)$/))) return ["uart", m[1]];
+    if ((m = command.match(/^AT\+MODE=(\w+)$/))) return ["mode", m[1]];
+    if ((m = command.match(/^AT\+TEST=RFCFG,(\d+),SF(\d+),(\d+),(\d+),(\d+),(-?\d+),(ON|OFF),(ON|OFF),(ON|OFF)$/))) {
+      // the command takes MHz, the modem reports Hz
+      return ["rfcfg", [m[1] * 1e6, ...m.slice(2)].join(",")];
+    }
+
+    return [command, null];
+  }
+
+  // [setting, value] reported by a response line, null when it carries no setting
+  responseSetting(line) {
+    let m;
+    if ((m = line.match(/^\+LOG: (\w+)/))) return ["log", m[1]];
+    if ((m = line.match(/^\+UART: BR, (\d+)/))) return ["uart", m[1]];
+    if ((m = line.match(/^\+MODE: (\w+)/))) return ["mode", m[1]];
+    if ((m = line.match(/RFCFG F:(\d+), SF(\d+), BW(\d+)K, TXPR:(\d+), RXPR:(\d+), POW:(-?\d+)dBm, CRC:(ON|OFF), IQ:(ON|OFF), NET:(ON|OFF)/))) {
+      return ["rfcfg", m.slice(1).join(",")];
+    }
+
+    return null;
+  }
+
   getConfigCommands() {
     return `AT+LOG=${this.VERBOSE ? "DEBUG" : "QUIET"}
   AT+UART=BR,${this.RF_CONFIG.baudRate}
@@ -904,6 +1470,31 @@ document.addEventListener("DOMContentLoaded", () => {
     });
   }
 
+  const watchButton = document.getElementById("watchBridge");
+  const bridgeUrl = document.getElementById("bridgeUrl");
+
+  // served by the bridge itself, default to watching it
+  if (bridgeUrl && window.location.protocol.startsWith("http")) {
+    bridgeUrl.value = window.location.origin;
+  }
+
+  if (watchButton) {
+    watchButton.addEventListener("click", () => {
+      startButton.disabled = true;
+      groundStation.watchBridge(bridgeUrl ? bridgeUrl.value : "http://localhost:8765");
+    });
+  }
+
+  const roiButton = document.getElementById("requestRoi");
+  if (roiButton) {
+    roiButton.addEventListener("click", () => groundStation.requestRegion());
+  }
+
+  const bridgeParam = new URLSearchParams(window.location.search).get("bridge");
+  if (bridgeParam !== null) {
+    groundStation.watchBridge(bridgeParam || window.location.origin);
+  }
+
   if (stopButton) {
     stopButton.addEventListener("click", () => {
       groundStation.stopReception();
@@ -1126,6 +1717,91 @@ function updateDronePosition(lat, lng) {
   }
 }
 
+const HEX_DIGITS = Array.from({ length: 256 }, (_, i) =>
+  i.toString(16).padStart(2, "0")
+);
+
+function bytesToHex(bytes) {
+  let hex = "";
+  for (let i = 0; i < bytes.length; i++) {
+    hex += HEX_DIGITS[bytes[i]];
+  }
+  return hex;
+}
+
+// Decodable JPEG bytes from the first `length` bytes of a partially received image,
+// terminated with an end-of-image marker so decoders stop cleanly. The serial
+// receiver gets the JPEG as base64 text (see displayImage), the bridge as raw bytes.
+function imagePrefix(buffer, length) {
+  let prefix;
+
+  // "/9j/" is the base64 encoding of the JPEG start-of-image marker
+  if (buffer[0] === 0x2f && buffer[1] === 0x39 && buffer[2] === 0x6a && buffer[3] === 0x2f) {
+    let text = "";
+    for (let i = 0; i < length - (length % 4); i += 8192) {
+      text += String.fromCharCode(...buffer.subarray(i, Math.min(i + 8192, length - (length % 4))));
+    }
+    const binary = base64ToUint8Array(text);
+    prefix = new Uint8Array(binary.length + 2);
+    prefix.set(binary);
+  } else {
+    prefix = buffer.slice(0, length + 2);
+  }
+
+  if (prefix.length < 4 || prefix[0] !== 0xff || prefix[1] !== 0xd8) return null;
+
+  prefix[prefix.length - 2] = 0xff;
+  prefix[prefix.length - 1] = 0xd9;
+  return prefix;
+}
+
+// progressive (SOF2) JPEGs contain the whole frame at low quality early on
+function isProgressiveJpeg(bytes) {
+  // walk the marker segments up to the first start of scan
+  let i = 2;
+  while (i + 3 < bytes.length && bytes[i] === 0xff) {
+    const marker = bytes[i + 1];
+    if (marker === 0xc2) return true;
+    if (marker === 0xda) return false;
+    i += 2 + ((bytes[i + 2] << 8) | bytes[i + 3]);
+  }
+  return false;
+}
+
+// first four bytes of a packet as ASCII, e.g. LORA or CORD
+function preambleOf(bytes) {
+  return String.fromCharCode(bytes[0], bytes[1], bytes[2], bytes[3]);
+}
+
+function base64ToUint8Array(data) {
+  const binary = atob(data);
+  const bytes = new Uint8Array(binary.length);
+  for (let i = 0; i < binary.length; i++) {
+    bytes[i] = binary.charCodeAt(i);
+  }
+  return bytes;
+}
+
+// binary telemetry frame, see TELEMETRY_FORMAT in lora.py
+function handleTelemetry(frame) {
+  if (frame.length < 17) return null;
+
+  const view = new DataView(frame.buffer, frame.byteOffset, frame.byteLength);
+  const heading = view.getUint16(14, false);
+  const battery = view.getUint8(16);
+  const telemetry = {
+    latitude: view.getInt32(4, false) / 1e7,
+    longitude: view.getInt32(8, false) / 1e7,
+    altitude: view.getInt16(12, false),
+    heading: heading === 0xffff ? null : heading / 100,
+    battery: battery === 0xff ? null : battery,
+  };
+
+  updateDronePosition(telemetry.latitude, telemetry.longitude);
+
+  return telemetry;
+}
+
 function handleCoordinates(coordinateBytes) {
   const coordinates = new TextDecoder().decode(coordinateBytes) 
   const [lat, lng] = coordinates.split(',')
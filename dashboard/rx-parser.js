@@ -0,0 +1,90 @@
+// Streaming parser for the modem's `+TEST: RX "<hex>"` lines.
+//
+// Loaded both as a classic <script> (main thread fallback) and as a Web Worker,
+// it works directly on the raw serial bytes: no TextDecoder, string concatenation
+// or regex, hex digits are decoded through a lookup table into a preallocated buffer.
+
+// LoRa frames are at most 255 bytes
+const RX_MAX_PACKET_SIZE = 256;
+
+// 'R', 'X', ' ', '"'
+const RX_PREFIX = [0x52, 0x58, 0x20, 0x22];
+const RX_QUOTE = 0x22;
+
+// nibble value of every byte, -1 for non hex characters
+const HEX_VALUES = new Int8Array(256).fill(-1);
+for (let i = 0; i < 10; i++) HEX_VALUES[0x30 + i] = i;
+for (let i = 0; i < 6; i++) {
+  HEX_VALUES[0x41 + i] = 10 + i;
+  HEX_VALUES[0x61 + i] = 10 + i;
+}
+
+class RxParser {
+  constructor() {
+    this.packet = new Uint8Array(RX_MAX_PACKET_SIZE);
+    this.reset();
+  }
+
+  reset() {
+    this.prefixIndex = 0;
+    this.collecting = false;
+    this.length = 0;
+    this.highNibble = -1;
+  }
+
+  // feed raw serial bytes, returns the payloads of every RX packet completed by them
+  push(bytes) {
+    const packets = [];
+
+    for (let i = 0; i < bytes.length; i++) {
+      const byte = bytes[i];
+
+      if (!this.collecting) {
+        if (byte === RX_PREFIX[this.prefixIndex]) {
+          this.prefixIndex++;
+          if (this.prefixIndex === RX_PREFIX.length) {
+            this.collecting = true;
+            this.prefixIndex = 0;
+          }
+        } else {
+          this.prefixIndex = byte === RX_PREFIX[0] ? 1 : 0;
+        }
+        continue;
+      }
+
+      if (byte === RX_QUOTE) {
+        // odd number of hex digits means a corrupted line
+        if (this.highNibble === -1 && this.length > 0) {
+          packets.push(this.packet.slice(0, this.length));
+        }
+        this.reset();
+        continue;
+      }
+
+      const nibble = HEX_VALUES[byte];
+      if (nibble === -1 || this.length === RX_MAX_PACKET_SIZE) {
+        this.reset();
+        continue;
+      }
+
+      if (this.highNibble === -1) {
+        this.highNibble = nibble;
+      } else {
+        this.packet[this.length++] = (this.highNibble << 4) | nibble;
+        this.highNibble = -1;
+      }
+    }
+
+    return packets;
+  }
+}
+
+// running as a worker: serial reads come in, packet buffers are transferred back
+if (typeof WorkerGlobalScope !== "undefined" && self instanceof WorkerGlobalScope) {
+  const parser = new RxParser();
+
+  self.onmessage = (e) => {
+    const buffers = parser.push(new Uint8Array(e.data)).map((packet) => packet.buffer);
+    self.postMessage(buffers, buffers);
+  };
+}
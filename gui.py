@@ -0,0 +1,242 @@
+from tkinter import filedialog
+from PIL import Image, ImageTk
+import tkinter as tk
+import threading
+import sources
+import lora
+import os
+
+from lora import print
+
+# Tk interface of the drone, imported by lora.py only when the client runs with a GUI
+
+
+class DroneGUI:
+    def __init__(self, root, port, configure, auto, position=None, telemetry_interval=lora.TELEMETRY_INTERVAL, channel=None, frequencies=None, preview=None):
+        self.root = root
+        self.root.title("STM32WLE5JC Drone")
+        self.root.geometry("720x640")
+        # the dropdown picks a single port, several ports on the command line are all used
+        self.args_ports = port if isinstance(port, (list, tuple)) else [port]
+        self.args_port = self.args_ports[0]
+        self.frequencies = frequencies
+        self.preview = preview
+        self.configure = configure
+        self.position = position
+        self.telemetry_interval = telemetry_interval
+        self.channel = channel
+        self.cancel = False
+
+        self.drone = None
+
+        self.create_layout()
+        if auto:
+            threading.Thread(target=self.connect_serial).start()
+
+    def create_layout(self):
+        self.controls_frame = tk.Frame(self.root, height=100)
+        self.controls_frame.pack(fill="x", side="bottom")
+
+        self.port_frame = tk.Frame(self.controls_frame)
+        self.port_frame.pack(side="left", padx=10, pady=10)
+
+        self.port_var = tk.StringVar(value=self.args_port)
+        self.port_dropdown = tk.OptionMenu(self.port_frame, self.port_var, self.args_port)
+        self.port_dropdown.pack(side="left")
+
+        self.refresh_button = tk.Button(
+            self.port_frame, text="↻", command=self.refresh_ports, width=2
+        )
+        self.refresh_ports()
+        
+        self.refresh_button.pack(side="left", padx=2)
+
+        self.image_frame = tk.Frame(
+            self.root, height=300, bg="lightgray", relief="ridge"
+        )
+        self.image_frame.pack(fill="both", expand=True)
+        self.image_canvas = tk.Canvas(self.image_frame, bg="lightgray")
+        self.image_canvas.pack(fill="both", expand=True)
+
+        self.choose_button = tk.Button(
+            self.controls_frame, text="Choose Image", command=self.choose_image
+        )
+        self.choose_button.pack(side="left", padx=10, pady=10)
+
+        self.connect_button = tk.Button(
+            self.controls_frame, text="Connect Serial", command=lambda: threading.Thread(target=self.connect_serial).start()
+        )
+        self.connect_button.pack(side="left", padx=10, pady=10)
+
+        self.transmit_button = tk.Button(
+            self.controls_frame,
+            text="Transmit Image",
+            state=tk.DISABLED,
+            command=lambda: threading.Thread(target=self.transmit_image).start()
+        )
+        self.transmit_button.pack(side="left", padx=10, pady=10)
+
+        self.cancel_button = tk.Button(
+            self.controls_frame,
+            text="Cancel Tranmission",
+            state=tk.DISABLED,
+            command=self.cancel_transmission,
+        )
+        self.cancel_button.pack(side="left", padx=10, pady=10)
+
+        self.status_panel = tk.Frame(self.controls_frame)
+        self.status_panel.pack(side="right", padx=5, pady=5)
+
+        self.connection_panel = tk.Frame(self.status_panel)
+        self.connection_panel.pack(side="bottom", padx=0, pady=0)
+
+        self.connection_indicator = tk.Canvas(
+            self.connection_panel,
+            width=20,
+            height=20,
+            bg="#f0f0f0",
+            highlightthickness=0,
+        )
+        self.connection_indicator.pack(side="left", anchor="w", padx=0)
+
+        self.connection_indicator.create_oval(2, 2, 18, 18, fill="red", outline="")
+
+        self.label_connected = tk.Label(
+            self.connection_panel, text="Disconnected", anchor="w"
+        )
+        self.label_connected.pack(side="right", anchor="w")
+
+        self.label_loaded = tk.Label(
+            self.status_panel, text="Image: Not Loaded", anchor="w"
+        )
+        self.label_loaded.pack(side="right", anchor="w")
+
+        self.text_frame = tk.Frame(self.root)
+        self.text_frame.pack(fill="both", expand=True, padx=10, pady=10)
+
+        self.scrollbar = tk.Scrollbar(self.text_frame)
+        self.scrollbar.pack(side="right", fill="y")
+
+        # prints are mirrored to this text box, see lora.print()
+        status_text_box = lora.status_text_box = tk.Text(
+            self.text_frame,
+            wrap="word",
+            height=8,
+            width=50,
+            yscrollcommand=self.scrollbar.set,
+        )
+        status_text_box.pack(side="left", fill="both", expand=True)
+
+        self.scrollbar.config(command=status_text_box.yview)
+
+    def choose_image(self):
+        self.file_path = filedialog.askopenfilename(
+            title="Select an Image",
+            filetypes=[("Image Files", "*.png;*.jpg;*.jpeg;*.bmp;*.gif")],
+        )
+        if self.file_path:
+            self.display_image(self.file_path)
+
+    def cancel_transmission(self):
+        self.cancel = True
+
+    def refresh_ports(self):
+        ports = lora.scan_com_ports()
+        menu = self.port_dropdown["menu"]
+        menu.delete(0, "end")
+
+        for port, description in ports:
+            menu.add_command(
+                label=f"{port}: {description}",
+                command=lambda p=port: self.port_var.set(p),
+            )
+
+        if ports:
+            found_port = [p for p in ports if p[0] == self.args_port]
+
+            if found_port:
+                self.port_var.set(found_port[0][0])
+            else:
+                self.port_var.set(ports[0][0])
+
+    def display_image(self, path):
+        image = Image.open(path)
+        # only the header has been read so far, the full size is all the transfer needs
+        self.image_size = image.size
+
+        canvas_width = self.image_canvas.winfo_width()
+        canvas_height = self.image_canvas.winfo_height()
+
+        if canvas_width == 1 and canvas_height == 1:
+            self.root.update_idletasks()
+            canvas_width = self.image_canvas.winfo_width()
+            canvas_height = self.image_canvas.winfo_height()
+
+        image_ratio = image.width / image.height
+        canvas_ratio = canvas_width / canvas_height
+
+        if image_ratio > canvas_ratio:
+            new_width = canvas_width
+            new_height = int(canvas_width / image_ratio)
+        else:
+            new_height = canvas_height
+            new_width = int(canvas_height * image_ratio)
+
+        # JPEGs decode straight at a reduced scale close to the canvas size
+        image.draft('RGB', (new_width, new_height))
+        resized_image = image.resize((new_width, new_height), Image.Resampling.LANCZOS)
+        image.close()
+
+        self.tk_image = ImageTk.PhotoImage(resized_image)
+        self.label_loaded.config(text=os.path.basename(path))
+        self.image_canvas.delete("all")
+        self.image_canvas.create_image(
+            canvas_width / 2, canvas_height / 2, image=self.tk_image, anchor="center"
+        )
+
+    def connect_serial(self):
+        ports = self.args_ports if len(self.args_ports) > 1 else [self.port_var.get()]
+        print(f"[*] Connecting to drone on {', '.join(ports)} serial port{'s' if len(ports) > 1 else ''}.")
+
+        self.drone = lora.Drone(port=ports, configure=self.configure, telemetry_interval=self.telemetry_interval, channel=self.channel, frequencies=self.frequencies)
+
+        if self.position:
+            latitude, longitude, altitude = self.position
+            self.drone.telemetry = {'latitude': latitude, 'longitude': longitude, 'altitude': altitude}
+
+        if self.drone.serial.is_open:
+            self.transmit_button.config(state=tk.NORMAL)
+            self.label_connected.config(text="Connected")
+            self.connect_button.config(state=tk.DISABLED)
+            self.connection_indicator.create_oval(
+                2, 2, 18, 18, fill="green", outline=""
+            )
+            print("[*] Connected. Ready to transmit.")
+
+            # region of interest requests can come in any time we are not transmitting
+            threading.Thread(target=self.drone.serve_requests, daemon=True).start()
+
+    def transmit_image(self):
+        self.cancel_button.config(state=tk.NORMAL)
+        self.cancel = False
+
+        # the image is mapped rather than read, chunks are paged in as they go out
+        width, height = self.image_size
+        with sources.FileSource(self.file_path, lora.CHUNK_SIZE) as payload:
+            if self.preview:
+                payload = sources.BufferSource(lora.encode_preview(self.file_path, self.preview), lora.CHUNK_SIZE)
+                width, height = payload.dimensions()
+                print(f'[*] Sending {width}x{height} preview ({payload.size} of {os.path.getsize(self.file_path)} bytes)')
+
+            # originals are kept by path, a region request reopens the file
+            self.drone.retain(payload, self.file_path)
+            self.drone.transmit_image(payload, width, height, cancel=lambda: self.cancel)
+
+        self.cancel_button.config(state=tk.DISABLED)
+
+
+def launch_client(port, configure, auto, position=None, telemetry_interval=lora.TELEMETRY_INTERVAL, channel=None, frequencies=None, preview=None):
+    root = tk.Tk()
+    DroneGUI(root, port, configure, auto, position, telemetry_interval, channel, frequencies, preview)
+
+    root.mainloop()
@@ -1,16 +1,27 @@
 #!/usr/bin/env python3
-from serial.tools import list_ports
-from tkinter import filedialog
-from PIL import Image, ImageTk
+from contextlib import ExitStack
+from collections import deque
 from datetime import datetime
-from random import random
 from serial import Serial
 from io import BytesIO
-import tkinter as tk
 import threading
+from channel import Channel, parse_channel
+import simulator
 import argparse
+import selectors
+import tempfile
+import binascii
+import builtins
+import hashlib
+import archive
+import sources
+import stream
+import modem
+import profiler
+import queue
 import struct
 import time
+import sys
 import os
 import re
 
@@ -34,27 +45,118 @@ AT_RXLRPKT = 'AT+TEST=RXLRPKT\n'
 
 CHUNK_SIZE = 200
 
+# largest chunk that still fits a 255 byte frame together with the header and its
+# sequence number
+MAX_CHUNK_SIZE = 255 - PROTOCOL_HEADER_SIZE - 2
+
 RETRANSMISSION_TIMEOUT = 10
 
+# Telemetry frame (17 bytes), sent by the drone in between image chunks
+# +--------+----------+-----------+----------+-----------+---------+
+# | "TELM" | latitude | longitude | altitude |  heading  | battery |
+# +--------+----------+-----------+----------+-----------+---------+
+# |   4B   |    4B    |    4B     |    2B    |    2B     |   1B    |
+# +--------+----------+-----------+----------+-----------+---------+
+# latitude/longitude in 1e-7 degrees, altitude in metres, heading in 0.01 degrees,
+# battery in percent. Unknown heading/battery are sent as all ones.
+TELEMETRY_PREAMBLE = b'TELM'
+TELEMETRY_FORMAT = '>4siihHB'
+TELEMETRY_UNKNOWN_HEADING = 0xFFFF
+TELEMETRY_UNKNOWN_BATTERY = 0xFF
+
+# seconds between telemetry frames while transmitting, 0 disables telemetry
+TELEMETRY_INTERVAL = 2
+
+# Region of interest request (21 bytes), sent by the ground after a preview landed
+# +--------+--------+----+----+----+----+--------+---------+
+# | "ROIR" | digest | x0 | y0 | x1 | y1 | budget | quality |
+# +--------+--------+----+----+----+----+--------+---------+
+# |   4B   |   4B   | 2B | 2B | 2B | 2B |   4B   |   1B    |
+# +--------+--------+----+----+----+----+--------+---------+
+# digest is the start of the SHA-256 of the received image the rectangle was drawn on,
+# corners are in 1/65535 of its width and height. The crop is sent at the best quality
+# fitting budget bytes, or at quality (ROI_QUALITY if 0) when budget is 0.
+ROI_PREAMBLE = b'ROIR'
+ROI_FORMAT = '>4s4sHHHHIB'
+ROI_SCALE = 0xFFFF
+ROI_QUALITY = 85
+
+# The drone answers with a regular transfer whose payload is this header followed by
+# the JPEG crop, digest and corners repeat the request so the ground can link the two
+CROP_PREAMBLE = b'CROP'
+CROP_FORMAT = '>4s4sHHHH'
+CROP_HEADER_SIZE = struct.calcsize(CROP_FORMAT)
+
+# full resolution originals the drone keeps around for ROI requests, and digests of
+# received images the ground remembers to link crops back to
+RETAINED_ORIGINALS = 8
+RECEIVED_DIGESTS = 256
+
+# JPEG quality of the downscaled overview sent with --preview
+PREVIEW_QUALITY = 40
+
 # magic delay based on observation to give enough time for the other transceiver
 # to switch to RX
 RX_SWITCH_DELAY = 0.5
 
-# to be refactored
-status_text_box: tk.Text = None
+# the ground repeats its final (empty) MISS report this many times, this far apart
+CONFIRMATION_COUNT = 3
+CONFIRMATION_INTERVAL = 1
+
+RX_PATTERN = re.compile(rb'RX "(\w+?)"')
+SIGNAL_PATTERN = re.compile(rb'RSSI:(-?\d+), SNR:(-?\d+)')
+
+# Multi-radio striping: with several modems each one sits on its own frequency,
+# RADIO_SPACING MHz below the previous one unless --frequencies says otherwise.
+# Radio i of the drone talks to radio i of the ground.
+RADIO_SPACING = 1
+
+# frames queued per radio ahead of the one on air, faster radios drain their
+# queue sooner and so get handed more of the transfer
+RADIO_QUEUE_DEPTH = 2
+
+# weight of the newest sample in a radio's bytes/s estimate
+THROUGHPUT_SMOOTHING = 0.3
+
+# how long read_any() sleeps between polls of ports it cannot select, see read_any()
+RX_POLL_INTERVAL = 0.01
+
+# received images are decoded and stored here, off the radio thread, the server keeps
+# them beside its --archive
+RECEIVED_DIR = os.path.dirname(archive.ARCHIVE_PATH)
+THUMBNAIL_SIZE = (160, 120)
+IMAGE_WORKERS = 2
+
+# Tk text box of the GUI, prints are mirrored to it
+status_text_box = None
 
-def get_config_commands():
+# bridge.Bridge set when the server runs with --bridge, see publish()
+event_bridge = None
+
+# last (latitude, longitude) reported by the drone
+last_position = None
+
+# image digest -> session that received it, so crops can be linked to their preview
+received_digests = {}
+
+# stage timings of the transfers, only recorded with --profile, see profiler.py
+stages = profiler.Profiler()
+
+def get_config_commands(frequency=None):
     global VERBOSE
 
     commands = f'''\
 AT+LOG={'DEBUG' if VERBOSE else 'QUIET'}
 AT+UART=BR, {RF_CONFIG['baudrate']}
 AT+MODE=TEST
-AT+TEST=RFCFG,{RF_CONFIG['frequency']},SF{RF_CONFIG['spreading_factor']},{RF_CONFIG['bandwidth']},12,15,{RF_CONFIG['power_dbm']},ON,OFF,OFF
+AT+TEST=RFCFG,{frequency or RF_CONFIG['frequency']},SF{RF_CONFIG['spreading_factor']},{RF_CONFIG['bandwidth']},12,15,{RF_CONFIG['power_dbm']},ON,OFF,OFF
 '''
 
     return commands
 
+def radio_frequencies(count) -> list:
+    return [RF_CONFIG['frequency'] - i * RADIO_SPACING for i in range(count)]
+
 def spreading_factor_type(arg):
     MIN_VAL, MAX_VAL = 6, 14
 
@@ -79,6 +181,45 @@ def dbm_type(arg):
     
     return dbm
 
+# (host, port) of [HOST:]PORT, raises ValueError when malformed
+def parse_address(arg) -> tuple:
+    host, _, port = arg.rpartition(':')
+
+    return host or 'localhost', int(port)
+
+def bridge_address_type(arg):
+    try:
+        return parse_address(arg)
+    except ValueError:
+        raise argparse.ArgumentTypeError("invalid bridge address, must match [HOST:]PORT")
+
+# [HOST:]PORT of a TCP merge service, or the path of its Unix socket
+def merge_address_type(arg):
+    if '/' in arg or arg.endswith('.sock'):
+        return arg
+
+    try:
+        return parse_address(arg)
+    except ValueError:
+        raise argparse.ArgumentTypeError("invalid merge address, must match [HOST:]PORT or a socket path")
+
+def position_type(arg):
+    try:
+        values = [float(x) for x in arg.split(',')]
+    except ValueError:
+        raise argparse.ArgumentTypeError("invalid position, must match LAT,LNG[,ALT]")
+    if len(values) not in (2, 3):
+        raise argparse.ArgumentTypeError("invalid position, must match LAT,LNG[,ALT]")
+
+    return (*values, 0) if len(values) == 2 else tuple(values)
+
+def size_type(arg):
+    try:
+        width, height = (int(x) for x in arg.lower().split('x'))
+        return width, height
+    except ValueError:
+        raise argparse.ArgumentTypeError("invalid size, must match WxH")
+
 def com_port_type(arg):
     if type(arg) is str:
         return arg
@@ -91,18 +232,71 @@ def get_args():
     subparsers = parser.add_subparsers(dest='mode', required=True)
     server_parser = subparsers.add_parser('server', help='launch the lora server (ground station)')
     client_parser = subparsers.add_parser('client', help='launch the lora client interface')
+    relay_parser = subparsers.add_parser('relay', help='receive transfers and forward them toward a ground station out of the drone\'s reach')
 
     # shared arguments
-    for p in (server_parser, client_parser):
-        p.add_argument('--port', '-p', help='specify serial COM port name',
+    for p in (server_parser, client_parser, relay_parser):
+        p.add_argument('--port', '-p', nargs='+', help='specify serial COM port name, several ports stripe transfers across radios',
                 type=com_port_type)
+        p.add_argument('--frequencies', nargs='+', type=int, metavar='MHZ', help=f'frequency of each radio (default: {RADIO_SPACING} MHz apart)')
         p.add_argument('--configure', '-c', help='apply default configuration', action='store_true')
         p.add_argument('--sf', type=spreading_factor_type, help='pick spreading factor', default=7)
         p.add_argument('--dbm', type=dbm_type, help='pick transceiver power in dBm', default=14)
         p.add_argument('--bandwidth', '--bw', type=int, choices=(250, 500), help='pick signal bandwidth', default=250)
         p.add_argument('--verbose', '-v', help='verbose mode', action='store_true')
+        p.add_argument('--channel', help='simulate impairments on outgoing frames, e.g. bernoulli:0.3 or gilbert:0.05,0.3 (see channel.py)', default='none')
+        p.add_argument('--seed', type=int, help='seed for the --channel model')
+        p.add_argument('--profile', help='print a per-stage timing breakdown after each transfer', action='store_true')
+        p.add_argument('--profile-output', metavar='FILE', help='also append the breakdowns to this JSON lines file, implies --profile')
+        p.add_argument('--cprofile', metavar='FILE', help='run transfers under cProfile and dump the stats here, implies --profile')
+
+    server_parser.add_argument('--show', action=argparse.BooleanOptionalAction, help='open received images in the default viewer', default=True)
+    server_parser.add_argument('--bridge', type=bridge_address_type, metavar='[HOST:]PORT', help=f'serve the dashboard and push live events to it (e.g. 8765)')
+    server_parser.add_argument('--bridge-origin', nargs='+', metavar='ORIGIN', default=[], help='other origins allowed to send region of interest requests through the bridge, e.g. http://dashboard.local or null for a dashboard opened from disk')
+    server_parser.add_argument('--archive', help='SQLite archive indexing received images', default=archive.ARCHIVE_PATH)
+    relay_parser.add_argument('--tx-port', nargs='+', type=com_port_type, help='port(s) forwarding toward the ground, the --port radios themselves when left out (store and forward)')
+    relay_parser.add_argument('--tx-frequencies', nargs='+', type=int, metavar='MHZ', help=f'frequency of each forwarding radio (default: continuing {RADIO_SPACING} MHz below the --port radios)')
+
+    server_parser.add_argument('--merge', type=merge_address_type, metavar='ADDRESS', help='share chunks with other ground stations through the merge service at [HOST:]PORT or a socket path')
+
+    archive_parser = subparsers.add_parser('archive', help='list or export received images')
+    archive_parser.add_argument('action', choices=('list', 'export'))
+    archive_parser.add_argument('--db', help='SQLite archive to read', default=archive.ARCHIVE_PATH)
+    archive_parser.add_argument('--session', help='only entries from this session')
+    archive_parser.add_argument('--since', type=datetime.fromisoformat, help='only entries received at or after this ISO time')
+    archive_parser.add_argument('--until', type=datetime.fromisoformat, help='only entries received before this ISO time')
+    archive_parser.add_argument('--limit', type=int, help='maximum number of entries')
+    archive_parser.add_argument('--out', help='export directory', default='export')
+    archive_parser.add_argument('--verbose', '-v', help='verbose mode', action='store_true')
+
+    sweep_parser = subparsers.add_parser('sweep', help='rank SF, bandwidth, chunk size and baudrate settings by goodput')
+    sweep_parser.add_argument('--drone-port', nargs='+', help='serial port(s) of the sending modem (default: simulator)')
+    sweep_parser.add_argument('--ground-port', nargs='+', help='serial port(s) of the receiving modem, attached to this machine as well')
+    sweep_parser.add_argument('--sf', nargs='+', type=spreading_factor_type, help='spreading factors to try (default: 6 7 8)')
+    sweep_parser.add_argument('--bandwidth', '--bw', nargs='+', type=int, choices=(125, 250, 500), help='bandwidths to try (default: 250 500)')
+    sweep_parser.add_argument('--chunk-size', nargs='+', type=int, help=f'chunk sizes to try (default: 100 150 200 {MAX_CHUNK_SIZE})')
+    sweep_parser.add_argument('--baudrate', nargs='+', type=int, help='UART baudrates to try, simulator only')
+    sweep_parser.add_argument('--dbm', type=dbm_type, help='transceiver power in dBm', default=14)
+    sweep_parser.add_argument('--image', help='reference image sent at every setting', default='sample_images/dunes_43x32.png')
+    sweep_parser.add_argument('--repeat', type=int, help='transfers per setting', default=3)
+    sweep_parser.add_argument('--timeout', type=float, help='seconds before a transfer counts as failed', default=300)
+    sweep_parser.add_argument('--channel', help='simulated channel model (see channel.py)', default='none')
+    sweep_parser.add_argument('--seed', type=int, help='first seed for the simulated channel model')
+    sweep_parser.add_argument('--time-scale', type=float, help='speed up simulated airtime and timeouts', default=0.05)
+    sweep_parser.add_argument('--output', '-o', help='CSV of the ranked settings', default='sweep.csv')
+    sweep_parser.add_argument('--verbose', '-v', help='verbose mode', action='store_true')
+
+    merge_parser = subparsers.add_parser('merge', help='merge chunks received by several ground stations')
+    merge_parser.add_argument('--listen', type=merge_address_type, metavar='ADDRESS', help='[HOST:]PORT or socket path to serve on', default='8766')
+    merge_parser.add_argument('--verbose', '-v', help='verbose mode', action='store_true')
 
     client_parser.add_argument('--auto', action=argparse.BooleanOptionalAction, help='automatically connect upon launch', default=False)
+    client_parser.add_argument('--position', type=position_type, metavar='LAT,LNG[,ALT]', help='fixed drone position to report in telemetry frames')
+    client_parser.add_argument('--telemetry-interval', type=float, help='seconds between telemetry frames, 0 disables', default=TELEMETRY_INTERVAL)
+    client_parser.add_argument('--preview', type=int, metavar='PX', help='send a low quality overview at most this many pixels wide/high, regions of it can be requested from the dashboard')
+    client_parser.add_argument('--stream', metavar='SOURCE', help='stream frames headless from a directory of images or camera[:INDEX] (needs OpenCV)')
+    client_parser.add_argument('--fps', type=float, help='frames captured per second while streaming', default=stream.STREAM_FPS)
+    client_parser.add_argument('--stream-size', type=size_type, metavar='WxH', help='streamed frame size', default=stream.STREAM_SIZE)
 
     return parser.parse_args()
 
@@ -110,6 +304,8 @@ def timestamp() -> str:
     return datetime.now().strftime("%H:%M:%S")
 
 def scan_com_ports():
+    from serial.tools import list_ports
+
     available_ports = []
     for port in list_ports.comports():
         available_ports.append((port.device, port.description))
@@ -118,62 +314,532 @@ def scan_com_ports():
 def print(*args, **kwargs):
     if status_text_box:
         status_text_box.insert(
-            tk.END, f"{timestamp()}: {' '.join(str(_) for _ in args)} \n"
+            'end', f"{timestamp()}: {' '.join(str(_) for _ in args)} \n"
         )
         status_text_box.yview_moveto(1)
 
-    __builtins__.print(*args, **kwargs)
+    builtins.print(*args, **kwargs)
+
+def open_serial(port, timeout=1):
+    # sim:// ports are in-process simulated modems, see simulator.py
+    if port and port.startswith(simulator.SIM_PREFIX):
+        return simulator.SimulatedModem(port, baudrate=RF_CONFIG['baudrate'], timeout=timeout)
+
+    return Serial(port, baudrate=RF_CONFIG['baudrate'], bytesize=8, parity="N", stopbits=1, timeout=timeout)
+
+# protocol helpers shared by the ground, the drone and the benchmarks
+
+# payload of every RX "<hex>" packet in a modem output line
+def parse_rx(line: bytes) -> bytes:
+    return binascii.unhexlify(b''.join(m.group(1) for m in RX_PATTERN.finditer(line)))
+
+def tx_command(data: bytes) -> bytes:
+    start = stages.clock()
+    command = f'AT+TEST=TXLRPKT, "{data.hex()}"\n'.encode()
+    stages.record('hex_encode', start)
+
+    return command
+
+# hands a frame to the modem, returns its TX DONE confirmation when recv is set
+def write_frame(ser, data: bytes, recv=True) -> bytes:
+    command = tx_command(data)
+
+    start = stages.clock()
+    ser.write(command)
+    stages.record('serial_write', start)
+
+    if stages.enabled:
+        # estimated from the RF settings, it is part of the TX DONE wait below. The
+        # simulator may run airtime faster than real time
+        scale = ser.link.time_scale if isinstance(ser, simulator.SimulatedModem) else 1
+        stages.add('airtime', scale * simulator.airtime(len(data), RF_CONFIG['spreading_factor'], RF_CONFIG['bandwidth']))
+
+    if recv:
+        start = stages.clock()
+        r = ser.read_until(b"TX DONE\r\n")
+        stages.record('tx_done_wait', start)
+
+        return r
+
+def pack_header(bytes_to_send, width, height) -> bytes:
+    return struct.pack('>4sIII', b'LORA', bytes_to_send, width, height)
+
+def pack_chunk(seq, payload) -> bytes:
+    return struct.pack('>H', seq) + payload
+
+def pack_miss(missing_chunks) -> bytes:
+    return b'MISS' + struct.pack('>H' + 'H' * len(missing_chunks), len(missing_chunks), *missing_chunks)
+
+def unpack_miss(data: bytes) -> tuple:
+    num_missing, = struct.unpack('>H', data[4:6])
+    return struct.unpack('>' + 'H' * num_missing, data[6:6 + 2 * num_missing])
+
+# number of chunks in a transmission of incoming_bytes, each carries a 2 byte sequence number
+def num_chunks(incoming_bytes) -> int:
+    return -(-incoming_bytes // (CHUNK_SIZE + 2))
+
+def assemble(chunks_received: dict) -> bytes:
+    return b''.join(chunks_received[seq] for seq in sorted(chunks_received))
+
+# forward an event to dashboard viewers, this is only a queue append so it is safe
+# to call from the radio loop
+def publish(event, **data):
+    if event_bridge:
+        event_bridge.publish(event, **data)
+
+def pack_telemetry(latitude, longitude, altitude=0, heading=None, battery=None) -> bytes:
+    return struct.pack(
+        TELEMETRY_FORMAT,
+        TELEMETRY_PREAMBLE,
+        round(latitude * 10**7),
+        round(longitude * 10**7),
+        max(-2**15, min(2**15 - 1, round(altitude))),
+        TELEMETRY_UNKNOWN_HEADING if heading is None else round(heading % 360 * 100),
+        TELEMETRY_UNKNOWN_BATTERY if battery is None else max(0, min(100, round(battery))),
+    )
+
+def unpack_telemetry(frame: bytes) -> dict:
+    _, latitude, longitude, altitude, heading, battery = struct.unpack(TELEMETRY_FORMAT, frame[:struct.calcsize(TELEMETRY_FORMAT)])
+
+    return {
+        'latitude': latitude / 10**7,
+        'longitude': longitude / 10**7,
+        'altitude': altitude,
+        'heading': None if heading == TELEMETRY_UNKNOWN_HEADING else heading / 100,
+        'battery': None if battery == TELEMETRY_UNKNOWN_BATTERY else battery,
+    }
+
+def image_digest(data: bytes) -> bytes:
+    return hashlib.sha256(data).digest()[:4]
+
+def pack_roi_request(digest, rect, budget=0, quality=0) -> bytes:
+    return struct.pack(ROI_FORMAT, ROI_PREAMBLE, digest, *(round(v * ROI_SCALE) for v in rect), budget, quality)
+
+def unpack_roi_request(frame: bytes) -> dict:
+    _, digest, x0, y0, x1, y1, budget, quality = struct.unpack(ROI_FORMAT, frame[:struct.calcsize(ROI_FORMAT)])
+
+    return {
+        'digest': digest,
+        'rect': tuple(v / ROI_SCALE for v in (x0, y0, x1, y1)),
+        'budget': budget,
+        'quality': quality,
+    }
+
+def pack_crop_header(digest, rect) -> bytes:
+    return struct.pack(CROP_FORMAT, CROP_PREAMBLE, digest, *(round(v * ROI_SCALE) for v in rect))
+
+# (digest, rect, image bytes) of a crop transfer
+def unpack_crop(payload: bytes) -> tuple:
+    _, digest, *rect = struct.unpack(CROP_FORMAT, payload[:CROP_HEADER_SIZE])
+
+    return digest, tuple(v / ROI_SCALE for v in rect), payload[CROP_HEADER_SIZE:]
+
+# downscaled low quality JPEG of an image (path or bytes), sent first so the operator
+# can pick a region. JPEGs are decoded at reduced scale right away
+def encode_preview(original, max_size) -> bytes:
+    from PIL import Image
+
+    start = stages.clock()
+    image = Image.open(original if isinstance(original, str) else BytesIO(original))
+    image.draft('RGB', (max_size, max_size))
+    image = image.convert('RGB')
+    image.thumbnail((max_size, max_size))
+
+    preview = stream.encode_jpeg(image, PREVIEW_QUALITY)
+    stages.record('image_encode', start)
+
+    return preview
+
+def handle_telemetry(frame: bytes):
+    global last_position
+
+    try:
+        telemetry = unpack_telemetry(frame)
+    except struct.error:
+        print(f'[!] Invalid telemetry frame received: {frame}')
+        return
+
+    last_position = (telemetry['latitude'], telemetry['longitude'])
+    publish('telemetry', **telemetry)
+
+    if VERBOSE:
+        print(f"[*] Drone position: {telemetry['latitude']:.6f}, {telemetry['longitude']:.6f} at {telemetry['altitude']}m")
+
+# legacy text coordinates "lat,lng", superseded by telemetry frames
+def handle_coordinates(payload: bytes):
+    global last_position
+
+    try:
+        lat, lng = (float(x) for x in payload.decode().split(','))
+    except ValueError:
+        print(f'[!] Invalid coordinates received: {payload}')
+        return
+
+    last_position = (lat, lng)
+    publish('telemetry', latitude=lat, longitude=lng)
+    print(f'[*] Drone position: {lat:.6f}, {lng:.6f}')
+
+# jobs are (buffer, width, height, reception) tuples queued by launch_server, where
+# reception holds the transfer metadata recorded in the archive
+image_queue = queue.Queue()
+
+def process_received_image(buffer, width, height, received_at, show=True):
+    # PIL is loaded with the first image rather than when the server starts
+    from PIL import Image
+
+    # content-addressed names so repeated receptions never overwrite each other
+    digest = hashlib.sha256(buffer).hexdigest()[:16]
+    name = f"{received_at.strftime('%Y%m%d-%H%M%S')}_{digest}"
+    os.makedirs(RECEIVED_DIR, exist_ok=True)
+
+    # write under a unique temporary name first, identical images can be processed
+    # by two workers at once and must not clobber each other half-written
+    fd, tmp_path = tempfile.mkstemp(dir=RECEIVED_DIR, suffix='.part')
+    with os.fdopen(fd, 'wb') as f:
+        f.write(buffer)
+
+    # verify() leaves the image unusable, so it has to be reopened afterwards
+    try:
+        Image.open(BytesIO(buffer)).verify()
+        image = Image.open(BytesIO(buffer))
+        image.load()
+    except Exception as e:
+        raw_path = os.path.join(RECEIVED_DIR, f'{name}.bin')
+        os.replace(tmp_path, raw_path)
+        print(f'[-] Received image is corrupted ({e}), kept raw bytes in "{raw_path}"')
+        return raw_path
 
-def launch_server(port='COM4', configure=False):
+    if (image.width, image.height) != (width, height):
+        print(f'[!] Header announced {width}x{height} but decoded {image.width}x{image.height}')
+
+    image_path = os.path.join(RECEIVED_DIR, f'{name}.{(image.format or "bin").lower()}')
+    os.replace(tmp_path, image_path)
+
+    thumbnail = image.copy()
+    thumbnail.thumbnail(THUMBNAIL_SIZE)
+    thumbnail.convert('RGB').save(os.path.join(RECEIVED_DIR, f'{name}_thumb.jpg'), 'JPEG')
+
+    print(f'[+] Saved {len(buffer)} bytes to "{image_path}"')
+
+    if show:
+        image.show()
+
+    return image_path
+
+def image_worker(show=True, image_archive: archive.Archive = None):
+    while True:
+        buffer, width, height, reception = image_queue.get()
+        try:
+            received_at = datetime.fromtimestamp(reception['received_at'])
+            start = stages.clock()
+            path = process_received_image(buffer, width, height, received_at, show=show)
+            stages.record('image_decode', start)
+
+            if image_archive:
+                image_archive.add({
+                    **reception,
+                    'path': path,
+                    'sha256': hashlib.sha256(buffer).hexdigest(),
+                    'size': len(buffer),
+                    'width': width,
+                    'height': height,
+                })
+        except Exception as e:
+            print(f'[-] Failed to process received image: {e}')
+        finally:
+            image_queue.task_done()
+
+def start_image_workers(count=IMAGE_WORKERS, show=True, image_archive: archive.Archive = None):
+    for _ in range(count):
+        threading.Thread(target=image_worker, args=(show, image_archive), daemon=True).start()
+
+# jobs are (buffer, received_at) tuples of stream frames queued by launch_server, a
+# delta frame builds on the one before it so they all go through a single worker
+stream_queue = queue.Queue()
+
+def save_stream_frame(image) -> bytes:
+    data = stream.encode_jpeg(image, 85)
+
+    # replaced atomically so viewers polling the file never see half a frame
+    os.makedirs(RECEIVED_DIR, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=RECEIVED_DIR, suffix='.part')
+    with os.fdopen(fd, 'wb') as f:
+        f.write(data)
+    os.replace(tmp_path, os.path.join(RECEIVED_DIR, 'stream_latest.jpg'))
+
+    return data
+
+def stream_worker():
+    decoder = stream.FrameDecoder()
+    frame_rate = stream.FrameRate()
+
+    while True:
+        buffer, size, received_at = stream_queue.get()
+        try:
+            header, image = decoder.decode(buffer, size)
+            if image is None:
+                print(f"[!] Dropped delta frame {header['number']}, waiting for a keyframe")
+                continue
+
+            latency_s = received_at - header['captured_at']
+            fps = frame_rate.add(received_at)
+            kind = 'keyframe' if header['kind'] == stream.KEYFRAME else 'delta'
+
+            data = save_stream_frame(image)
+            publish('frame', number=header['number'], kind=kind, data=data, width=image.width, height=image.height,
+                    latency_s=latency_s, fps=fps)
+
+            print(f"[+] Frame {header['number']} ({kind}, {len(buffer)} bytes): latency {latency_s:.1f}s, {fps:.2f} fps")
+        except Exception as e:
+            print(f'[-] Failed to decode stream frame: {e}')
+        finally:
+            stream_queue.task_done()
+
+def start_stream_worker():
+    threading.Thread(target=stream_worker, daemon=True).start()
+
+# transmit a frame through the channel impairment model, if any, the way Drone.send does
+def send_frame(ser, data: bytes, channel: Channel = None):
+    deliveries = channel.apply(data) if channel else [(0, data)]
+
+    for delay, frame in deliveries:
+        time.sleep(delay)
+        # return AT TX confirmation
+        write_frame(ser, frame)
+
+# one modem of the drone or the ground, in multi-radio setups each sits on its own frequency
+class Radio:
+    def __init__(self, port, frequency=None):
+        self.port = port
+        self.frequency = frequency or RF_CONFIG['frequency']
+        self.serial: Serial = None
+
+        # bytes read past the last complete line, see read_any()
+        self.pending = b''
+
+        # ground: frames received since the last MISS report and the latest SNR
+        self.frames = 0
+        self.snr = None
+
+        # drone: frames waiting for this radio and its observed bytes/s, see Drone.stripe()
+        self.backlog = deque()
+        self.backlog_bytes = 0
+        self.throughput = None
+        # drone: impairment model of this radio's frames, see Drone.send()
+        self.channel: Channel = None
+
+    def record_signal(self, line: bytes):
+        if m := SIGNAL_PATTERN.search(line):
+            self.snr = int(m.group(2))
+
+    def record_throughput(self, size, seconds):
+        rate = size / max(seconds, 1e-6)
+        if self.throughput is None:
+            self.throughput = rate
+        else:
+            self.throughput += THROUGHPUT_SMOOTHING * (rate - self.throughput)
+
+    def health(self) -> tuple:
+        return self.frames, self.snr if self.snr is not None else -100
+
+    def __str__(self):
+        return f'{self.port}@{self.frequency}MHz'
+
+def make_radios(ports, frequencies=None) -> list:
+    ports = ports if isinstance(ports, (list, tuple)) else [ports]
+
+    return [Radio(port, frequency) for port, frequency in zip(ports, frequencies or radio_frequencies(len(ports)))]
+
+# next complete line from whichever radio has one, (None, b'') once timeout runs out.
+# A single radio blocks in read_until(), several wait on a selector over their ports.
+# Everything already waiting on every radio is drained before looking for a line so
+# a busy modem cannot starve the others.
+def read_any(radios, timeout) -> tuple:
+    if len(radios) == 1:
+        radio = radios[0]
+        if b'\n' not in radio.pending:
+            radio.pending += read_line(radio.serial, timeout)
+
+        return take_line(radio)
+
+    deadline = time.monotonic() + timeout
+    selector = selectors.DefaultSelector()
+    try:
+        for radio in radios:
+            selector.register(radio.serial, selectors.EVENT_READ)
+    except (OSError, ValueError):
+        # Windows serial ports cannot be selected, they are polled instead
+        selector.close()
+        selector = None
+
+    try:
+        while True:
+            for radio in radios:
+                if waiting := radio.serial.in_waiting:
+                    radio.pending += radio.serial.read(waiting)
+
+            for radio in radios:
+                if b'\n' in radio.pending:
+                    return take_line(radio)
+
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return None, b''
+
+            if selector:
+                selector.select(remaining)
+            else:
+                time.sleep(RX_POLL_INTERVAL)
+    finally:
+        if selector:
+            selector.close()
+
+# read_until() with its own timeout, the port keeps the one set for everything else
+def read_line(ser, timeout) -> bytes:
+    saved = ser.timeout
+    if saved != timeout:
+        ser.timeout = timeout
+
+    try:
+        return ser.read_until(b'\n')
+    finally:
+        if saved != timeout:
+            ser.timeout = saved
+
+# (radio, line) for the first complete line read from the radio, (None, b'') without one
+def take_line(radio: Radio) -> tuple:
+    if b'\n' not in radio.pending:
+        return None, b''
+
+    line, _, radio.pending = radio.pending.partition(b'\n')
+    return radio, line + b'\n'
+
+# sends only the commands that change something, see modem.py
+def configure_radio(radio: Radio) -> list:
+    try:
+        sent = modem.configure(radio.serial, get_config_commands(radio.frequency).split('\n'), radio.port)
+    except RuntimeError as e:
+        print(f"[!] Configuration error on {radio.port}: {e}")
+        exit(1)
+
+    for command, response in sent:
+        if VERBOSE:
+            print('>>>', command)
+        print('<<<', response)
+
+    return sent
+
+def send_roi_request(radio: Radio, request: dict, channel: Channel = None):
+    frame = pack_roi_request(request['digest'], request['rect'], request['budget'], request['quality'])
+    print(f"[*] Requesting region {', '.join(f'{v:.2f}' for v in request['rect'])} of image {request['digest'].hex()}")
+
+    send_frame(radio.serial, frame, channel)
+
+    # return back to receiving
+    radio.serial.write(f'{AT_RXLRPKT}\n'.encode())
+
+# receives one transfer, or returns early once stop() is true. With a merge.MergeClient
+# chunks are shared with other grounds and only the elected one sends MISS reports. A
+# relay.Relay gets the header and every chunk as they arrive and forwards them itself
+def launch_server(port='COM4', configure=False, channel: Channel = None, frequencies=None, stop=lambda: False, merger=None, relay=None):
     buffer = b''
     incoming_bytes = width = height = 0
     start_time = None
+    retransmissions = 0
+    # ground-assigned id tying together everything logged about this reception
+    session = os.urandom(4).hex()
+    # the same for every ground receiving the transfer, see merge.py
+    transfer = None
+
+    radios = make_radios(port, frequencies)
 
     try:
-        with Serial(port, baudrate=RF_CONFIG['baudrate'], bytesize=8, parity="N", stopbits=1, timeout=1) as ser_ground:
-            if ser_ground.is_open:
-                print(f"[+] Server connected to serial port ({port})")
+        with ExitStack() as stack:
+            for radio in radios:
+                radio.serial = stack.enter_context(open_serial(radio.port))
+                if radio.serial.is_open:
+                    print(f"[+] Server connected to serial port ({radio.port})")
 
             if configure:
                 print('[*] Sending configuration')
 
-                ground_config = get_config_commands()
-                if VERBOSE:
-                    print('>>>', '\n>>> '.join(ground_config.strip().split('\n')), end='\n\n')
-
-                for cmd in ground_config.split('\n'):
-                    ser_ground.write(f'{cmd}\n'.encode())
-
-                    # get AT config acknowledgement & check for errors
-                    r = ser_ground.readline()
-
-                    if b'ERROR' in r:
-                        print(f"[!] Configuration error: {r.decode()}")
-                        exit(1)
-                    if r:
-                        print('<<<', r.decode(), end='')
-
+                for radio in radios:
+                    configure_radio(radio)
 
-                print('[+] Server configured')
+                print(f'[+] Server configured ({", ".join(str(radio) for radio in radios)})')
 
-            ser_ground.write(f'{AT_RXLRPKT}\n'.encode())
-            r = ser_ground.readline()
+            for radio in radios:
+                radio.serial.write(f'{AT_RXLRPKT}\n'.encode())
+                r = radio.serial.readline()
 
-            print('<<<', r.decode(), end='')
+                print('<<<', r.decode(), end='')
             print('[*] Listening...')
 
+            # until the header arrives a short timeout keeps keyboard interrupts responsive
+            timeout = 1
+
             chunks_received = {}
             bytes_received = 0
             num_expected_chunks = None
             missing_chunks = set()
             while incoming_bytes == 0 or bytes_received < incoming_bytes:
-                # timeouts after 5s (or configured timeout)
-                if r := ser_ground.read_until(b'\r\n'):
-                    matches = re.finditer(r'RX "(\w+?)"', r.decode())
-                    chunk_bytes = bytes.fromhex(''.join([x.group(1) for x in matches]))
+                if stop():
+                    print('[*] Stopped listening')
+                    if merger and transfer:
+                        merger.done(transfer)
+                    return
+
+                # requests from dashboard viewers go out while no transfer is running
+                if incoming_bytes == 0 and event_bridge and not event_bridge.requests.empty():
+                    send_roi_request(radios[0], event_bridge.requests.get(), channel)
+
+                # chunks from every receiver are merged into the one reassembly
+                start = stages.clock()
+                radio, r = read_any(radios, timeout)
+                # waiting for the next transfer to start is not part of it
+                if incoming_bytes:
+                    stages.record('rx_wait' if r else 'rx_timeout', start)
+
+                # chunks other grounds received count as if we had heard them ourselves,
+                # picked up whenever the radios wake us. Between transfers this drops late
+                # chunks of the previous one
+                merged = merger.take(transfer) if merger else []
+                added = 0
+                for seq_number, chunk_bytes in merged:
+                    if seq_number < num_expected_chunks and seq_number not in chunks_received:
+                        chunks_received[seq_number] = chunk_bytes
+                        bytes_received += 2 + len(chunk_bytes)
+                        added += 1
+                        if relay:
+                            relay.add(seq_number, chunk_bytes)
+                        publish('chunk', session=session, seq=seq_number, data=chunk_bytes,
+                                received=bytes_received, total=incoming_bytes)
+                if added:
+                    print(f'[*] Merged {added} chunk/s from other grounds, {bytes_received} bytes')
+
+                if r:
+                    start = stages.clock()
+                    radio.record_signal(r)
+                    chunk_bytes = parse_rx(r)
+                    stages.record('rx_parse', start)
+
+                    # telemetry can be interleaved with image chunks at any time
+                    if chunk_bytes.startswith(TELEMETRY_PREAMBLE):
+                        handle_telemetry(chunk_bytes)
+                        continue
+                    if chunk_bytes.startswith(b'CORD'):
+                        handle_coordinates(chunk_bytes[4:])
+                        continue
+                    # reports of other grounds sharing the channel, see merge.py
+                    if chunk_bytes.startswith(b'MISS'):
+                        continue
 
                     # parse start of transmission header, skipping invalid ones
                     if incoming_bytes == 0 and chunk_bytes:
+                        if len(chunk_bytes) < PROTOCOL_HEADER_SIZE:
+                            print('Received short packet, dropping it.')
+                            continue
+
                         preamble, incoming_bytes, width, height = struct.unpack('>4sIII', chunk_bytes[:PROTOCOL_HEADER_SIZE])
 
                         # invalid preamble
@@ -185,16 +851,31 @@ def launch_server(port='COM4', configure=False):
 
                         # valid preamble, start receiving image
                         start_time = time.perf_counter_ns()
+                        stages.begin()
+                        transfer = hashlib.sha256(chunk_bytes).hexdigest()[:16]
                         print(preamble.decode())
+                        print(f'[*] Session {session}')
                         print(f'[*] Detected {width}x{height} image.')
                         print(f'[*] Receiving {incoming_bytes} bytes.')
                         chunk_bytes = chunk_bytes[PROTOCOL_HEADER_SIZE:]
-                        num_expected_chunks = -(-incoming_bytes // CHUNK_SIZE)
+                        num_expected_chunks = num_chunks(incoming_bytes)
+
+                        publish('session', session=session, width=width, height=height,
+                                bytes=incoming_bytes, chunks=num_expected_chunks, chunk_size=CHUNK_SIZE,
+                                stream=chunk_bytes[2:].startswith(stream.STREAM_PREAMBLE),
+                                crop=chunk_bytes[2:].startswith(CROP_PREAMBLE))
+
+                        if merger:
+                            merger.join(transfer)
+                        if relay:
+                            relay.start(incoming_bytes, width, height)
 
                         # use higher timeout from now on, we will request retransmission
                         # if this timeout gets hit, we dont use this initially because it
                         # blocks keyboard interrupts for example.
-                        ser_ground.timeout = RETRANSMISSION_TIMEOUT
+                        timeout = RETRANSMISSION_TIMEOUT
+                        for listener in radios:
+                            listener.serial.timeout = RETRANSMISSION_TIMEOUT
 
                     if chunk_bytes:
                         seq_number, chunk_bytes = *struct.unpack('>H', chunk_bytes[:2]), chunk_bytes[2:]
@@ -212,8 +893,16 @@ def launch_server(port='COM4', configure=False):
                         if seq_number not in chunks_received:
                             chunks_received[seq_number] = chunk_bytes
                             bytes_received += 2 + len(chunk_bytes)
+                            radio.frames += 1
 
                             print(f'[*] Received {bytes_received} bytes')
+                            publish('chunk', session=session, seq=seq_number, data=chunk_bytes,
+                                    received=bytes_received, total=incoming_bytes)
+
+                            if merger:
+                                merger.share(transfer, seq_number, chunk_bytes)
+                            if relay:
+                                relay.add(seq_number, chunk_bytes)
 
 
                     if VERBOSE:
@@ -221,69 +910,158 @@ def launch_server(port='COM4', configure=False):
                 
                 # if we reach here it means we transmitter sent all and we have missing chunks AKA we
                 # hit the RETRANSMISSION_TIMEOUT and should request missing chunks
-                elif incoming_bytes:
+                elif incoming_bytes and bytes_received < incoming_bytes:
                     missing_chunks = {seq for seq in range(num_expected_chunks) if seq not in chunks_received}
                     
                     print(f'[-] Timed out. Missing {len(missing_chunks)} chunk/s')
 
+                    # a single report for all grounds, the missing chunks are the ones
+                    # none of them has
+                    if merger and not merger.is_leader(transfer):
+                        print('[*] Leaving the report to the elected ground')
+                        continue
+
+                    start = stages.clock()
                     time.sleep(RX_SWITCH_DELAY)
+                    stages.record('rx_switch_delay', start)
 
 
                     if missing_chunks:
+                        retransmissions += 1
                         print(f'[*] Requesting retransmission of unreceived chunks: {missing_chunks}...')
+                        publish('missing', session=session, seqs=sorted(missing_chunks))
                     else:
                         print('[+] Successfully recovered missing chunks. Sending confirmation...')
 
-                    request_payload = b'MISS' + struct.pack('>H' + 'H' * len(missing_chunks), len(missing_chunks), *missing_chunks)  
+                    request_payload = pack_miss(sorted(missing_chunks))
                     print('[*] Request payload:', request_payload)
 
-                    ser_ground.write(f'AT+TEST=TXLRPKT, "{request_payload.hex()}"\n'.encode())
-                    # return AT TX confirmation
-                    r = ser_ground.read_until(b"TX DONE\r\n").decode()
+                    # the drone listens on all its radios, answer over the link that
+                    # delivered the most since the last report
+                    healthiest = max(radios, key=Radio.health)
+                    if len(radios) > 1:
+                        print(f'[*] Sending report over {healthiest}')
+
+                    send_frame(healthiest.serial, request_payload, channel)
 
                     # return back to receiving
-                    ser_ground.write(f'{AT_RXLRPKT}\n'.encode())
+                    healthiest.serial.write(f'{AT_RXLRPKT}\n'.encode())
+                    for radio in radios:
+                        radio.frames = 0
 
-            # acknowledge successfully receiving all packets
-            time.sleep(RX_SWITCH_DELAY)
+            if merger and not merger.is_leader(transfer):
+                print('[+] Complete, confirmation is left to the elected ground')
+            else:
+                # acknowledge successfully receiving all packets
+                start = stages.clock()
+                time.sleep(RX_SWITCH_DELAY)
+                stages.record('rx_switch_delay', start)
+
+                # an empty MISS report tells the drone everything arrived
+                healthiest = max(radios, key=Radio.health)
+                for i in range(CONFIRMATION_COUNT):
+                    send_frame(healthiest.serial, pack_miss([]), channel)
 
-            for i in range(3):
-                request_payload = b'MISS' + struct.pack('>H' + 'H' * len(missing_chunks), len(missing_chunks), *missing_chunks)  
-                ser_ground.write(f'AT+TEST=TXLRPKT, "{request_payload.hex()}"\n'.encode())
-                # return AT TX confirmation
-                ser_ground.read_until(b"TX DONE\r\n").decode()
-                time.sleep(1)
-            print('[+] Confirmation sent (3x)')
+                    start = stages.clock()
+                    time.sleep(CONFIRMATION_INTERVAL)
+                    stages.record('confirmation_interval', start)
+                print(f'[+] Confirmation sent ({CONFIRMATION_COUNT}x)')
+
+            # leaving only now keeps another ground from taking over and confirming too
+            if merger:
+                merger.done(transfer)
 
             duration_ns = time.perf_counter_ns() - start_time
             duration_s = duration_ns / 10**9 
 
             # sort and assemble buffer from received chunks
-            chunks_received = dict(sorted(chunks_received.items()))
-            buffer = b''.join(chunks_received.values())
+            start = stages.clock()
+            buffer = assemble(chunks_received)
+            stages.record('assemble', start)
 
             print(f'[*] Received {bytes_received} bytes over {len(chunks_received)} segments in {duration_s:.3f}s ({len(buffer)/duration_s:,.0f}) bytes/s')
 
-            img_display = BytesIO(buffer)
-            with open('bytes.bin', 'wb') as f:
-                f.write(buffer)
-                # load and view the image using pillow
-                image = Image.open(img_display)
-                image.show()
-
-            print(f'[+] Saved {incoming_bytes} bytes to "bytes.bin"\n-----\n') 
+            # decoding on the image workers shows up in the report of the next transfer
+            if report := stages.end(f'session {session}'):
+                print(profiler.format_report(report))
+
+            # the relay has been forwarding all along, the image is not ours to keep
+            if relay:
+                return
+
+            digest = image_digest(buffer)
+            received_digests[digest] = session
+            if len(received_digests) > RECEIVED_DIGESTS:
+                received_digests.pop(next(iter(received_digests)))
+
+            # region of interest crops are linked to the session of the image they came from
+            parent = None
+            if buffer.startswith(CROP_PREAMBLE):
+                parent_digest, rect, buffer = unpack_crop(buffer)
+                parent = received_digests.get(parent_digest, parent_digest.hex())
+                print(f'[*] Region of interest {", ".join(f"{v:.2f}" for v in rect)} of {parent}')
+
+            # stream frames are shown rather than archived, see stream_worker()
+            if buffer.startswith(stream.STREAM_PREAMBLE):
+                stream_queue.put((buffer, (width, height), time.time()))
+                print(f'[*] Queued {len(buffer)} bytes stream frame\n-----\n')
+                return
+
+            # decoding, thumbnailing and saving happen on the image workers so we can
+            # return to listening for the next transmission straight away
+            image_queue.put((buffer, width, height, {
+                'received_at': time.time(),
+                'session': session,
+                'frequency': RF_CONFIG['frequency'],
+                'spreading_factor': RF_CONFIG['spreading_factor'],
+                'bandwidth': RF_CONFIG['bandwidth'],
+                'duration_s': duration_s,
+                'retransmissions': retransmissions,
+                'latitude': last_position[0] if last_position else None,
+                'longitude': last_position[1] if last_position else None,
+                'parent': parent,
+            }))
+            publish('image', session=session, data=buffer, width=width, height=height,
+                    duration_s=duration_s, retransmissions=retransmissions, digest=digest.hex(), parent=parent)
+
+            print(f'[*] Queued {len(buffer)} bytes for decoding\n-----\n')
 
     except FileNotFoundError as e:
         print(e)
-        print(f"[-] Connection to {port} failed.")
+        print(f"[-] Connection to {', '.join(radio.port for radio in radios)} failed.")
 
 
 # Drone serial wrapper
 class Drone:
-    def __init__(self, port=None, configure=False):
-        self.port = port
+    def __init__(self, port=None, configure=False, telemetry_interval=TELEMETRY_INTERVAL, channel: Channel = None, frequencies=None):
+        # several ports stripe every transfer across radios, the first one is the primary
+        self.radios = make_radios(port, frequencies)
+        self.port = self.radios[0].port
         self.serial: Serial = None
 
+        # guards the radio backlogs while a transfer is being striped
+        self.radios_cond = threading.Condition()
+        self.striped = True
+
+        # optional impairment model applied to every outgoing frame, see channel.py. The
+        # radio workers send at the same time, so each radio draws from its own copy
+        self.channel = channel
+        for index, radio in enumerate(self.radios):
+            radio.channel = channel.fork(index) if channel and len(self.radios) > 1 else channel
+
+        # latest pack_telemetry() keyword arguments, updated by whatever reads the GPS
+        self.telemetry: dict = None
+        self.telemetry_interval = telemetry_interval
+        self.last_telemetry = 0
+        self.telemetry_lock = threading.Lock()
+
+        # digest of the payload sent -> (original image bytes, rect of the original it
+        # covers), see handle_roi()
+        self.originals = {}
+
+        # held by whoever is using the radios, a transfer or serve_requests()
+        self.lock = threading.Lock()
+
         if self.connect():
             # print(f"[*] Clearing buffer: {self.serial.read_all()}")
             if configure:
@@ -292,406 +1070,582 @@ class Drone:
 
     def configure_tx(self):
         output = ""
-        drone_config = get_config_commands()
-        for line in drone_config.split("\n"):
-            self.serial.write(f'{line}\n'.encode())
-            r = self.serial.readline().decode()
-            if r:
-                output += f'<<< {r}'
+        for radio in self.radios:
+            try:
+                sent = modem.configure(radio.serial, get_config_commands(radio.frequency).split("\n"), radio.port)
+            except RuntimeError as e:
+                output += f'[!] Configuration error on {radio.port}: {e}\n'
+                continue
+
+            for _, response in sent:
+                output += f'<<< {response}\n'
+            if not sent:
+                output += f'[*] {radio.port} already configured\n'
 
         return output
 
     def connect(self) -> bool:
-        try:
-            self.serial = Serial(
-                port=self.port,
-                baudrate=RF_CONFIG['baudrate'],
-                bytesize=8,
-                stopbits=1,
-                parity="N",
-                timeout=1,
-            )
-
-            return self.serial.is_open
-
-        except FileNotFoundError:
-            print(f"[-] Connection to {self.port} failed.")
-            return False
-        except Exception as e:
-            print(f"[-] Connection to {self.port} failed: {e}")
-            return False
+        for radio in self.radios:
+            try:
+                radio.serial = open_serial(radio.port)
 
-    def send(self, data: bytes, recv=True) -> bytes:
-        if not self.serial or not self.serial.is_open:
-            print("[-] Send failed, Serial connection is not established.")
-
-        self.serial.write(f'AT+TEST=TXLRPKT, "{data.hex()}"\n'.encode())
-
-        # return AT confirmation, this may mess up things if you are not expecting send to recv on your behalf
-        if recv:
-            return self.serial.read_until(b"TX DONE\r\n").decode()
-
-    def recv(self) -> bytes:
-        r = self.serial.read_until(b'\r\n')
+            except FileNotFoundError:
+                print(f"[-] Connection to {radio.port} failed.")
+                return False
+            except Exception as e:
+                print(f"[-] Connection to {radio.port} failed: {e}")
+                return False
 
-        matches = re.finditer(r'RX "(\w+?)"', r.decode())
-        payload = bytes.fromhex(''.join([x.group(1) for x in matches]))
+        self.serial = self.radios[0].serial
 
-        return payload
+        return all(radio.serial.is_open for radio in self.radios)
 
+    def send(self, data: bytes, recv=True, radio: Radio = None) -> bytes:
+        if not self.channel:
+            return self.send_frame(data, recv, radio)
 
-class DroneGUI:
-    def __init__(self, root, port, configure, auto):
-        self.root = root
-        self.root.title("STM32WLE5JC Drone")
-        self.root.geometry("720x640")
-        self.args_port = port
-        self.configure = configure
-        self.cancel = False
+        # a lost frame is never handed to the modem, duplicates are sent back to back
+        r = ''
+        for delay, frame in (radio or self.radios[0]).channel.apply(data):
+            time.sleep(delay)
+            r = self.send_frame(frame, recv, radio)
 
-        self.drone = None
+        return r
 
-        self.create_layout()
-        if auto:
-            threading.Thread(target=self.connect_serial).start()
-
-    def create_layout(self):
-        self.controls_frame = tk.Frame(self.root, height=100)
-        self.controls_frame.pack(fill="x", side="bottom")
-
-        self.port_frame = tk.Frame(self.controls_frame)
-        self.port_frame.pack(side="left", padx=10, pady=10)
-
-        self.port_var = tk.StringVar(value=self.args_port)
-        self.port_dropdown = tk.OptionMenu(self.port_frame, self.port_var, self.args_port)
-        self.port_dropdown.pack(side="left")
-
-        self.refresh_button = tk.Button(
-            self.port_frame, text="↻", command=self.refresh_ports, width=2
-        )
-        self.refresh_ports()
-        
-        self.refresh_button.pack(side="left", padx=2)
-
-        self.image_frame = tk.Frame(
-            self.root, height=300, bg="lightgray", relief="ridge"
-        )
-        self.image_frame.pack(fill="both", expand=True)
-        self.image_canvas = tk.Canvas(self.image_frame, bg="lightgray")
-        self.image_canvas.pack(fill="both", expand=True)
-
-        self.choose_button = tk.Button(
-            self.controls_frame, text="Choose Image", command=self.choose_image
-        )
-        self.choose_button.pack(side="left", padx=10, pady=10)
-
-        self.connect_button = tk.Button(
-            self.controls_frame, text="Connect Serial", command=lambda: threading.Thread(target=self.connect_serial).start()
-        )
-        self.connect_button.pack(side="left", padx=10, pady=10)
-
-        self.transmit_button = tk.Button(
-            self.controls_frame,
-            text="Transmit Image",
-            state=tk.DISABLED,
-            command=lambda: threading.Thread(target=self.transmit_image).start()
-        )
-        self.transmit_button.pack(side="left", padx=10, pady=10)
-
-        self.cancel_button = tk.Button(
-            self.controls_frame,
-            text="Cancel Tranmission",
-            state=tk.DISABLED,
-            command=self.cancel_transmission,
-        )
-        self.cancel_button.pack(side="left", padx=10, pady=10)
-
-        self.status_panel = tk.Frame(self.controls_frame)
-        self.status_panel.pack(side="right", padx=5, pady=5)
+    def send_frame(self, data: bytes, recv=True, radio: Radio = None) -> bytes:
+        ser = radio.serial if radio else self.serial
+        if not ser or not ser.is_open:
+            print("[-] Send failed, Serial connection is not established.")
 
-        self.connection_panel = tk.Frame(self.status_panel)
-        self.connection_panel.pack(side="bottom", padx=0, pady=0)
+        # return AT confirmation, this may mess up things if you are not expecting send to recv on your behalf
+        r = write_frame(ser, data, recv)
+        if recv:
+            return r.decode()
 
-        self.connection_indicator = tk.Canvas(
-            self.connection_panel,
-            width=20,
-            height=20,
-            bg="#f0f0f0",
-            highlightthickness=0,
-        )
-        self.connection_indicator.pack(side="left", anchor="w", padx=0)
+    # called between image chunks, telemetry goes out first whenever it is due so the
+    # position stays fresh during long transfers
+    def send_telemetry_if_due(self, radio: Radio = None):
+        if not self.telemetry or not self.telemetry_interval:
+            return
 
-        self.connection_indicator.create_oval(2, 2, 18, 18, fill="red", outline="")
+        # every radio worker checks, only one of them gets to send
+        with self.telemetry_lock:
+            now = time.monotonic()
+            if now - self.last_telemetry < self.telemetry_interval:
+                return
 
-        self.label_connected = tk.Label(
-            self.connection_panel, text="Disconnected", anchor="w"
-        )
-        self.label_connected.pack(side="right", anchor="w")
+            self.last_telemetry = now
 
-        self.label_loaded = tk.Label(
-            self.status_panel, text="Image: Not Loaded", anchor="w"
-        )
-        self.label_loaded.pack(side="right", anchor="w")
-
-        self.text_frame = tk.Frame(self.root)
-        self.text_frame.pack(fill="both", expand=True, padx=10, pady=10)
-
-        self.scrollbar = tk.Scrollbar(self.text_frame)
-        self.scrollbar.pack(side="right", fill="y")
-
-        global status_text_box
-        # global status_text_box, write to it using print
-        status_text_box = tk.Text(
-            self.text_frame,
-            wrap="word",
-            height=8,
-            width=50,
-            yscrollcommand=self.scrollbar.set,
-        )
-        status_text_box.pack(side="left", fill="both", expand=True)
+        self.send(pack_telemetry(**self.telemetry), radio=radio)
 
-        self.scrollbar.config(command=status_text_box.yview)
+    # sends frames from one radio's backlog until stripe() has queued everything
+    def radio_worker(self, radio: Radio):
+        while True:
+            with self.radios_cond:
+                while not radio.backlog and not self.striped:
+                    self.radios_cond.wait()
 
-    def choose_image(self):
-        self.file_path = filedialog.askopenfilename(
-            title="Select an Image",
-            filetypes=[("Image Files", "*.png;*.jpg;*.jpeg;*.bmp;*.gif")],
-        )
-        if self.file_path:
-            self.display_image(self.file_path)
+                if not radio.backlog:
+                    return
 
-    def cancel_transmission(self):
-        self.cancel = True
+                frame = radio.backlog[0]
 
-    def refresh_ports(self):
-        ports = scan_com_ports()
-        menu = self.port_dropdown["menu"]
-        menu.delete(0, "end")
+            self.send_telemetry_if_due(radio)
 
-        for port, description in ports:
-            menu.add_command(
-                label=f"{port}: {description}",
-                command=lambda p=port: self.port_var.set(p),
-            )
+            started = time.perf_counter()
+            r = self.send(frame, radio=radio)
+            radio.record_throughput(len(frame), time.perf_counter() - started)
 
-        if ports:
-            found_port = [p for p in ports if p[0] == self.args_port]
+            if VERBOSE:
+                print(f">>> [{radio}] {frame.hex()}")
+                print(r)
 
-            if found_port:
-                self.port_var.set(found_port[0][0])
-            else:
-                self.port_var.set(ports[0][0])
+            with self.radios_cond:
+                radio.backlog.popleft()
+                radio.backlog_bytes -= len(frame)
+                self.radios_cond.notify_all()
+
+    # Spreads frames over the radios, each frame goes to the radio with room in its
+    # queue that is expected to get it on air first given its backlog and observed
+    # throughput. Returns how many frames were queued before cancel() stopped it.
+    def stripe(self, frames, cancel=lambda: False) -> int:
+        self.striped = False
+        workers = [threading.Thread(target=self.radio_worker, args=(radio,), daemon=True) for radio in self.radios]
+        for worker in workers:
+            worker.start()
+
+        queued = 0
+        for frame in frames:
+            if cancel():
+                break
 
-    def display_image(self, path):
-        image = Image.open(path)
+            with self.radios_cond:
+                start = stages.clock()
+                while not (ready := [radio for radio in self.radios if len(radio.backlog) < RADIO_QUEUE_DEPTH]):
+                    self.radios_cond.wait()
+                stages.record('stripe_wait', start)
 
-        canvas_width = self.image_canvas.winfo_width()
-        canvas_height = self.image_canvas.winfo_height()
+                # radios that have not sent anything yet are assumed to be average
+                known = [radio.throughput for radio in self.radios if radio.throughput]
+                default = sum(known) / len(known) if known else 1
 
-        if canvas_width == 1 and canvas_height == 1:
-            self.root.update_idletasks()
-            canvas_width = self.image_canvas.winfo_width()
-            canvas_height = self.image_canvas.winfo_height()
+                radio = min(ready, key=lambda r: (r.backlog_bytes + len(frame)) / (r.throughput or default))
+                radio.backlog.append(frame)
+                radio.backlog_bytes += len(frame)
+                self.radios_cond.notify_all()
 
-        image_ratio = image.width / image.height
-        canvas_ratio = canvas_width / canvas_height
+            queued += 1
 
-        if image_ratio > canvas_ratio:
-            new_width = canvas_width
-            new_height = int(canvas_width / image_ratio)
-        else:
-            new_height = canvas_height
-            new_width = int(canvas_height * image_ratio)
+        with self.radios_cond:
+            self.striped = True
+            self.radios_cond.notify_all()
 
-        resized_image = image.resize((new_width, new_height), Image.Resampling.LANCZOS)
+        for worker in workers:
+            worker.join()
 
-        self.image = image
-        self.tk_image = ImageTk.PhotoImage(resized_image)
-        self.label_loaded.config(text=os.path.basename(path))
-        self.image_canvas.delete("all")
-        self.image_canvas.create_image(
-            canvas_width / 2, canvas_height / 2, image=self.tk_image, anchor="center"
-        )
+        return queued
 
-    def connect_serial(self):
-        print(f"[*] Connecting to drone on {self.port_var.get()} serial port.")
+    def transmit_image(self, payload, width=None, height=None, cancel=lambda: False) -> dict:
+        with self.lock:
+            return self.send_image(payload, width, height, cancel)
 
-        self.drone = Drone(port=self.port_var.get(), configure=self.configure)
+    # sends one image and serves the ground's MISS reports until it confirms reception,
+    # cancel is polled between chunks of the first pass. The payload is bytes or a
+    # ChunkSource, dimensions default to the ones in the image header
+    def send_image(self, payload, width=None, height=None, cancel=lambda: False) -> dict:
+        source = payload if isinstance(payload, sources.ChunkSource) else sources.BufferSource(payload, CHUNK_SIZE)
+        if width is None or height is None:
+            width, height = source.dimensions()
 
-        if self.drone.serial.is_open:
-            self.transmit_button.config(state=tk.NORMAL)
-            self.label_connected.config(text="Connected")
-            self.connect_button.config(state=tk.DISABLED)
-            self.connection_indicator.create_oval(
-                2, 2, 18, 18, fill="green", outline=""
-            )
-            print("[*] Connected. Ready to transmit.")
-
-    def transmit_image(self):
-        self.cancel_button.config(state=tk.NORMAL)
-        self.cancel = False
-
-        img_bytes = BytesIO()
-        # img_bytes = self.image.convert("RGB").tobytes()
-        # using ByteIO to trick pillow into saving the image in memory
-        with open(self.file_path, "rb") as img_file:
-            # image bytes without sequence numbers = bytes_to_send - 2 * num_image_chunks
-            # as seen later
-            img_bytes = img_file.read()
-
-        num_image_chunks = -(-len(img_bytes) // CHUNK_SIZE)
+        num_image_chunks = len(source)
         # consider chunk headers (2 bytes for sequence number currently)
-        bytes_to_send = len(img_bytes) + 2 * num_image_chunks # bytes
-
-        transmit_header = struct.pack(
-            '>4sIII',
-            b'LORA',
-            bytes_to_send,
-            self.image.width,
-            self.image.height,
-        )
+        bytes_to_send = source.size + 2 * num_image_chunks # bytes
+
+        transmit_header = pack_header(bytes_to_send, width, height)
 
         # send in 200 byte chunks (max RF frame is 255)
         total_bytes = PROTOCOL_HEADER_SIZE + bytes_to_send
 
         print(f'[*] Transmitting {total_bytes} bytes')
         start_time = time.perf_counter_ns()
+        stages.begin()
 
-        # first chunk contains header for the entire transmission
-        for i in range(0, len(img_bytes), CHUNK_SIZE):
-            if self.cancel:
-                print('[!] Transmission canceled')
-                break
-
-            chunk = b''
-            # first chunk is special
-            if i == 0:
-                chunk += transmit_header
+        # give each chunk a sequence number, sequence number is normalized
+        # i.e. 0, 1, 2, ... N-1 instead of 0, 200, 400, (N-1) * chunk_size.
+        # Chunks are packed as they go out, only the frames on air are ever in memory
+        def chunk(seq) -> bytes:
+            start = stages.clock()
+            frame = pack_chunk(seq, source.chunk(seq))
+            stages.record('chunk_pack', start)
 
-            # give each chunk a sequence number, sequence number is normalized
-            # i.e. 0, 1, 2, ... N-1 instead of 0, 200, 400, (N-1) * chunk_size
-            chunk += struct.pack('>H', int(i / CHUNK_SIZE)) + img_bytes[i : i + CHUNK_SIZE]
+            return frame
 
-            # stochastically fail packets to simulate real life
-            if i != 0 and random() < 0.3:
-                continue
+        canceled_at = None
+        if cancel():
+            canceled_at = 0
+        else:
+            # first chunk contains header for the entire transmission, it goes out
+            # before striping starts so the ground knows the transfer by the time
+            # chunks show up on its other receivers
+            first = transmit_header + chunk(0)
+            self.send_telemetry_if_due()
 
-            # fire off
-            r = self.drone.send(chunk)
-            
-            # provide extra redundancy to the preamble chunks
-            if i == 0:
-                r = self.drone.send(chunk)
-                r = self.drone.send(chunk)
+            # provide extra redundancy to the preamble chunks, spread over all radios
+            for k in range(max(3, len(self.radios))):
+                r = self.send(first, radio=self.radios[k % len(self.radios)])
 
             if VERBOSE:
-                print(f">>> {img_bytes[i : i + CHUNK_SIZE].hex()}")
+                print(f">>> {first.hex()}")
                 print(r)
 
+            queued = 1 + self.stripe((chunk(seq) for seq in source.sequence() if seq), cancel)
+            if queued < num_image_chunks:
+                canceled_at = queued * CHUNK_SIZE
+
+        if canceled_at is not None:
+            print('[!] Transmission canceled')
+
         # primary transmission is over, ensure all chunks has been received
         duration_ns = time.perf_counter_ns() - start_time
-        duration_s = duration_ns / 10**9 
+        duration_s = duration_ns / 10**9
         print(f'[*] Completed first transmission in {duration_s:.3f}s ({total_bytes/duration_s:,.0f} bytes/s). Waiting for ground MISS report')
 
         # increase timeout during retransmission phase
-        self.drone.serial.timeout = RETRANSMISSION_TIMEOUT // 2
+        for radio in self.radios:
+            radio.serial.timeout = RETRANSMISSION_TIMEOUT / 2
 
+        retransmission_rounds = retransmitted_chunks = 0
         num_missing = -1
+        last_heard = time.monotonic()
         while num_missing:
-            r = b''
-            # enable rx, must be done here because we transmit after
-            self.drone.serial.write(f'{AT_RXLRPKT}\n'.encode())
-            r += self.drone.serial.read_until(b'\r\n')
-            r += self.drone.serial.read_until(b'RX ')
-            r += self.drone.serial.readline()
+            # enable rx, must be done here because we transmit after. The ground may
+            # answer on any of the radios
+            for radio in self.radios:
+                radio.serial.write(f'{AT_RXLRPKT}\n'.encode())
 
-            if VERBOSE:
-                print('<<<', r.decode())
+            data = b''
+            deadline = time.monotonic() + RETRANSMISSION_TIMEOUT / 2
+            while not data and time.monotonic() < deadline:
+                start = stages.clock()
+                _, r = read_any(self.radios, deadline - time.monotonic())
+                stages.record('report_wait' if r else 'report_timeout', start)
 
-            # why cant we do this to drain stream and get RX payload either way
-            # while not (matches := re.finditer(r'RX "(\w+?)"', self.drone.serial.readline().decode())):
+                start = stages.clock()
+                data = parse_rx(r)
+                stages.record('rx_parse', start)
 
-            matches = re.finditer(r'RX "(\w+?)"', r.decode())
-            data = bytes.fromhex(''.join([x.group(1) for x in matches]))
+                if VERBOSE and r:
+                    print('<<<', r.decode())
 
             if not data:
                 print('.', end='', flush=True)
+
+                # once it knows about the transfer the ground reports at least every
+                # RETRANSMISSION_TIMEOUT, silence for longer means the header never made
+                # it (e.g. the ground was still busy with the previous transfer)
+                if time.monotonic() - last_heard > 2 * RETRANSMISSION_TIMEOUT:
+                    print('\n[!] No report from the ground, resending header')
+                    self.send(transmit_header + chunk(0))
+                    last_heard = time.monotonic()
                 continue
-            
+
             print()
+            last_heard = time.monotonic()
 
             if not data.startswith(b'MISS'):
                 print(r)
                 continue
 
-            header_MISS, header_COUNT, header_SEQS = data[:4], data[4:6], data[6:]
-
-            num_missing, = struct.unpack('>H', header_COUNT)
+            missing_chunk_seqs = unpack_miss(data)
+            num_missing = len(missing_chunk_seqs)
             print(f'[*] Ground reported missing {num_missing} chunk/s')
 
             if num_missing == 0:
                 break
 
-            missing_chunk_seqs = struct.unpack('>' + 'H' * num_missing, header_SEQS)
+            retransmission_rounds += 1
 
             # wait before resending
+            start = stages.clock()
             time.sleep(RX_SWITCH_DELAY)
+            stages.record('rx_switch_delay', start)
 
             print(f'[*] Resending: {missing_chunk_seqs}')
 
-            for seq in missing_chunk_seqs:
-                print(f'[*] Sending {seq}')
-                chunk_index = seq * CHUNK_SIZE
-                r = self.drone.send(struct.pack('>H', seq) + img_bytes[chunk_index:chunk_index+CHUNK_SIZE])
+            retransmitted_chunks += self.stripe(chunk(seq) for seq in missing_chunk_seqs if seq < num_image_chunks)
 
         # reset timeout
-        self.drone.serial.timeout = 1
+        for radio in self.radios:
+            radio.serial.timeout = 1
 
-        # report stats and reset GUI state
-        total_duration_ns = time.perf_counter_ns() - duration_ns
-        total_duration_s = total_duration_ns / 10**9 
-        '[+] Retransmission successful'
+        # report stats
+        total_duration_ns = time.perf_counter_ns() - start_time
+        total_duration_s = total_duration_ns / 10**9
 
-        if self.cancel:
-            print('[!] Canceled at {i:,} bytes after {total_duration_s:.3f}')
+        if canceled_at is not None:
+            print(f'[!] Canceled at {canceled_at:,} bytes after {total_duration_s:.3f}s')
         else:
             print(
-                    f"[+] Sent {total_bytes} bytes over {num_image_chunks} packets in {total_duration_s:.3f}s ({total_bytes/duration_s:,.0f} bytes/s)"
+                    f"[+] Sent {total_bytes} bytes over {num_image_chunks} packets in {total_duration_s:.3f}s ({total_bytes/total_duration_s:,.0f} bytes/s)"
             )
-        self.cancel_button.config(state=tk.DISABLED)
 
-def launch_client(port, configure, auto):
-    root = tk.Tk()
-    DroneGUI(root, port, configure, auto)
+        if report := stages.end(f'transfer of {total_bytes} bytes'):
+            print(profiler.format_report(report))
+
+        return {
+            'bytes': total_bytes,
+            'chunks': num_image_chunks,
+            'first_pass_s': duration_s,
+            'duration_s': total_duration_s,
+            'retransmission_rounds': retransmission_rounds,
+            'retransmitted_chunks': retransmitted_chunks,
+            'canceled': canceled_at is not None,
+        }
+
+    def recv(self) -> bytes:
+        r = self.serial.read_until(b'\r\n')
+
+        return parse_rx(r)
+
+    # keep the original (path or bytes) behind a payload so regions of it can be
+    # requested later
+    def retain(self, payload, original, rect=(0, 0, 1, 1)):
+        if isinstance(payload, sources.ChunkSource):
+            payload = payload.open()
+
+        self.originals[image_digest(payload)] = (original, rect)
+        if len(self.originals) > RETAINED_ORIGINALS:
+            self.originals.pop(next(iter(self.originals)))
+
+    # listens for ground requests in between transfers until stop() is true
+    def serve_requests(self, stop=lambda: False):
+        for radio in self.radios:
+            radio.serial.write(f'{AT_RXLRPKT}\n'.encode())
+
+        while not stop():
+            with self.lock:
+                _, r = read_any(self.radios, 1)
+
+            data = parse_rx(r)
+            if data.startswith(ROI_PREAMBLE):
+                self.handle_roi(data)
+
+    # crops the requested region out of the retained original and sends it as a new transfer
+    def handle_roi(self, frame: bytes):
+        try:
+            request = unpack_roi_request(frame)
+        except struct.error:
+            print(f'[!] Invalid region of interest request received: {frame}')
+            return
+
+        if request['digest'] not in self.originals:
+            print(f"[-] Region of interest requested for unknown image {request['digest'].hex()}")
+            return
+
+        original, (bx0, by0, bx1, by1) = self.originals[request['digest']]
+        x0, y0, x1, y1 = request['rect']
+
+        # the request is relative to what the ground saw, which may itself be a crop
+        rect = (bx0 + x0 * (bx1 - bx0), by0 + y0 * (by1 - by0), bx0 + x1 * (bx1 - bx0), by0 + y1 * (by1 - by0))
+
+        from PIL import Image
+
+        start = stages.clock()
+        image = Image.open(original if isinstance(original, str) else BytesIO(original)).convert('RGB')
+        left, top = int(rect[0] * image.width), int(rect[1] * image.height)
+        box = (left, top, max(left + 1, round(rect[2] * image.width)), max(top + 1, round(rect[3] * image.height)))
+        crop = image.crop(box)
+
+        if request['budget']:
+            data = stream.encode_to_budget(crop, request['budget'] - CROP_HEADER_SIZE, request['quality'] or stream.MAX_QUALITY)
+        else:
+            data = stream.encode_jpeg(crop, request['quality'] or ROI_QUALITY)
+        stages.record('image_encode', start)
+
+        payload = pack_crop_header(request['digest'], request['rect']) + data
+        self.retain(payload, original, rect)
+
+        print(f'[*] Sending {crop.width}x{crop.height} region of interest ({len(payload)} bytes)')
 
-    root.mainloop()
+        # give the ground time to switch back to receiving
+        start = stages.clock()
+        time.sleep(RX_SWITCH_DELAY)
+        stages.record('rx_switch_delay', start)
+        self.transmit_image(payload, crop.width, crop.height)
+
+
+def launch_archive(args):
+    try:
+        rows = archive.query(
+            args.db,
+            session=args.session,
+            since=args.since.timestamp() if args.since else None,
+            until=args.until.timestamp() if args.until else None,
+            limit=args.limit,
+        )
+    except ValueError as e:
+        print(f'[-] {e}')
+        exit(1)
+
+    if args.action == 'export':
+        index_path = archive.export(rows, args.out)
+        print(f'[+] Exported {len(rows)} entries to "{index_path}"')
+        return
+
+    print(f'{"id":>5}  {"received":19}  {"session":8}  {"size":>7}  {"dims":>9}  {"SF":>2}  {"BW":>3}  {"time":>8}  {"retx":>4}  path')
+    for row in rows:
+        received = datetime.fromtimestamp(row['received_at']).strftime('%Y-%m-%d %H:%M:%S')
+        dims = f"{row['width']}x{row['height']}"
+        print(f"{row['id']:>5}  {received:19}  {row['session']:8}  {row['size']:>7}  {dims:>9}  {row['spreading_factor']:>2}  {row['bandwidth']:>3}  {row['duration_s']:>7.1f}s  {row['retransmissions']:>4}  {row['path']}")
+
+def launch_client(port, configure, auto, position=None, telemetry_interval=TELEMETRY_INTERVAL, channel=None, frequencies=None, preview=None):
+    # Tk is only loaded for the GUI, the server and headless client run without it
+    import gui
+
+    gui.launch_client(port, configure, auto, position, telemetry_interval, channel, frequencies, preview)
+
+# headless client streaming frames from a directory or camera as they are captured
+def launch_stream(port, configure, source, fps=stream.STREAM_FPS, size=stream.STREAM_SIZE, position=None,
+                  telemetry_interval=TELEMETRY_INTERVAL, channel=None, frequencies=None):
+    try:
+        frames = stream.frame_source(source, size)
+    except ValueError as e:
+        print(f'[-] {e}')
+        return
+
+    drone = Drone(port, configure, telemetry_interval, channel, frequencies)
+    if not drone.serial or not drone.serial.is_open:
+        return
+
+    if position:
+        latitude, longitude, altitude = position
+        drone.telemetry = {'latitude': latitude, 'longitude': longitude, 'altitude': altitude}
+
+    capture = stream.Capture(frames, fps).start()
+    encoder = stream.FrameEncoder()
+    frame_rate = stream.FrameRate()
+    link_rate = stream.INITIAL_LINK_RATE
+
+    # the ground keeps repeating its confirmation after we heard the first one and then
+    # reopens its modem, the next frame has to wait that out
+    guard_s = CONFIRMATION_COUNT * CONFIRMATION_INTERVAL + stream.RESYNC_TIME
+    confirmed_at = None
+
+    print(f'[*] Streaming {size[0]}x{size[1]} frames from {source} at {fps:g} fps')
+
+    while True:
+        # the guard runs from the ground's confirmation, the frame is taken once it is
+        # over so it is the freshest one
+        if confirmed_at:
+            time.sleep(max(0, confirmed_at + guard_s - time.monotonic()))
+
+        if not (frame := capture.take()):
+            break
+        captured_at, image = frame
+
+        # a share of what the link moves in one capture interval, when that is below the
+        # floor frames go out late and the stale ones in between are dropped
+        budget = int(link_rate / fps * stream.BUDGET_FRACTION)
+        if budget < stream.MIN_BUDGET:
+            print(f'[!] Link rate {link_rate:,.0f} bytes/s allows {budget} bytes per frame, sending {stream.MIN_BUDGET}')
+            budget = stream.MIN_BUDGET
+
+        start = stages.clock()
+        payload = encoder.encode(image, captured_at, budget)
+        stages.record('image_encode', start)
+
+        if payload is None:
+            print(f'[!] Frame does not fit {budget} bytes even at {stream.MIN_SCALE:g}x size, skipped')
+            continue
+        if encoder.scale < 1:
+            print(f'[!] Frame does not fit {budget} bytes at full size, sending it at {encoder.scale:g}x')
+
+        stats = drone.transmit_image(payload, image.width, image.height)
+        confirmed_at = time.monotonic()
+        link_rate += THROUGHPUT_SMOOTHING * (stats['bytes'] / stats['duration_s'] - link_rate)
+
+        fps_now = frame_rate.add(time.time())
+        print(f'[+] Frame {encoder.number - 1}: {len(payload)}/{budget} bytes, latency {time.time() - captured_at:.1f}s, '
+              f'{fps_now:.2f} fps, {capture.dropped} stale frames dropped')
+
+    print('[*] Frame source exhausted, stream ended')
 
 if __name__ == '__main__':
+    # gui.py imports this file as lora, make that the running module rather than a
+    # second copy with default settings
+    sys.modules['lora'] = sys.modules[__name__]
+
     args = get_args()
     VERBOSE = args.verbose
     if VERBOSE:
         print('! Increased verbosity !')
         print('Running with args:', args)
 
+    if args.mode == 'archive':
+        launch_archive(args)
+        exit(0)
+
+    if args.mode == 'merge':
+        import merge
+
+        merge.MergeService(args.listen).start()
+        threading.Event().wait()
+
+    if args.mode == 'sweep':
+        import sweep
+
+        if bool(args.drone_port) != bool(args.ground_port):
+            print('[-] Real modems need both --drone-port and --ground-port')
+            exit(1)
+
+        try:
+            parse_channel(args.channel)
+            sweep.run_sweep(args)
+        except ValueError as e:
+            print(f'[-] {e}')
+            exit(1)
+        exit(0)
+
     # shared config & args
     RF_CONFIG['spreading_factor'] = args.sf
     RF_CONFIG['power_dbm'] = args.dbm
     RF_CONFIG['bandwidth'] = args.bandwidth
-    port = args.port
+    port = args.port or [None]
     configure = args.configure
 
+    if args.frequencies and len(args.frequencies) != len(port):
+        print(f'[-] Got {len(args.frequencies)} frequencies for {len(port)} ports')
+        exit(1)
+
+    try:
+        channel = parse_channel(args.channel, args.seed)
+    except ValueError as e:
+        print(f'[-] {e}')
+        exit(1)
+    if VERBOSE:
+        print(f'[*] Channel model: {channel} (seed {args.seed})')
+
+    if args.profile or args.profile_output or args.cprofile:
+        # uplink and downlink run at once and would mix their stages in one report
+        if args.mode == 'relay':
+            print('[-] Profiling is not supported in relay mode, profile the drone and the ground instead')
+            exit(1)
+        stages.configure(args.profile_output, args.cprofile)
+
     # mode-specific config
     if args.mode == 'client':
         print('Running in client mode')
 
         auto = args.auto
 
-        launch_client(port, configure, auto)
+        if args.stream:
+            launch_stream(port, configure, args.stream, args.fps, args.stream_size, args.position,
+                          args.telemetry_interval, channel, args.frequencies)
+            exit(0)
+
+        launch_client(port, configure, auto, args.position, args.telemetry_interval, channel, args.frequencies, args.preview)
+
+    elif args.mode == 'relay':
+        print('Running in relay mode')
+
+        import relay
+
+        tx_port = args.tx_port or port
+        if args.tx_frequencies and len(args.tx_frequencies) != len(tx_port):
+            print(f'[-] Got {len(args.tx_frequencies)} frequencies for {len(tx_port)} forwarding ports')
+            exit(1)
+
+        relay.launch_relay(port, tx_port, configure, channel, args.frequencies, args.tx_frequencies)
 
     elif args.mode == 'server':
         print('Running in server mode')
-        
-        while True:
-            launch_server(port, configure)
+
+        RECEIVED_DIR = os.path.dirname(args.archive) or '.'
+        image_archive = archive.Archive(args.archive).start()
+        start_image_workers(show=args.show, image_archive=image_archive)
+        start_stream_worker()
+
+        if args.bridge:
+            import bridge
+            event_bridge = bridge.Bridge(*args.bridge, args.bridge_origin).start()
+
+        merger = None
+        if args.merge:
+            import merge
+
+            try:
+                merger = merge.MergeClient(args.merge).connect()
+                print('[+] Connected to the merge service')
+            except OSError as e:
+                print(f'[-] Merge service unreachable ({e}), reporting alone')
+
+        try:
+            while True:
+                launch_server(port, configure, channel, args.frequencies, merger=merger)
+        finally:
+            # the workers are daemon threads, let them save what is queued before exiting
+            print('[*] Saving received images')
+            image_queue.join()
+            image_archive.close()
 
 
@@ -0,0 +1,276 @@
+from socketserver import ThreadingTCPServer, ThreadingUnixStreamServer, StreamRequestHandler
+import threading
+import socket
+import base64
+import queue
+import json
+import os
+
+import wire
+
+# Diversity reception: ground stations at different sites hear different chunks of the
+# same transfer. Each one joins the transfer at the merge service once it has the
+# header and shares every chunk it receives, the service passes them on to the other
+# grounds, so all of them reassemble the union. Only the elected ground, the first to
+# join, sends MISS reports, listing just the chunks no ground has. When it leaves the
+# next ground in join order takes over.
+#
+# Messages are JSON lines, chunk data is base64 encoded:
+#
+#   ground -> service  {"op": "join", "transfer": key}
+#                      {"op": "chunk", "transfer": key, "seq": 3, "data": "..."}
+#                      {"op": "done", "transfer": key}
+#   service -> ground  {"op": "chunk", "transfer": key, "seq": 3, "data": "..."}
+#                      {"op": "leader", "transfer": key}
+#
+# Transfers are keyed by a digest of the header frame, which every ground receives
+# byte for byte the same.
+
+MERGE_PORT = 8766
+
+# seconds to wait for the merge service when a ground starts
+CONNECT_TIMEOUT = 5
+
+
+def encode_message(op, **data) -> bytes:
+    return (wire.dumps({'op': op, **data}) + '\n').encode()
+
+
+def decode_message(line: bytes) -> dict:
+    message = json.loads(line)
+    if 'data' in message:
+        message['data'] = base64.b64decode(message['data'])
+
+    return message
+
+
+# (host, port) for TCP, a path for a Unix socket
+def open_socket(address) -> socket.socket:
+    if not isinstance(address, str):
+        return socket.create_connection(address, timeout=CONNECT_TIMEOUT)
+
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    sock.settimeout(CONNECT_TIMEOUT)
+    sock.connect(address)
+
+    return sock
+
+
+class Transfer:
+    def __init__(self):
+        # seq -> chunk, replayed to grounds that join late
+        self.chunks = {}
+        # grounds in join order, the first one is the leader
+        self.members = []
+
+
+class MergeService:
+    def __init__(self, address=('localhost', MERGE_PORT)):
+        self.address = address
+        self.transfers = {}
+        self.lock = threading.Lock()
+        self.server = None
+
+    def start(self):
+        handler = lambda *args: MergeRequestHandler(self, *args)
+
+        if isinstance(self.address, str):
+            # a socket file left behind by a previous run
+            if os.path.exists(self.address):
+                os.unlink(self.address)
+            self.server = ThreadingUnixStreamServer(self.address, handler)
+        else:
+            ThreadingTCPServer.allow_reuse_address = True
+            self.server = ThreadingTCPServer(self.address, handler)
+        self.server.daemon_threads = True
+
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+        address = self.address if isinstance(self.address, str) else f'{self.address[0]}:{self.address[1]}'
+        print(f'[+] Merge service listening on {address}')
+
+        return self
+
+    def stop(self):
+        if self.server:
+            self.server.shutdown()
+            self.server.server_close()
+
+    def join(self, ground, key):
+        with self.lock:
+            transfer = self.transfers.setdefault(key, Transfer())
+            if ground in transfer.members:
+                return
+
+            transfer.members.append(ground)
+            ground.transfers.add(key)
+            chunks = list(transfer.chunks.items())
+            leader = transfer.members[0] is ground
+
+        print(f'[*] {ground} joined transfer {key}{" as leader" if leader else ""}, {len(chunks)} chunks merged so far')
+
+        for seq, data in chunks:
+            ground.send('chunk', transfer=key, seq=seq, data=data)
+        if leader:
+            ground.send('leader', transfer=key)
+
+    def share(self, ground, key, seq, data):
+        with self.lock:
+            transfer = self.transfers.get(key)
+            if transfer is None or seq in transfer.chunks:
+                return
+
+            transfer.chunks[seq] = data
+            others = [member for member in transfer.members if member is not ground]
+
+        for member in others:
+            member.send('chunk', transfer=key, seq=seq, data=data)
+
+    def leave(self, ground, key):
+        with self.lock:
+            transfer = self.transfers.get(key)
+            if transfer is None or ground not in transfer.members:
+                return
+
+            was_leader = transfer.members[0] is ground
+            transfer.members.remove(ground)
+            ground.transfers.discard(key)
+
+            if not transfer.members:
+                del self.transfers[key]
+                return
+
+            leader = transfer.members[0]
+
+        if was_leader:
+            print(f'[*] {leader} took over reporting transfer {key}')
+            leader.send('leader', transfer=key)
+
+
+class MergeRequestHandler(StreamRequestHandler):
+    def __init__(self, service, *args):
+        self.service = service
+        self.transfers = set()
+        self.write_lock = threading.Lock()
+        super().__init__(*args)
+
+    def __str__(self):
+        if isinstance(self.client_address, tuple):
+            return f'ground {self.client_address[0]}:{self.client_address[1]}'
+
+        return f'local ground #{self.request.fileno()}'
+
+    def send(self, op, **data):
+        try:
+            with self.write_lock:
+                self.wfile.write(encode_message(op, **data))
+        except OSError:
+            pass
+
+    def handle(self):
+        print(f'[+] {self} connected')
+
+        try:
+            for line in self.rfile:
+                try:
+                    message = decode_message(line)
+                    key = message['transfer']
+                    if message['op'] == 'join':
+                        self.service.join(self, key)
+                    elif message['op'] == 'chunk':
+                        self.service.share(self, key, message['seq'], message['data'])
+                    elif message['op'] == 'done':
+                        self.service.leave(self, key)
+                except (ValueError, KeyError) as e:
+                    print(f'[!] Invalid message from {self}: {e}')
+        except OSError:
+            pass
+        finally:
+            for key in list(self.transfers):
+                self.service.leave(self, key)
+            print(f'[-] {self} disconnected')
+
+
+# the ground's side, chunks merged from other grounds are picked up by the radio loop
+class MergeClient:
+    def __init__(self, address):
+        self.address = address
+        self.sock = None
+        self.write_lock = threading.Lock()
+
+        # (transfer, seq, data) received from other grounds
+        self.incoming = queue.SimpleQueue()
+        # transfers this ground reports for
+        self.leading = set()
+
+    def connect(self):
+        self.sock = open_socket(self.address)
+        self.sock.settimeout(None)
+        threading.Thread(target=self.receive, daemon=True).start()
+
+        return self
+
+    @property
+    def connected(self) -> bool:
+        return self.sock is not None
+
+    def send(self, op, **data):
+        sock = self.sock
+        if not sock:
+            return
+
+        try:
+            with self.write_lock:
+                sock.sendall(encode_message(op, **data))
+        except OSError as e:
+            self.disconnect(e)
+
+    def disconnect(self, reason):
+        sock, self.sock = self.sock, None
+        if not sock:
+            return
+
+        print(f'[!] Lost the merge service ({reason}), reporting alone')
+        # the reader thread still holds the socket, shutting it down ends its read
+        try:
+            sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        sock.close()
+
+    def receive(self):
+        try:
+            for line in self.sock.makefile('rb'):
+                message = decode_message(line)
+                if message['op'] == 'chunk':
+                    self.incoming.put((message['transfer'], message['seq'], message['data']))
+                elif message['op'] == 'leader':
+                    self.leading.add(message['transfer'])
+        except (OSError, ValueError) as e:
+            self.disconnect(e)
+        else:
+            self.disconnect('connection closed')
+
+    def join(self, key):
+        self.send('join', transfer=key)
+
+    def share(self, key, seq, data):
+        self.send('chunk', transfer=key, seq=seq, data=data)
+
+    def done(self, key):
+        self.send('done', transfer=key)
+        self.leading.discard(key)
+
+    # without the service every ground is on its own and reports for itself
+    def is_leader(self, key) -> bool:
+        return not self.connected or key in self.leading
+
+    # chunks of the transfer merged since the last call, other transfers are dropped
+    def take(self, key) -> list:
+        chunks = []
+        while not self.incoming.empty():
+            transfer, seq, data = self.incoming.get()
+            if transfer == key:
+                chunks.append((seq, data))
+
+        return chunks
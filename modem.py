@@ -0,0 +1,126 @@
+import time
+import re
+
+# Idempotent Wio-E5 configuration. The modem is asked for its current mode, UART and
+# RF settings first and only the commands that would change something are sent. Both
+# the queries and the commands go out in a single write, responses come back in
+# command order and are matched by their +NAME: prefix instead of waiting a fixed
+# time per line.
+#
+# AT+LOG cannot be queried. The level last applied is cached per port and forgotten
+# whenever the modem shows up outside TEST mode, i.e. after a reset.
+
+QUERIES = ['AT+MODE', 'AT+UART=BR', 'AT+TEST=?']
+
+# seconds to wait for all responses of one write
+RESPONSE_TIMEOUT = 1
+
+RFCFG_COMMAND = re.compile(r'AT\+TEST=RFCFG,(\d+),SF(\d+),(\d+),(\d+),(\d+),(-?\d+),(ON|OFF),(ON|OFF),(ON|OFF)')
+RFCFG_RESPONSE = re.compile(r'RFCFG F:(\d+), SF(\d+), BW(\d+)K, TXPR:(\d+), RXPR:(\d+), POW:(-?\d+)dBm, CRC:(ON|OFF), IQ:(ON|OFF), NET:(ON|OFF)')
+
+# port -> last AT+LOG level applied
+log_levels = {}
+
+
+def response_prefix(command) -> str:
+    return '+' + command[3:].split('=')[0].rstrip('?') + ':'
+
+
+def rf_settings(groups, frequency_scale=1) -> tuple:
+    frequency, *numbers, crc, iq, net = groups
+    return (int(frequency) * frequency_scale, *(int(x) for x in numbers), crc, iq, net)
+
+
+# (setting, value) a command sets, (command, None) for anything not tracked
+def parse_command(command) -> tuple:
+    if m := re.fullmatch(r'AT\+LOG=(\w+)', command):
+        return 'log', m.group(1)
+    if m := re.fullmatch(r'AT\+UART=BR,\s*(\d+)', command):
+        return 'uart', int(m.group(1))
+    if m := re.fullmatch(r'AT\+MODE=(\w+)', command):
+        return 'mode', m.group(1)
+    if m := RFCFG_COMMAND.fullmatch(command):
+        # the command takes MHz, the modem reports Hz
+        return 'rfcfg', rf_settings(m.groups(), 10**6)
+
+    return command, None
+
+
+# (setting, value) reported by a response line, None when it carries no setting
+def parse_response(line) -> tuple:
+    if m := re.match(r'\+LOG: (\w+)', line):
+        return 'log', m.group(1)
+    if m := re.match(r'\+UART: BR, (\d+)', line):
+        return 'uart', int(m.group(1))
+    if m := re.match(r'\+MODE: (\w+)', line):
+        return 'mode', m.group(1)
+    if m := RFCFG_RESPONSE.search(line):
+        return 'rfcfg', rf_settings(m.groups())
+
+    return None
+
+
+# writes all commands at once, then reads one response per command. Lines that do not
+# start with the expected prefix (received packets, stray output) are skipped
+def pipeline(serial, commands, timeout=RESPONSE_TIMEOUT) -> list:
+    if not commands:
+        return []
+
+    serial.write(''.join(f'{command}\n' for command in commands).encode())
+
+    responses = []
+    deadline = time.monotonic() + timeout
+    while len(responses) < len(commands) and time.monotonic() < deadline:
+        line = serial.readline().decode(errors='replace').strip()
+        if line.startswith(response_prefix(commands[len(responses)])):
+            responses.append(line)
+
+    if len(responses) < len(commands):
+        raise RuntimeError(f'no response to {commands[len(responses)]}')
+
+    return responses
+
+
+# current state of the modem as {setting: value}, settings it refused to report are left out
+def query(serial, port=None, timeout=RESPONSE_TIMEOUT) -> dict:
+    state = {}
+    for line in pipeline(serial, QUERIES, timeout):
+        if setting := parse_response(line):
+            state[setting[0]] = setting[1]
+
+    if state.get('mode') != 'TEST':
+        log_levels.pop(port, None)
+    elif port in log_levels:
+        state['log'] = log_levels[port]
+
+    return state
+
+
+# brings the modem to the state the commands describe, returns the (command, response)
+# pairs actually sent. Raises RuntimeError when the modem rejects a command or stops
+# answering
+def configure(serial, commands, port=None, timeout=RESPONSE_TIMEOUT) -> list:
+    commands = [command.strip() for command in commands if command.strip()]
+
+    serial.reset_input_buffer()
+    state = query(serial, port, timeout)
+
+    # outside TEST mode the RF settings are not reported, so they are always resent
+    # together with the mode
+    changes = []
+    for command in commands:
+        setting, value = parse_command(command)
+        if value is None or state.get(setting) != value:
+            changes.append(command)
+
+    responses = pipeline(serial, changes, timeout)
+
+    for command, response in zip(changes, responses):
+        if 'ERROR' in response:
+            raise RuntimeError(f'{command}: {response}')
+
+        setting, value = parse_command(command)
+        if setting == 'log':
+            log_levels[port] = value
+
+    return list(zip(changes, responses))
@@ -0,0 +1,124 @@
+from collections import defaultdict
+import threading
+import json
+import time
+
+# Opt-in stage profiler for the transmit and receive paths (--profile). Code marks a
+# stage with
+#
+#   start = stages.clock()
+#   ...
+#   stages.record('serial_write', start)
+#
+# and gets the wall time and number of calls per stage reported at the end of each
+# transfer. Disabled, clock() and record() return straight away.
+#
+# A report covers everything recorded since the previous one, so work done ahead of a
+# transfer (encoding, configuration) or next to it (decoding on the image workers) is
+# included. Shares are relative to the transfer itself, stages running on several
+# radio workers in parallel can add up to more than 100%.
+
+
+class Profiler:
+    def __init__(self):
+        self.enabled = False
+        # JSON lines file every report is appended to
+        self.output = None
+        # transfers also run under cProfile, stats are dumped here after each one
+        self.cprofile_path = None
+        self.cprofile = None
+
+        self.lock = threading.Lock()
+        self.reset()
+
+    def configure(self, output=None, cprofile_path=None):
+        self.enabled = True
+        self.output = output
+        self.cprofile_path = cprofile_path
+
+        if cprofile_path:
+            import cProfile
+            self.cprofile = cProfile.Profile()
+
+    def reset(self):
+        # stage -> nanoseconds, stage -> calls
+        self.totals = defaultdict(int)
+        self.calls = defaultdict(int)
+        self.started = time.perf_counter_ns()
+
+    def clock(self) -> int:
+        return time.perf_counter_ns() if self.enabled else 0
+
+    def record(self, stage, start):
+        if not self.enabled:
+            return
+
+        elapsed = time.perf_counter_ns() - start
+        with self.lock:
+            self.totals[stage] += elapsed
+            self.calls[stage] += 1
+
+    # for stages that are estimated rather than timed
+    def add(self, stage, seconds):
+        if not self.enabled:
+            return
+
+        with self.lock:
+            self.totals[stage] += int(seconds * 10**9)
+            self.calls[stage] += 1
+
+    # start of a transfer, shares in its report are relative to the time from here
+    def begin(self):
+        if not self.enabled:
+            return
+
+        self.started = time.perf_counter_ns()
+        if self.cprofile:
+            self.cprofile.enable()
+
+    # breakdown of everything recorded since the previous report, None when disabled
+    def end(self, transfer) -> dict:
+        if not self.enabled:
+            return None
+
+        if self.cprofile:
+            self.cprofile.disable()
+            # stats accumulate over all transfers of the run
+            self.cprofile.dump_stats(self.cprofile_path)
+
+        with self.lock:
+            duration_ns = time.perf_counter_ns() - self.started
+            stages = sorted(self.totals, key=self.totals.get, reverse=True)
+            report = {
+                'transfer': transfer,
+                'time': time.time(),
+                'duration_s': duration_ns / 10**9,
+                'stages': {
+                    stage: {
+                        'total_s': self.totals[stage] / 10**9,
+                        'share': self.totals[stage] / duration_ns if duration_ns else 0,
+                        'calls': self.calls[stage],
+                    }
+                    for stage in stages
+                },
+            }
+            self.reset()
+
+        if self.output:
+            with open(self.output, 'a') as f:
+                f.write(json.dumps(report) + '\n')
+
+        return report
+
+
+def format_report(report) -> str:
+    lines = [
+        f"[*] Profile of {report['transfer']} ({report['duration_s']:.3f}s)",
+        f"    {'stage':20} {'total':>10} {'share':>7} {'calls':>7} {'per call':>11}",
+    ]
+
+    for stage, timing in report['stages'].items():
+        per_call = timing['total_s'] / timing['calls'] * 1000
+        lines.append(f"    {stage:20} {timing['total_s']:>9.3f}s {timing['share']:>7.1%} {timing['calls']:>7} {per_call:>8.2f} ms")
+
+    return '\n'.join(lines)
@@ -0,0 +1,148 @@
+from collections import deque
+import threading
+import queue
+
+import sources
+import lora
+
+# Store-and-forward relay between the drone and a ground station out of its reach.
+# The relay receives a transfer like a ground station, with its own reassembly and MISS
+# reports, and sends it on like a drone on a second radio, so each hop can run a fast
+# spreading factor instead of one slow end-to-end link.
+#
+# With separate uplink and downlink radios forwarding is pipelined: the header goes on
+# as soon as it arrives and chunks follow a block at a time, as soon as every chunk of
+# a block is in. Chunks the ground misses are served from the relay's copy. With one
+# radio the relay receives the whole transfer first, then retunes and forwards it.
+
+# chunks forwarded together once all of them arrived
+RELAY_BLOCK = 8
+
+
+# chunks of a transfer still coming in on the uplink, chunk() waits for the chunk
+class RelaySource(sources.ChunkSource):
+    def __init__(self, incoming_bytes, width, height, chunk_size, block=RELAY_BLOCK):
+        super().__init__(chunk_size)
+        self.width = width
+        self.height = height
+        self.count = lora.num_chunks(incoming_bytes)
+        # the header counts the sequence numbers in
+        self.payload_size = incoming_bytes - 2 * self.count
+
+        self.block = block
+        self.chunks = {}
+        # blocks complete but not handed to the downlink yet
+        self.completed = deque()
+        self.cond = threading.Condition()
+
+    @property
+    def size(self) -> int:
+        return self.payload_size
+
+    def __len__(self):
+        return self.count
+
+    def dimensions(self) -> tuple:
+        return self.width, self.height
+
+    def blocks(self) -> int:
+        return -(-self.count // self.block)
+
+    def block_range(self, block) -> range:
+        return range(block * self.block, min((block + 1) * self.block, self.count))
+
+    def add(self, seq, data):
+        with self.cond:
+            if seq in self.chunks:
+                return
+
+            self.chunks[seq] = bytes(data)
+
+            block = seq // self.block
+            if all(other in self.chunks for other in self.block_range(block)):
+                self.completed.append(block)
+                self.cond.notify_all()
+
+    def chunk(self, seq) -> memoryview:
+        with self.cond:
+            while seq not in self.chunks:
+                self.cond.wait()
+
+            return memoryview(self.chunks[seq])
+
+    # blocks in the order they complete, waiting for the next one as needed
+    def sequence(self):
+        for _ in range(self.blocks()):
+            with self.cond:
+                while not self.completed:
+                    self.cond.wait()
+
+                block = self.completed.popleft()
+
+            yield from self.block_range(block)
+
+
+class Relay:
+    def __init__(self, tx_ports, configure=False, channel=None, frequencies=None, pipelined=True):
+        self.tx_ports = tx_ports
+        self.channel = channel
+        self.frequencies = frequencies
+        self.pipelined = pipelined
+
+        self.source: RelaySource = None
+        # transfers with their header in, waiting for the downlink
+        self.forwards = queue.Queue()
+
+        # with a radio of its own the downlink stays open, it is also a drone without
+        # telemetry of its own
+        self.drone = None
+        if pipelined:
+            self.drone = lora.Drone(tx_ports, configure, 0, channel, frequencies)
+            threading.Thread(target=self.forward_worker, daemon=True).start()
+
+    def start(self, incoming_bytes, width, height):
+        self.source = RelaySource(incoming_bytes, width, height, lora.CHUNK_SIZE)
+        if self.pipelined:
+            self.forwards.put(self.source)
+
+    def add(self, seq, data):
+        self.source.add(seq, data)
+
+    def forward(self, drone, source):
+        print(f'[*] Forwarding {source.size} bytes toward the ground')
+        drone.transmit_image(source, source.width, source.height)
+
+    def forward_worker(self):
+        while True:
+            self.forward(self.drone, self.forwards.get())
+
+    # one radio: the uplink is closed by now, the downlink borrows the modem
+    def forward_stored(self):
+        drone = lora.Drone(self.tx_ports, True, 0, self.channel, self.frequencies)
+        try:
+            self.forward(drone, self.source)
+        finally:
+            for radio in drone.radios:
+                if radio.serial:
+                    radio.serial.close()
+
+
+def launch_relay(rx_ports, tx_ports, configure=False, channel=None, rx_frequencies=None, tx_frequencies=None):
+    rx_frequencies = rx_frequencies or lora.radio_frequencies(len(rx_ports))
+    # the downlink continues below the uplink frequencies unless told otherwise
+    tx_frequencies = tx_frequencies or lora.radio_frequencies(len(rx_ports) + len(tx_ports))[len(rx_ports):]
+
+    pipelined = not set(rx_ports) & set(tx_ports)
+    relay = Relay(tx_ports, configure, channel, tx_frequencies, pipelined)
+
+    uplink = ', '.join(f'{port}@{frequency}MHz' for port, frequency in zip(rx_ports, rx_frequencies))
+    downlink = ', '.join(f'{port}@{frequency}MHz' for port, frequency in zip(tx_ports, tx_frequencies))
+    print(f'[*] Relaying {uplink} -> {downlink}{"" if pipelined else ", store and forward on one radio"}')
+
+    while True:
+        # a shared radio has to be retuned to the uplink every time
+        lora.launch_server(rx_ports, configure or not pipelined, channel, rx_frequencies, relay=relay)
+
+        if not pipelined and relay.source and len(relay.source.chunks) == len(relay.source):
+            relay.forward_stored()
+        relay.source = None
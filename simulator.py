@@ -0,0 +1,400 @@
+from urllib.parse import urlsplit, parse_qsl
+from channel import Channel, Bernoulli, parse_channel
+from serial import SerialException
+import threading
+import socket
+import random
+import heapq
+import math
+import time
+import re
+
+# ports named sim://<link>[?channel=gilbert:0.05,0.3&seed=1&scale=0.1] open a simulated
+# modem, every modem opened with the same link name shares one radio channel.
+# loss=0.1 is short for channel=bernoulli:0.1, see channel.py for all models.
+# rx=bernoulli:0.3&rx_seed=2 adds losses seen by that one modem only, e.g. a ground
+# station at a site with patchy coverage.
+SIM_PREFIX = 'sim://'
+
+# state of a Wio-E5 after reset, before any configuration is sent
+DEFAULT_RF_CONFIG = {
+    'frequency': 868,
+    'spreading_factor': 12,
+    'bandwidth': 125,
+    'tx_preamble': 12,
+    'rx_preamble': 15,
+    'power_dbm': 14,
+    'crc': 'ON',
+    'iq': 'OFF',
+    'net': 'OFF',
+}
+
+links = {}
+links_lock = threading.Lock()
+
+
+# Semtech SX126x time on air, coding rate 4/5 with explicit header
+def airtime(payload_size, spreading_factor, bandwidth, preamble=12, crc=True) -> float:
+    symbol_time = 2 ** spreading_factor / (bandwidth * 1000)
+    low_data_rate = symbol_time > 0.016
+
+    payload_symbols = 8 + max(
+        math.ceil((8 * payload_size - 4 * spreading_factor + 28 + 16 * crc) / (4 * (spreading_factor - 2 * low_data_rate))) * 5,
+        0,
+    )
+
+    return (preamble + 4.25 + payload_symbols) * symbol_time
+
+
+# time for a UART line to go across the serial port, 10 bits per byte
+def serial_time(size, baudrate) -> float:
+    return size * 10 / baudrate
+
+
+def open_link(port) -> 'Link':
+    parts = urlsplit(port)
+    options = dict(parse_qsl(parts.query))
+
+    seed = int(options['seed']) if 'seed' in options else None
+    if 'channel' in options:
+        impairments = parse_channel(options['channel'], seed)
+    else:
+        impairments = Bernoulli(float(options.get('loss', 0)), random.Random(seed))
+
+    with links_lock:
+        if parts.netloc not in links:
+            links[parts.netloc] = Link(
+                parts.netloc,
+                channel=impairments,
+                seed=seed,
+                time_scale=float(options.get('scale', 1)),
+            )
+
+        return links[parts.netloc]
+
+
+def close_link(name):
+    with links_lock:
+        link = links.pop(name, None)
+
+    if link:
+        link.stop()
+
+
+# A shared radio channel: schedules delayed events and delivers packets between modems
+class Link:
+    def __init__(self, name, channel: Channel = None, seed=None, time_scale=1.0):
+        self.name = name
+        self.channel = channel or Channel()
+        self.random = random.Random(seed)
+        self.time_scale = time_scale
+
+        self.modems = []
+        # (start, end, frequency) of recent transmissions, used to detect collisions
+        self.transmissions = []
+
+        self.events = []
+        self.events_counter = 0
+        self.cond = threading.Condition()
+        self.running = True
+
+        threading.Thread(target=self.run, daemon=True).start()
+
+    def schedule(self, delay, fn, *args):
+        with self.cond:
+            self.events_counter += 1
+            heapq.heappush(self.events, (time.monotonic() + delay * self.time_scale, self.events_counter, fn, args))
+            self.cond.notify()
+
+    def run(self):
+        while True:
+            with self.cond:
+                while self.running and (not self.events or self.events[0][0] > time.monotonic()):
+                    self.cond.wait(self.events[0][0] - time.monotonic() if self.events else None)
+
+                if not self.running:
+                    return
+
+                _, _, fn, args = heapq.heappop(self.events)
+
+            fn(*args)
+
+    def stop(self):
+        with self.cond:
+            self.running = False
+            self.cond.notify()
+
+    def transmit(self, sender, payload: bytes):
+        config = dict(sender.rf_config)
+        duration = airtime(len(payload), config['spreading_factor'], config['bandwidth'], config['tx_preamble'], config['crc'] == 'ON')
+
+        start = time.monotonic()
+        transmission = (start, start + duration * self.time_scale, config['frequency'])
+        with self.cond:
+            self.transmissions = [t for t in self.transmissions if t[1] > start - 60] + [transmission]
+
+        self.schedule(duration, self.deliver, sender, payload, config, transmission)
+
+    def deliver(self, sender, payload, config, transmission):
+        sender.transmit_done()
+
+        with self.cond:
+            collided = any(
+                t is not transmission and t[2] == transmission[2] and t[0] < transmission[1] and transmission[0] < t[1]
+                for t in self.transmissions
+            )
+
+        if collided:
+            return
+
+        for delay, frame in self.channel.apply(payload):
+            if delay:
+                self.schedule(delay, self.receive, sender, frame, config)
+            else:
+                self.receive(sender, frame, config)
+
+    def receive(self, sender, payload, config):
+        for modem in self.modems:
+            if modem is sender or not modem.receiving:
+                continue
+
+            # only a receiver tuned to the same channel demodulates the packet
+            rf = modem.rf_config
+            if (rf['frequency'], rf['spreading_factor'], rf['bandwidth']) != (config['frequency'], config['spreading_factor'], config['bandwidth']):
+                continue
+
+            if modem.rx_channel:
+                for delay, frame in modem.rx_channel.apply(payload):
+                    self.schedule(delay, modem.receive, frame)
+            else:
+                modem.receive(payload)
+
+
+# pyserial Serial look-alike speaking the Wio-E5 AT command set in TEST mode
+class SimulatedModem:
+    def __init__(self, port, baudrate=230400, timeout=None, **kwargs):
+        self.port = port
+        self.baudrate = baudrate
+        self.timeout = timeout
+        self.is_open = True
+
+        self.link = open_link(port)
+        self.link.modems.append(self)
+
+        options = dict(parse_qsl(urlsplit(port).query))
+        self.rx_channel = parse_channel(options['rx'], int(options['rx_seed']) if 'rx_seed' in options else None) if 'rx' in options else None
+
+        self.rf_config = dict(DEFAULT_RF_CONFIG)
+        self.mode = 'LWOTAA'
+        self.log = 'DEBUG'
+        self.receiving = False
+        self.transmitting = False
+
+        self.rx_buffer = bytearray()
+        self.tx_buffer = b''
+        # readable while rx_buffer holds data, so the port can be selected like a tty
+        self.wakeup, self.wakeup_signal = socket.socketpair()
+        self.signalled = False
+        # monotonic time the UART finishes sending what was written so far
+        self.uart_idle_at = 0
+        self.cond = threading.Condition()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        self.is_open = False
+        if self in self.link.modems:
+            self.link.modems.remove(self)
+        with self.cond:
+            self.wakeup.close()
+            self.wakeup_signal.close()
+
+    def fileno(self) -> int:
+        return self.wakeup.fileno()
+
+    # called with cond held whenever rx_buffer changes
+    def update_wakeup(self):
+        if not self.is_open:
+            return
+
+        if self.rx_buffer and not self.signalled:
+            self.wakeup_signal.send(b'\0')
+            self.signalled = True
+        elif not self.rx_buffer and self.signalled:
+            self.wakeup.recv(1)
+            self.signalled = False
+
+    # like pyserial, using a closed port fails instead of blocking forever
+    def check_open(self):
+        if not self.is_open:
+            raise SerialException('Attempting to use a port that is not open')
+
+    @property
+    def in_waiting(self):
+        self.check_open()
+        with self.cond:
+            return len(self.rx_buffer)
+
+    def write(self, data: bytes) -> int:
+        self.check_open()
+        self.tx_buffer += data
+
+        # lines go across the UART one after another, a command only reaches the modem
+        # once it and everything written before it went across
+        now = time.monotonic()
+        delay = max(0, self.uart_idle_at - now) / self.link.time_scale
+
+        while b'\n' in self.tx_buffer:
+            line, self.tx_buffer = self.tx_buffer.split(b'\n', 1)
+            command = line.strip().decode(errors='replace')
+            delay += serial_time(len(line) + 1, self.baudrate)
+
+            if command:
+                self.link.schedule(delay, self.handle, command)
+
+        self.uart_idle_at = now + delay * self.link.time_scale
+
+        return len(data)
+
+    def respond(self, *lines):
+        data = ''.join(f'{line}\r\n' for line in lines).encode()
+
+        with self.cond:
+            self.rx_buffer += data
+            self.update_wakeup()
+            self.cond.notify_all()
+
+    def read_until(self, expected=b'\n', size=None) -> bytes:
+        self.check_open()
+        deadline = None if self.timeout is None else time.monotonic() + self.timeout
+
+        with self.cond:
+            while True:
+                index = self.rx_buffer.find(expected)
+                if index >= 0:
+                    end = index + len(expected)
+                elif size is not None and len(self.rx_buffer) >= size:
+                    end = size
+                elif deadline is not None and time.monotonic() >= deadline:
+                    end = len(self.rx_buffer)
+                else:
+                    self.cond.wait(None if deadline is None else deadline - time.monotonic())
+                    continue
+
+                if size is not None:
+                    end = min(end, size)
+
+                data = bytes(self.rx_buffer[:end])
+                del self.rx_buffer[:end]
+                self.update_wakeup()
+                return data
+
+    def read(self, size=1) -> bytes:
+        self.check_open()
+        deadline = None if self.timeout is None else time.monotonic() + self.timeout
+
+        with self.cond:
+            while len(self.rx_buffer) < size and (deadline is None or time.monotonic() < deadline):
+                self.cond.wait(None if deadline is None else deadline - time.monotonic())
+
+            data = bytes(self.rx_buffer[:size])
+            del self.rx_buffer[:size]
+            self.update_wakeup()
+            return data
+
+    def readline(self) -> bytes:
+        return self.read_until(b'\n')
+
+    def read_all(self) -> bytes:
+        with self.cond:
+            data = bytes(self.rx_buffer)
+            self.rx_buffer.clear()
+            self.update_wakeup()
+            return data
+
+    def reset_input_buffer(self):
+        self.read_all()
+
+    def rfcfg_line(self) -> str:
+        rf = self.rf_config
+        return (
+            f"+TEST: RFCFG F:{rf['frequency'] * 10**6}, SF{rf['spreading_factor']}, BW{rf['bandwidth']}K, "
+            f"TXPR:{rf['tx_preamble']}, RXPR:{rf['rx_preamble']}, POW:{rf['power_dbm']}dBm, "
+            f"CRC:{rf['crc']}, IQ:{rf['iq']}, NET:{rf['net']}"
+        )
+
+    def handle(self, command):
+        if command == 'AT':
+            return self.respond('+AT: OK')
+
+        if m := re.fullmatch(r'AT\+LOG=(\w+)', command):
+            self.log = m.group(1)
+            return self.respond(f'+LOG: {self.log}')
+
+        if re.fullmatch(r'AT\+UART=(BR)?\??', command):
+            return self.respond(f'+UART: BR, {self.baudrate}')
+
+        # the new baudrate only applies after a reset, like the real device
+        if m := re.fullmatch(r'AT\+UART=BR,\s*(\d+)', command):
+            return self.respond(f'+UART: BR, {m.group(1)}')
+
+        if command == 'AT+MODE?' or command == 'AT+MODE':
+            return self.respond(f'+MODE: {self.mode}')
+
+        if m := re.fullmatch(r'AT\+MODE=(\w+)', command):
+            self.mode = m.group(1)
+            self.receiving = False
+            return self.respond(f'+MODE: {self.mode}')
+
+        if not command.startswith('AT+TEST'):
+            return self.respond(f'+{command[3:].split("=")[0]}: ERROR(-1)')
+
+        if self.mode != 'TEST':
+            return self.respond('+TEST: ERROR(-12)')
+
+        if command in ('AT+TEST=?', 'AT+TEST?'):
+            return self.respond(self.rfcfg_line())
+
+        if m := re.fullmatch(r'AT\+TEST=RFCFG,(\d+),SF(\d+),(\d+),(\d+),(\d+),(\d+),(ON|OFF),(ON|OFF),(ON|OFF)', command):
+            frequency, sf, bw, txpr, rxpr, power, crc, iq, net = m.groups()
+            self.rf_config.update(
+                frequency=int(frequency),
+                spreading_factor=int(sf),
+                bandwidth=int(bw),
+                tx_preamble=int(txpr),
+                rx_preamble=int(rxpr),
+                power_dbm=int(power),
+                crc=crc,
+                iq=iq,
+                net=net,
+            )
+            return self.respond(self.rfcfg_line())
+
+        if command == 'AT+TEST=RXLRPKT':
+            self.receiving = not self.transmitting
+            return self.respond('+TEST: RXLRPKT')
+
+        if m := re.fullmatch(r'AT\+TEST=TXLRPKT,\s*"([0-9A-Fa-f]*)"', command):
+            payload = bytes.fromhex(m.group(1))
+            if not payload or len(payload) > 255 or self.transmitting:
+                return self.respond('+TEST: ERROR(-1)')
+
+            self.receiving = False
+            self.transmitting = True
+            self.respond(f'+TEST: TXLRPKT "{m.group(1).upper()}"')
+            return self.link.transmit(self, payload)
+
+        return self.respond('+TEST: ERROR(-1)')
+
+    def transmit_done(self):
+        self.transmitting = False
+        self.respond('+TEST: TX DONE')
+
+    def receive(self, payload: bytes):
+        rssi = -40 - self.link.random.randint(0, 20)
+        snr = 10 - self.link.random.randint(0, 5)
+        self.respond(f'+TEST: LEN:{len(payload)}, RSSI:{rssi}, SNR:{snr}', f'+TEST: RX "{payload.hex().upper()}"')
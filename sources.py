@@ -0,0 +1,200 @@
+from io import BytesIO
+import tempfile
+import struct
+import mmap
+import os
+
+# Chunk sources hand out the payload of a transfer one chunk at a time as zero-copy
+# memoryviews, so the drone never holds more of an image than the frames on air.
+#
+#   FileSource       memory-maps a file on first use, pages come and go with the page cache
+#   BufferSource     wraps bytes already in memory (stream frames, crops, previews)
+#   GeneratorSource  spools an iterable of byte strings to a temporary file, then maps it
+#
+# Sources open lazily and close when done, a queue of them costs nothing until sent.
+
+
+# (width, height) from the image header without decoding it, None if unrecognised
+def image_size(data) -> tuple:
+    data = memoryview(data)
+
+    if data[:8] == b'\x89PNG\r\n\x1a\n' and len(data) >= 24:
+        return struct.unpack('>II', data[16:24])
+
+    if data[:4] == b'GIF8' and len(data) >= 10:
+        return struct.unpack('<HH', data[6:10])
+
+    if data[:2] == b'BM' and len(data) >= 26:
+        width, height = struct.unpack('<ii', data[18:26])
+        return width, abs(height)
+
+    if data[:2] == b'\xff\xd8':
+        return jpeg_size(data)
+
+    return None
+
+
+# walks the JPEG markers up to the start of frame, which carries the dimensions
+def jpeg_size(data: memoryview) -> tuple:
+    i = 2
+    while i + 9 <= len(data):
+        if data[i] != 0xFF:
+            return None
+
+        marker = data[i + 1]
+        # fill bytes and markers without a length field
+        if marker == 0xFF:
+            i += 1
+            continue
+        if marker == 0x01 or 0xD0 <= marker <= 0xD8:
+            i += 2
+            continue
+
+        # SOF0-SOF15, except DHT, JPG and DAC which share the range
+        if 0xC0 <= marker <= 0xCF and marker not in (0xC4, 0xC8, 0xCC):
+            height, width = struct.unpack('>HH', data[i + 5:i + 9])
+            return width, height
+
+        length, = struct.unpack('>H', data[i + 2:i + 4])
+        i += 2 + length
+
+    return None
+
+
+class ChunkSource:
+    def __init__(self, chunk_size):
+        self.chunk_size = chunk_size
+        self.view: memoryview = None
+
+    # memoryview over the whole payload, opening the backend on first use
+    def open(self) -> memoryview:
+        raise NotImplementedError
+
+    def close(self):
+        if self.view is not None:
+            self.view.release()
+            self.view = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    @property
+    def size(self) -> int:
+        return len(self.open())
+
+    def __len__(self):
+        return -(-self.size // self.chunk_size)
+
+    def chunk(self, seq) -> memoryview:
+        offset = seq * self.chunk_size
+        return self.open()[offset:offset + self.chunk_size]
+
+    # order the first pass sends chunks in, a relay hands them out as they arrive
+    def sequence(self):
+        return range(len(self))
+
+    def dimensions(self) -> tuple:
+        size = image_size(self.open())
+        if size:
+            return size
+
+        # formats we do not parse ourselves, PIL only reads the header until load()
+        from PIL import Image
+
+        try:
+            with Image.open(self.image_file()) as image:
+                return image.size
+        except Exception:
+            return 0, 0
+
+    def image_file(self):
+        return BytesIO(self.open())
+
+
+class BufferSource(ChunkSource):
+    def __init__(self, data, chunk_size):
+        super().__init__(chunk_size)
+        self.data = data
+
+    def open(self) -> memoryview:
+        if self.view is None:
+            self.view = memoryview(self.data)
+
+        return self.view
+
+
+class FileSource(ChunkSource):
+    def __init__(self, path, chunk_size):
+        super().__init__(chunk_size)
+        self.path = path
+        self.file = None
+        self.map = None
+
+    # known without touching the contents
+    @property
+    def size(self) -> int:
+        return os.path.getsize(self.path) if self.view is None else len(self.view)
+
+    def open(self) -> memoryview:
+        if self.view is None:
+            self.file = open(self.path, 'rb')
+            self.view = self.map_file(self.file)
+
+        return self.view
+
+    def map_file(self, file) -> memoryview:
+        if os.fstat(file.fileno()).st_size == 0:
+            return memoryview(b'')
+
+        self.map = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        # chunks are read front to back, let the kernel read ahead and drop behind
+        if hasattr(self.map, 'madvise') and hasattr(mmap, 'MADV_SEQUENTIAL'):
+            self.map.madvise(mmap.MADV_SEQUENTIAL)
+
+        return memoryview(self.map)
+
+    def close(self):
+        super().close()
+
+        if self.map is not None:
+            try:
+                self.map.close()
+            except BufferError:
+                # a chunk view is still referenced somewhere, the map goes with it
+                pass
+            self.map = None
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+    def image_file(self):
+        return self.path
+
+
+class GeneratorSource(FileSource):
+    def __init__(self, pieces, chunk_size):
+        super().__init__(None, chunk_size)
+        self.pieces = pieces
+
+    # the header announces the total size, so the generator is drained up front
+    @property
+    def size(self) -> int:
+        return len(self.open())
+
+    def open(self) -> memoryview:
+        if self.view is None:
+            self.file = tempfile.TemporaryFile()
+            for piece in self.pieces:
+                self.file.write(piece)
+            self.file.flush()
+
+            self.view = self.map_file(self.file)
+
+        return self.view
+
+    def image_file(self):
+        self.file.seek(0)
+        return self.file
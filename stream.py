@@ -0,0 +1,288 @@
+from collections import deque
+from io import BytesIO
+import threading
+import struct
+import time
+import os
+
+# Low-rate frame streaming: every frame goes out as one regular image transfer whose
+# payload starts with this header
+# +--------+------+--------+-----------+-------------+
+# | "FRAM" | kind | number | reference | captured_at |
+# +--------+------+--------+-----------+-------------+
+# |   4B   |  1B  |   4B   |    4B     |     8B      |
+# +--------+------+--------+-----------+-------------+
+# followed by a JPEG. Keyframes carry the frame itself, deltas the difference to the
+# frame numbered reference, offset by 128 so it fits a regular 8 bit image.
+# captured_at is a unix timestamp, latency is only meaningful with synced clocks.
+STREAM_PREAMBLE = b'FRAM'
+STREAM_HEADER_FORMAT = '>4sBIId'
+STREAM_HEADER_SIZE = struct.calcsize(STREAM_HEADER_FORMAT)
+
+KEYFRAME = 0
+DELTA = 1
+
+STREAM_FPS = 0.2
+STREAM_SIZE = (320, 240)
+
+# a delta is only as good as the reference it builds on, refresh it regularly
+KEYFRAME_INTERVAL = 10
+
+# JPEG quality range searched to fit a frame into its byte budget
+MIN_QUALITY = 5
+MAX_QUALITY = 90
+
+# share of the frame interval's worth of link capacity a frame may use, the rest
+# absorbs retransmissions and the ground's confirmation
+BUDGET_FRACTION = 0.8
+
+# frames are never squeezed below this many bytes, the stream just falls behind
+MIN_BUDGET = 1000
+
+# a frame that does not fit its budget at MIN_QUALITY is sent at half the size, down to
+# this fraction of it, and skipped below that
+MIN_SCALE = 0.25
+
+# seconds the ground needs between transfers to reopen and reconfigure its modem
+RESYNC_TIME = 1.5
+
+# bytes/s assumed until the first frame has been sent
+INITIAL_LINK_RATE = 800
+
+# frames averaged over for the effective frame rate
+FPS_WINDOW = 10
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp', '.gif')
+
+# PIL is imported by the functions that need it, the ground only needs the header
+# constants until the first frame arrives
+
+
+def frame_source(spec, size=STREAM_SIZE):
+    # camera[:INDEX] captures through OpenCV, anything else is a directory of images
+    # played back in name order
+    if spec == 'camera' or spec.startswith('camera:'):
+        return camera_frames(int(spec.partition(':')[2] or 0), size)
+
+    if not os.path.isdir(spec):
+        raise ValueError(f'invalid frame source "{spec}", must be a directory or camera[:INDEX]')
+
+    return directory_frames(spec, size)
+
+
+def directory_frames(path, size):
+    from PIL import Image, ImageOps
+
+    for name in sorted(os.listdir(path)):
+        if name.lower().endswith(IMAGE_EXTENSIONS):
+            with Image.open(os.path.join(path, name)) as image:
+                yield ImageOps.fit(image.convert('RGB'), size)
+
+
+def camera_frames(index, size):
+    try:
+        import cv2
+    except ImportError:
+        raise ValueError('camera capture needs OpenCV (pip install opencv-python)')
+    from PIL import Image, ImageOps
+
+    camera = cv2.VideoCapture(index)
+    try:
+        while True:
+            ok, frame = camera.read()
+            if not ok:
+                return
+
+            yield ImageOps.fit(Image.fromarray(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)), size)
+    finally:
+        camera.release()
+
+
+# Grabs a frame from the source every 1/fps seconds and keeps only the newest one,
+# frames replaced before the sender got to them are counted as dropped
+class Capture:
+    def __init__(self, frames, fps=STREAM_FPS):
+        self.frames = frames
+        self.interval = 1 / fps
+
+        self.latest = None
+        self.dropped = 0
+        self.done = False
+        self.cond = threading.Condition()
+
+    def start(self):
+        threading.Thread(target=self.run, daemon=True).start()
+
+        return self
+
+    def run(self):
+        next_capture = time.monotonic()
+
+        for image in self.frames:
+            with self.cond:
+                if self.latest:
+                    self.dropped += 1
+                self.latest = (time.time(), image)
+                self.cond.notify_all()
+
+            next_capture += self.interval
+            time.sleep(max(0, next_capture - time.monotonic()))
+
+        with self.cond:
+            self.done = True
+            self.cond.notify_all()
+
+    # newest (captured_at, image), None once the source ran out
+    def take(self) -> tuple:
+        with self.cond:
+            while not self.latest and not self.done:
+                self.cond.wait()
+
+            frame, self.latest = self.latest, None
+            return frame
+
+
+def pack_frame_header(kind, number, reference, captured_at) -> bytes:
+    return struct.pack(STREAM_HEADER_FORMAT, STREAM_PREAMBLE, kind, number, reference, captured_at)
+
+
+def unpack_frame_header(payload: bytes) -> dict:
+    _, kind, number, reference, captured_at = struct.unpack(STREAM_HEADER_FORMAT, payload[:STREAM_HEADER_SIZE])
+
+    return {'kind': kind, 'number': number, 'reference': reference, 'captured_at': captured_at}
+
+
+def encode_jpeg(image, quality) -> bytes:
+    output = BytesIO()
+    image.save(output, 'JPEG', quality=quality)
+
+    return output.getvalue()
+
+
+def decode_jpeg(data) -> 'Image.Image':
+    from PIL import Image
+
+    image = Image.open(BytesIO(data))
+    image.load()
+
+    return image.convert('RGB')
+
+
+# highest quality JPEG that fits the budget, or the lowest quality one if none does
+def encode_to_budget(image, budget, max_quality=MAX_QUALITY) -> bytes:
+    low, high = MIN_QUALITY, max_quality
+    best = None
+
+    while low <= high:
+        quality = (low + high) // 2
+        data = encode_jpeg(image, quality)
+
+        if len(data) <= budget:
+            best, low = data, quality + 1
+        else:
+            high = quality - 1
+
+    return best or encode_jpeg(image, MIN_QUALITY)
+
+
+# (JPEG within the budget, scale it was encoded at), halving the size while even
+# MIN_QUALITY is over the budget. (None, None) when it does not fit at MIN_SCALE either
+def fit_to_budget(image, budget) -> tuple:
+    scale = 1
+    while scale >= MIN_SCALE:
+        scaled = image if scale == 1 else image.resize((max(1, round(image.width * scale)), max(1, round(image.height * scale))))
+        data = encode_to_budget(scaled, budget)
+        if len(data) <= budget:
+            return data, scale
+
+        scale /= 2
+
+    return None, None
+
+
+# a frame sent scaled down, brought back to the stream size
+def decode_frame(data, size) -> 'Image.Image':
+    image = decode_jpeg(data)
+
+    return image if image.size == size else image.resize(size)
+
+
+def apply_delta(reference, delta) -> 'Image.Image':
+    from PIL import ImageChops
+
+    return ImageChops.add(reference, delta, scale=1, offset=-128)
+
+
+# Drone side. Deltas are taken against what the ground will reconstruct rather than the
+# previous original, so JPEG losses never accumulate over a run of deltas.
+class FrameEncoder:
+    def __init__(self, keyframe_interval=KEYFRAME_INTERVAL):
+        self.keyframe_interval = keyframe_interval
+        self.number = 0
+        self.reference = None
+        # scale the last frame was sent at
+        self.scale = 1
+
+    # header and JPEG within the budget, None when the frame cannot be made to fit
+    def encode(self, image, captured_at, budget) -> bytes:
+        from PIL import ImageChops
+
+        keyframe = self.reference is None or self.number % self.keyframe_interval == 0
+        budget -= STREAM_HEADER_SIZE
+
+        if keyframe:
+            data, scale = fit_to_budget(image, budget)
+        else:
+            data, scale = fit_to_budget(ImageChops.subtract(image, self.reference, scale=1, offset=128), budget)
+        if data is None:
+            return None
+
+        reconstructed = decode_frame(data, image.size)
+        if not keyframe:
+            reconstructed = apply_delta(self.reference, reconstructed)
+
+        header = pack_frame_header(KEYFRAME if keyframe else DELTA, self.number, max(self.number - 1, 0), captured_at)
+
+        self.reference = reconstructed
+        self.number += 1
+        self.scale = scale
+
+        return header + data
+
+
+# Ground side, frames have to be decoded in order
+class FrameDecoder:
+    def __init__(self):
+        self.number = None
+        self.reference = None
+
+    # (header, image) or (header, None) for a delta whose reference never arrived. size
+    # is the frame size from the transfer header
+    def decode(self, payload: bytes, size) -> tuple:
+        header = unpack_frame_header(payload)
+        image = decode_frame(payload[STREAM_HEADER_SIZE:], size)
+
+        if header['kind'] == DELTA:
+            if self.reference is None or header['reference'] != self.number:
+                return header, None
+
+            image = apply_delta(self.reference, image)
+
+        self.number = header['number']
+        self.reference = image
+
+        return header, image
+
+
+# effective frame rate over the last FPS_WINDOW frames
+class FrameRate:
+    def __init__(self, window=FPS_WINDOW):
+        self.times = deque(maxlen=window)
+
+    def add(self, t) -> float:
+        self.times.append(t)
+
+        if len(self.times) < 2 or self.times[-1] == self.times[0]:
+            return 0.0
+
+        return (len(self.times) - 1) / (self.times[-1] - self.times[0])
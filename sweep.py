@@ -0,0 +1,161 @@
+from contextlib import redirect_stdout, nullcontext
+import statistics
+import itertools
+import csv
+import io
+import os
+
+import benchmark
+import simulator
+import lora
+
+# Parameter sweep: sends a reference image several times at every combination of
+# spreading factor, bandwidth, chunk size and baudrate, then ranks the settings by
+# goodput. Runs over a drone and a ground modem attached to this machine, or over the
+# simulator when no ports are given.
+
+SWEEP_SPREADING_FACTORS = [6, 7, 8]
+SWEEP_BANDWIDTHS = [250, 500]
+SWEEP_CHUNK_SIZES = [100, 150, 200, lora.MAX_CHUNK_SIZE]
+SWEEP_BAUDRATES = [lora.RF_CONFIG['baudrate']]
+
+LATENCY_PERCENTILES = (50, 90, 99)
+
+CSV_FIELDS = [
+    'rank', 'spreading_factor', 'bandwidth', 'chunk_size', 'baudrate', 'runs', 'failures',
+    'goodput_bytes_per_s', 'retransmission_rounds', 'retransmitted_chunks', 'first_pass_s',
+    *(f'latency_p{p}_s' for p in LATENCY_PERCENTILES),
+]
+
+
+# one dict per combination, in the order they are run
+def grid(spreading_factors, bandwidths, chunk_sizes, baudrates) -> list:
+    return [
+        {'spreading_factor': sf, 'bandwidth': bw, 'chunk_size': chunk_size, 'baudrate': baudrate}
+        for sf, bw, chunk_size, baudrate in itertools.product(spreading_factors, bandwidths, chunk_sizes, baudrates)
+    ]
+
+
+# nearest rank percentile of sorted values
+def percentile(values, p) -> float:
+    return values[min(len(values) - 1, round(p / 100 * (len(values) - 1)))]
+
+
+def apply_setting(setting):
+    lora.RF_CONFIG['spreading_factor'] = setting['spreading_factor']
+    lora.RF_CONFIG['bandwidth'] = setting['bandwidth']
+    lora.RF_CONFIG['baudrate'] = setting['baudrate']
+    lora.CHUNK_SIZE = setting['chunk_size']
+
+
+def summarize(setting, runs) -> dict:
+    completed = [run for run in runs if run]
+    row = dict(setting, runs=len(runs), failures=len(runs) - len(completed))
+
+    if not completed:
+        return row
+
+    durations = sorted(run['duration_s'] for run in completed)
+    row.update(
+        goodput_bytes_per_s=statistics.median(run['goodput_bytes_per_s'] for run in completed),
+        retransmission_rounds=statistics.mean(run['retransmission_rounds'] for run in completed),
+        retransmitted_chunks=statistics.mean(run['retransmitted_chunks'] for run in completed),
+        first_pass_s=statistics.median(run['first_pass_s'] for run in completed),
+        **{f'latency_p{p}_s': percentile(durations, p) for p in LATENCY_PERCENTILES},
+    )
+
+    return row
+
+
+# best goodput first, settings that failed every run last
+def rank(rows) -> list:
+    ranked = sorted(rows, key=lambda row: (-row.get('goodput_bytes_per_s', -1), row['failures']))
+    for i, row in enumerate(ranked):
+        row['rank'] = i + 1
+
+    return ranked
+
+
+def print_table(rows):
+    latency = ' '.join(f'{f"p{p}":>7}' for p in LATENCY_PERCENTILES)
+    print(f'{"#":>3}  {"SF":>2}  {"BW":>3}  {"chunk":>5}  {"baud":>6}  {"B/s":>7}  {"rounds":>6}  {latency}  {"fail":>4}')
+
+    for row in rows:
+        if 'goodput_bytes_per_s' in row:
+            latency = ' '.join(f"{row[f'latency_p{p}_s']:>6.1f}s" for p in LATENCY_PERCENTILES)
+            results = f"{row['goodput_bytes_per_s']:>7,.0f}  {row['retransmission_rounds']:>6.1f}  {latency}"
+        else:
+            results = f'{"-":>7}  {"-":>6}  ' + ' '.join(f'{"-":>7}' for _ in LATENCY_PERCENTILES)
+
+        print(f"{row['rank']:>3}  {row['spreading_factor']:>2}  {row['bandwidth']:>3}  {row['chunk_size']:>5}  {row['baudrate']:>6}  {results}  {row['failures']:>4}")
+
+
+def write_csv(rows, path):
+    with open(path, 'w', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=CSV_FIELDS, extrasaction='ignore')
+        writer.writeheader()
+        writer.writerows({key: round(value, 3) if isinstance(value, float) else value for key, value in row.items()} for row in rows)
+
+
+def run_sweep(args):
+    args.sf = args.sf or SWEEP_SPREADING_FACTORS
+    args.bandwidth = args.bandwidth or SWEEP_BANDWIDTHS
+    args.chunk_size = args.chunk_size or SWEEP_CHUNK_SIZES
+    args.baudrate = args.baudrate or SWEEP_BAUDRATES
+
+    simulated = not args.drone_port
+    if not simulated and len(args.baudrate) > 1:
+        raise ValueError('a baudrate only takes effect after the modem is reset, sweep baudrates over the simulator')
+    if any(not 1 <= chunk_size <= lora.MAX_CHUNK_SIZE for chunk_size in args.chunk_size):
+        raise ValueError(f'chunk sizes must be between 1 and {lora.MAX_CHUNK_SIZE} bytes')
+
+    time_scale = args.time_scale if simulated else 1
+    settings = grid(args.sf, args.bandwidth, args.chunk_size, args.baudrate)
+
+    print(f'[*] Sweeping {len(settings)} settings, {args.repeat} transfers of "{args.image}" each{" (simulated seconds)" if simulated else ""}')
+
+    rows = []
+    with benchmark.scaled_protocol(time_scale):
+        lora.RF_CONFIG['power_dbm'] = args.dbm
+
+        for i, setting in enumerate(settings):
+            apply_setting(setting)
+            runs = []
+
+            for n in range(args.repeat):
+                if simulated:
+                    name = f'sweep-{os.getpid()}-{i}-{n}'
+                    port = benchmark.simulated_port(name, args.channel, None if args.seed is None else args.seed + n, time_scale)
+                    drone_ports = ground_ports = [port]
+                else:
+                    drone_ports, ground_ports = args.drone_port, args.ground_port
+
+                with nullcontext() if lora.VERBOSE else redirect_stdout(io.StringIO()):
+                    run = benchmark.run_transfer(args.image, drone_ports, ground_ports, args.timeout * time_scale)
+
+                if simulated:
+                    simulator.close_link(name)
+
+                if run:
+                    for key in ('duration_s', 'first_pass_s', 'ground_duration_s'):
+                        run[key] /= time_scale
+                    run['goodput_bytes_per_s'] *= time_scale
+                runs.append(run)
+
+            row = summarize(setting, runs)
+            rows.append(row)
+
+            label = f"SF{setting['spreading_factor']}/BW{setting['bandwidth']}/{setting['chunk_size']}B/{setting['baudrate']}"
+            if 'goodput_bytes_per_s' in row:
+                print(f"[{i + 1}/{len(settings)}] {label}: {row['goodput_bytes_per_s']:,.0f} B/s, p90 {row['latency_p90_s']:.1f}s, {row['failures']} failed")
+            else:
+                print(f'[{i + 1}/{len(settings)}] {label}: all {row["runs"]} transfers failed')
+
+    rows = rank(rows)
+    print()
+    print_table(rows)
+
+    write_csv(rows, args.output)
+    print(f'[+] Results written to "{args.output}"')
+
+    return rows
@@ -0,0 +1,9 @@
+import base64
+import json
+
+# JSON shared by the dashboard bridge and the merge service, bytes values (chunks,
+# images) travel base64 encoded
+
+
+def dumps(data: dict) -> str:
+    return json.dumps({k: base64.b64encode(v).decode() if isinstance(v, (bytes, bytearray, memoryview)) else v for k, v in data.items()})